@@ -1,3 +1,18 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import BulkJob, BulkJobFile
+
+
+class BulkJobFileInline(admin.TabularInline):
+    model = BulkJobFile
+    fields = ("position", "name", "status", "error")
+    readonly_fields = fields
+    extra = 0
+
+
+@admin.register(BulkJob)
+class BulkJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "zip_name", "status", "created_at", "finished_at")
+    list_filter = ("status",)
+    inlines = [BulkJobFileInline]
@@ -0,0 +1,186 @@
+"""
+Contrôle d'admission des analyses, pour ne pas surcharger la machine lors d'un pic.
+
+Au plus `settings.ANALYSIS_MAX_CONCURRENT` analyses (prétraitement + scansion d'une
+requête) tournent en même temps sur la machine, tous workers Django confondus ; au plus
+`settings.ANALYSIS_MAX_QUEUED` requêtes attendent une place, pendant
+`settings.ANALYSIS_QUEUE_TIMEOUT` secondes au plus. Au-delà, AdmissionRejected est levée
+et la vue répond rapidement 503 avec un en-tête Retry-After.
+
+Les places (en cours, en attente) sont des fichiers verrous de `settings.ADMISSION_DIR`
+(flock) : le système libère le verrou d'un processus qui meurt. Les requêtes en attente
+vérifient régulièrement si une place s'est libérée (pas d'ordre d'arrivée garanti).
+L'occupation des places (admission_state, pour /metrics) est lue dans /proc/locks.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import fcntl
+import os
+from pathlib import Path
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .pipeline import stage
+
+# Intervalle entre deux tentatives d'obtenir une place (secondes)
+POLL_INTERVAL = 0.05
+
+
+class AdmissionRejected(Exception):
+    """Analyse refusée, serveur surchargé : `reason` vaut queue_full ou timeout."""
+
+    def __init__(self, reason):
+        super().__init__(f"Analysis rejected ({reason})")
+        self.reason = reason
+
+
+def enabled():
+    return settings.ANALYSIS_MAX_CONCURRENT is not None
+
+
+def _lock_path(kind, index):
+    return Path(settings.ADMISSION_DIR) / f"{kind}-{index}.lock"
+
+
+def _try_lock(kind, count):
+    """Verrouille une des `count` places `kind` (run, queue) si possible ; renvoie son descripteur ou None."""
+    Path(settings.ADMISSION_DIR).mkdir(parents=True, exist_ok=True)
+    for index in range(count):
+        fd = os.open(_lock_path(kind, index), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+
+def _release(fd):
+    if fd is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _reject(reason):
+    metrics.inc("gama_admission_rejected_total", {"reason": reason})
+    raise AdmissionRejected(reason)
+
+
+def _enter():
+    """Place d'exécution si libre, sinon place en file d'attente. Renvoie (place d'exécution, place d'attente)."""
+    run_fd = _try_lock("run", settings.ANALYSIS_MAX_CONCURRENT)
+    if run_fd is not None:
+        return run_fd, None
+    queue_fd = _try_lock("queue", settings.ANALYSIS_MAX_QUEUED)
+    if queue_fd is None:
+        _reject("queue_full")
+    return None, queue_fd
+
+
+def _admitted(start, run_fd, queue_fd):
+    """Fin de l'attente : libère la place d'attente, rejette si aucune place d'exécution."""
+    _release(queue_fd)
+    metrics.observe("gama_admission_wait_seconds", time.perf_counter() - start)
+    if run_fd is None:
+        _reject("timeout")
+    return run_fd
+
+
+@contextmanager
+def admitted():
+    """Bloc exécuté avec une place d'analyse (attente bloquante) ; lève AdmissionRejected."""
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    with stage("admission_wait"):
+        run_fd, queue_fd = _enter()
+        deadline = time.monotonic() + settings.ANALYSIS_QUEUE_TIMEOUT
+        try:
+            while run_fd is None and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                run_fd = _try_lock("run", settings.ANALYSIS_MAX_CONCURRENT)
+        except BaseException:
+            # requête annulée pendant l'attente (client déconnecté...)
+            _release(run_fd)
+            _release(queue_fd)
+            raise
+        run_fd = _admitted(start, run_fd, queue_fd)
+    try:
+        yield
+    finally:
+        _release(run_fd)
+
+
+@asynccontextmanager
+async def aadmitted():
+    """Version asynchrone de admitted : l'attente ne bloque pas la boucle d'événements."""
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    with stage("admission_wait"):
+        run_fd, queue_fd = _enter()
+        deadline = time.monotonic() + settings.ANALYSIS_QUEUE_TIMEOUT
+        try:
+            while run_fd is None and time.monotonic() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+                run_fd = _try_lock("run", settings.ANALYSIS_MAX_CONCURRENT)
+        except BaseException:
+            # requête annulée pendant l'attente (client déconnecté...)
+            _release(run_fd)
+            _release(queue_fd)
+            raise
+        run_fd = _admitted(start, run_fd, queue_fd)
+    try:
+        yield
+    finally:
+        _release(run_fd)
+
+
+def _held_locks():
+    """Fichiers verrouillés par flock sur la machine, (périphérique, inode), lus dans /proc/locks (Linux)."""
+    held = set()
+    with open("/proc/locks", encoding="ascii") as locks:
+        for line in locks:
+            # ex. "1: FLOCK  ADVISORY  WRITE 1234 fe:00:13533286 0 EOF" ("->" : verrou attendu, pas tenu)
+            fields = line.split()
+            if len(fields) < 6 or fields[1] != "FLOCK":
+                continue
+            major, minor, inode = fields[5].split(":")
+            held.add((os.makedev(int(major, 16), int(minor, 16)), int(inode)))
+    return held
+
+
+def _count_locked(kind, count, held):
+    """Nombre de places `kind` occupées (verrou tenu par un processus) parmi les verrous `held`."""
+    locked = 0
+    for index in range(count):
+        try:
+            stat = _lock_path(kind, index).stat()
+        except FileNotFoundError:
+            continue
+        locked += (stat.st_dev, stat.st_ino) in held
+    return locked
+
+
+def admission_state():
+    """État des places sur la machine : analyses en cours et en attente, et limites."""
+    if not enabled():
+        return {}
+    state = {}
+    # Occupation lue sans toucher aux verrous des places (un essai de verrouillage ferait
+    # échouer celui d'une requête au même moment) ; absente hors Linux
+    try:
+        held = _held_locks()
+    except OSError:
+        pass
+    else:
+        state["running"] = _count_locked("run", settings.ANALYSIS_MAX_CONCURRENT, held)
+        state["queued"] = _count_locked("queue", settings.ANALYSIS_MAX_QUEUED, held)
+    state["max_running"] = settings.ANALYSIS_MAX_CONCURRENT
+    state["max_queued"] = settings.ANALYSIS_MAX_QUEUED
+    return state
@@ -0,0 +1,165 @@
+"""
+Cache des résultats d'analyse, adressé par le contenu.
+
+La clé d'un résultat est un hash du texte soumis, des options du pipeline de
+prétraitement (pipeline_options, `-p -d -n -s`) et des versions des fichiers de
+données (preprocessing/data, gumper/data) : un texte déjà analysé (poèmes exemples,
+nouvelle soumission après un changement de langue...) n'est pas analysé à nouveau.
+
+Les entrées sont stockées dans la base (gama.models.AnalysisCacheEntry). La taille
+totale est bornée par `settings.ANALYSIS_CACHE_MAX_SIZE` : au-delà, les entrées
+utilisées le moins récemment sont supprimées (LRU).
+"""
+
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import hashlib
+import json
+import logging
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from gumper import config as gcf
+
+from .models import AnalysisCacheEntry
+from .admission import aadmitted
+from .pipeline import analyze_in_pool, analyze_text, count, pipeline_options, reset_bulk_executor, stage
+
+# modules du preprocessing (dossier ajouté au sys.path par gama.pipeline)
+import config as prepro_cf  # noqa: E402
+import rewrite as prepro_rw  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# À incrémenter quand le code d'analyse change les résultats (invalide tout le cache)
+CACHE_VERSION = 2
+
+
+def data_version():
+    """
+    Empreinte des fichiers de données du prétraitement et de gumper (nom, taille et date
+    de modification), calculée une fois par processus, sauf pour les fichiers de règles :
+    rechargés à chaud quand ils changent, leur version est celle du registre qui les recharge
+    (rewrite.rule_files.stamp, vérifiée au plus une fois par seconde).
+    """
+    h = hashlib.sha256(_data_files_version().encode("utf-8"))
+    for path in rule_files():
+        mtime_ns, size = prepro_rw.rule_files.stamp(path)
+        h.update(f"{size}\t{mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def rule_files():
+    """Fichiers de règles de remplacement du prétraitement et de gumper."""
+    return [prepro_cf.text_level_replacements, prepro_cf.syllable_replacements,
+            gcf.word_bound_replacements, gcf.text_level_replacements]
+
+
+@lru_cache(maxsize=1)
+def _data_files_version():
+    h = hashlib.sha256()
+    for data_dir in [settings.PREPRO_DIR / "data", settings.GUMPER_DIR / "data"]:
+        for root, dirs, files in os.walk(data_dir):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for fname in sorted(files):
+                path = os.path.join(root, fname)
+                st = os.stat(path)
+                h.update(f"{os.path.relpath(path, settings.BASE_DIR)}\t{st.st_size}\t{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def cache_key(text):
+    """Clé du cache pour un texte : hash du texte, des options du pipeline et des données."""
+    h = hashlib.sha256()
+    h.update(json.dumps([CACHE_VERSION, pipeline_options(), data_version()], sort_keys=True).encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def get_cached_analysis(text):
+    """
+    Renvoie (scansion, results_data) si le texte est en cache, sinon None.
+    Les consultations sont comptées (cache_hits, cache_misses) dans le chronomètre actif.
+    """
+    if not settings.ANALYSIS_CACHE_ENABLED:
+        return None
+    key = cache_key(text)
+    entry = AnalysisCacheEntry.objects.filter(pk=key).values_list("scansion", "results_data").first()
+    if entry is None:
+        count("cache_misses")
+        return None
+    count("cache_hits")
+    AnalysisCacheEntry.objects.filter(pk=key).update(last_used=timezone.now())
+    return entry
+
+
+def store_analysis(text, scansion, results_data):
+    """Met en cache le résultat d'analyse d'un texte, puis applique la limite de taille."""
+    if not settings.ANALYSIS_CACHE_ENABLED:
+        return
+    size = len(json.dumps(scansion)) + len(json.dumps(results_data))
+    if size > settings.ANALYSIS_CACHE_MAX_SIZE:
+        return
+    AnalysisCacheEntry.objects.update_or_create(
+        pk=cache_key(text),
+        defaults={"scansion": scansion, "results_data": results_data, "size": size,
+                  "last_used": timezone.now()})
+    evict(settings.ANALYSIS_CACHE_MAX_SIZE)
+
+
+def evict(max_size):
+    """Supprime les entrées utilisées le moins récemment jusqu'à ce que la taille totale soit <= max_size."""
+    total = AnalysisCacheEntry.objects.aggregate(total=Sum("size"))["total"] or 0
+    if total <= max_size:
+        return 0
+    to_free = total - max_size
+    keys = []
+    for key, size in AnalysisCacheEntry.objects.order_by("last_used").values_list("key", "size").iterator():
+        keys.append(key)
+        to_free -= size
+        if to_free <= 0:
+            break
+    AnalysisCacheEntry.objects.filter(pk__in=keys).delete()
+    logger.info("Analysis cache: evicted %d entries", len(keys))
+    return len(keys)
+
+
+def cached_analyze_text(text):
+    """
+    analyze_text avec le cache : renvoie (scansion, results_data) depuis le cache
+    si le texte a déjà été analysé, sinon analyse le texte et met le résultat en cache.
+    """
+    cached = get_cached_analysis(text)
+    if cached is not None:
+        return cached
+    scansion, results_data = analyze_text(text)
+    store_analysis(text, scansion, results_data)
+    return scansion, results_data
+
+
+async def acached_analyze_text(text):
+    """
+    Version asynchrone de cached_analyze_text : l'analyse est faite dans le pool de
+    processus (gama.pipeline.analyze_in_pool), sans bloquer la boucle d'événements,
+    avec une place du contrôle d'admission (gama.admission, peut lever AdmissionRejected).
+    Les accès au cache sont chronométrés (étapes `cache` et `cache_store`).
+    """
+    with stage("cache"):
+        cached = await sync_to_async(get_cached_analysis)(text)
+    if cached is not None:
+        return cached
+    try:
+        async with aadmitted():
+            scansion, results_data = await analyze_in_pool(text)
+    except BrokenProcessPool:
+        # Un processus du pool est mort : le pool sera recréé à la prochaine analyse
+        reset_bulk_executor()
+        raise
+    with stage("cache_store"):
+        await sync_to_async(store_analysis)(text, scansion, results_data)
+    return scansion, results_data
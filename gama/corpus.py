@@ -0,0 +1,172 @@
+"""
+Analyse d'un corpus entier hors ligne (`manage.py analyze_corpus`), pour les travaux de recherche.
+
+Les fichiers txt d'un dossier (et de ses sous-dossiers) sont prétraités et scandés dans
+le pool de processus de l'analyse par lot (gama.pipeline.submit_analysis), avec au plus
+quelques analyses en attente à la fois pour borner la mémoire. Les fichiers plus longs que
+`settings.LONG_TEXT_CHUNK_SIZE` sont analysés en morceaux (mode texte long, gama.longdoc),
+que ce mode soit activé ou non pour le site ; ceux qui dépassent `max_length` sont notés
+en erreur. Chaque poème donne un TSV
+`<nom>_results.tsv` (mêmes colonnes que l'export ZIP) dans le dossier de sortie, à la même
+place relative que le fichier d'entrée ; les erreurs sont ajoutées à `errors.txt`.
+
+Chaque fichier terminé est noté dans le point de reprise `CHECKPOINT_NAME` du dossier de
+sortie (une ligne JSON par fichier, écrite après son TSV) : une analyse interrompue
+reprend là où elle s'est arrêtée. Les fichiers en erreur sont réessayés à la reprise.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import json
+import logging
+import os
+from pathlib import Path
+import time
+
+from .export import results_tsv
+from .pipeline import analysis_result, reset_bulk_executor, submit_analysis
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "checkpoint.jsonl"
+ERRORS_NAME = "errors.txt"
+
+
+class CorpusStats:
+    """Bilan d'une exécution : fichiers analysés, déjà faits (reprise), en erreur, vers analysés."""
+
+    def __init__(self):
+        self.done = 0
+        self.skipped = 0
+        self.errors = 0
+        self.lines = 0
+        self.seconds = 0.0
+
+    @property
+    def lines_per_second(self):
+        return self.lines / self.seconds if self.seconds else 0.0
+
+
+def corpus_files(input_dir, pattern="*.txt"):
+    """Fichiers du corpus (chemins relatifs à `input_dir`), par ordre alphabétique."""
+    input_dir = Path(input_dir)
+    return sorted(path.relative_to(input_dir) for path in input_dir.rglob(pattern) if path.is_file())
+
+
+def result_path(output_dir, relpath):
+    """TSV des résultats d'un fichier du corpus."""
+    return Path(output_dir) / relpath.parent / f"{relpath.stem}_results.tsv"
+
+
+def load_checkpoint(output_dir):
+    """Fichiers déjà analysés (chemins relatifs, en texte) d'après le point de reprise."""
+    done = set()
+    try:
+        with open(Path(output_dir) / CHECKPOINT_NAME, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["file"])
+                except (ValueError, KeyError):
+                    # dernière ligne incomplète (arrêt pendant l'écriture)
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _append(path, line):
+    """Ajoute une ligne à un fichier et la force sur le disque."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_result(output_dir, relpath, results_data, header):
+    """Écrit le TSV d'un fichier (écriture atomique) puis le note dans le point de reprise."""
+    path = result_path(output_dir, relpath)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tsv.tmp")
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(results_tsv(results_data, header))
+    os.replace(tmp_path, path)
+    _append(Path(output_dir) / CHECKPOINT_NAME,
+            json.dumps({"file": relpath.as_posix(), "lines": len(results_data)}, ensure_ascii=False))
+
+
+def _write_error(output_dir, relpath, message):
+    logger.error("Error with %s: %s", relpath, message)
+    _append(Path(output_dir) / ERRORS_NAME, f"{relpath.as_posix()}: {message}")
+
+
+def analyze_corpus(input_dir, output_dir, header, pattern="*.txt", max_pending=8, progress=None, max_length=None):
+    """
+    Analyse les fichiers du corpus qui ne sont pas dans le point de reprise.
+
+    `header` : en-têtes des TSV (gama.views.results_header) ;
+    `max_pending` : nombre maximal d'analyses envoyées au pool et non terminées ;
+    `progress` : fonction appelée avec (chemin relatif, CorpusStats) après chaque fichier ;
+    `max_length` : longueur maximale d'un fichier en caractères (None : pas de limite).
+    Renvoie les CorpusStats de l'exécution. En cas d'interruption (KeyboardInterrupt,
+    BrokenProcessPool), les analyses en cours sont abandonnées et l'exception est propagée
+    avec l'attribut `stats`.
+    """
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = load_checkpoint(output_dir)
+    stats = CorpusStats()
+    start = time.perf_counter()
+    pending = {}
+
+    def collect(futures):
+        for future in futures:
+            relpath = pending.pop(future)
+            try:
+                _scansion, results_data = analysis_result(future)
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                stats.errors += 1
+                _write_error(output_dir, relpath, str(e))
+            else:
+                _write_result(output_dir, relpath, results_data, header)
+                stats.done += 1
+                stats.lines += len(results_data)
+            if progress:
+                stats.seconds = time.perf_counter() - start
+                progress(relpath, stats)
+
+    try:
+        for relpath in corpus_files(input_dir, pattern):
+            if relpath.as_posix() in checkpoint:
+                stats.skipped += 1
+                continue
+            try:
+                text = (input_dir / relpath).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                stats.errors += 1
+                _write_error(output_dir, relpath, str(e))
+                continue
+            # Fichiers vides ignorés, comme dans l'analyse par lot
+            if not text.strip():
+                continue
+            if max_length and len(text) > max_length:
+                stats.errors += 1
+                _write_error(output_dir, relpath,
+                             f"File '{relpath.name}' is too long. Maximum allowed is {max_length:,} characters.")
+                continue
+            pending[submit_analysis(text, long_text=True)] = relpath
+            if len(pending) >= max_pending:
+                finished, _running = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        while pending:
+            finished, _running = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    except (KeyboardInterrupt, BrokenProcessPool) as e:
+        # analyses en cours abandonnées : elles seront refaites à la reprise
+        reset_bulk_executor()
+        stats.seconds = time.perf_counter() - start
+        e.stats = stats
+        raise
+    stats.seconds = time.perf_counter() - start
+    return stats
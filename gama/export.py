@@ -0,0 +1,106 @@
+"""
+Construction en flux (streaming) des archives ZIP de résultats.
+
+Les entrées de l'archive sont compressées et envoyées au client au fur et à mesure,
+par morceaux de taille bornée : rien n'est écrit sur le disque et l'archive complète
+n'est jamais gardée en mémoire.
+"""
+
+import csv
+import io
+import zipfile
+
+from django.http import StreamingHttpResponse
+
+# Taille des morceaux envoyés au client
+CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStreamBuffer:
+    """
+    Fichier "non seekable" dans lequel écrit zipfile.ZipFile ;
+    les octets écrits sont récupérés (et vidés) avec `pop`.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    """
+    Générateur qui produit une archive ZIP par morceaux d'environ `chunk_size` octets.
+
+    `entries` : itérable (éventuellement paresseux) de (nom dans l'archive, contenu str ou bytes).
+    Chaque entrée n'est générée qu'au moment de son écriture dans l'archive.
+    """
+    buf = _ZipStreamBuffer()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in entries:
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            with zf.open(name, "w") as dest:
+                for start in range(0, len(data), chunk_size):
+                    dest.write(data[start:start + chunk_size])
+                    if buf.size >= chunk_size:
+                        yield buf.pop()
+            if buf.size:
+                yield buf.pop()
+    # répertoire central de l'archive
+    yield buf.pop()
+
+
+async def _aiter(iterator):
+    """Itérateur asynchrone sur un itérateur synchrone (réponses des vues async sous ASGI)."""
+    for item in iterator:
+        yield item
+
+
+def zip_response(entries, filename, asynchronous=False):
+    """
+    Réponse HTTP en streaming pour télécharger l'archive ZIP des `entries`.
+    `asynchronous` : contenu fourni par un itérateur asynchrone (vues async servies en ASGI).
+    """
+    content = stream_zip(entries)
+    if asynchronous:
+        content = _aiter(content)
+    response = StreamingHttpResponse(content, content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def results_tsv(results_data, header):
+    """
+    Contenu du fichier tsv des résultats d'une analyse.
+    `header` : noms des colonnes (traduits), dans l'ordre :
+    #, texte original, prétraitement, syllabes métriques, syllabes accentuées, sans accents extrarythmiques.
+    """
+    f = io.StringIO(newline="")
+    writer = csv.writer(f, delimiter="\t")
+    writer.writerow(header)
+    for row in results_data:
+        writer.writerow([row["line"], row["original_text"], row["preprocessing"],
+                         row["metrical_syllables"], row["stressed_syllables"], row["no_extra_rhythmic"]])
+    return f.getvalue()
+
+
+def metadata_tsv(header, values):
+    """Contenu du fichier tsv des métadonnées (une ligne d'en-tête, une ligne de valeurs)."""
+    f = io.StringIO(newline="")
+    writer = csv.writer(f, delimiter="\t")
+    writer.writerow(header)
+    writer.writerow(values)
+    return f.getvalue()
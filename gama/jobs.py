@@ -0,0 +1,262 @@
+"""
+Analyse par lot en tâche de fond (file de jobs dans la base SQLite).
+
+- `create_bulk_job` : enregistre le ZIP soumis (un BulkJobFile par fichier txt)
+- `run_next_job` : appelé par le worker local (`manage.py process_bulk_jobs`),
+  analyse les fichiers d'un job dans le pool de processus de l'analyse par lot
+  et enregistre l'état de chaque fichier au fur et à mesure
+- `job_entries` : fichiers du ZIP de résultats d'un job terminé
+"""
+
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+import logging
+from pathlib import Path, PurePosixPath
+import zipfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .cache import get_cached_analysis, store_analysis
+from . import metrics
+from .export import results_tsv
+from .models import BulkJob, BulkJobFile
+from .pipeline import analysis_result, max_text_length, reset_bulk_executor, submit_analysis, timed
+
+logger = logging.getLogger(__name__)
+
+
+class BulkJobError(Exception):
+    """ZIP soumis refusé (message traduit, destiné à l'utilisateur)."""
+
+
+def member_name(filename):
+    """
+    Nom d'un fichier du ZIP dans le job : son chemin dans le ZIP (`a/poeme.txt` et `b/poeme.txt`
+    restent distincts), sans `/` initial ni composants `.` ou `..`.
+    """
+    parts = PurePosixPath(filename.replace("\\", "/")).parts
+    return "/".join(part for part in parts if part not in ("/", ".", ".."))
+
+
+def create_bulk_job(uploaded_zip, max_files=None):
+    """
+    Crée un job à partir d'un ZIP uploadé, sans l'extraire sur le disque.
+
+    Les fichiers txt sont lus en mémoire, par ordre alphabétique du nom de fichier (comme
+    l'analyse synchrone), puis du chemin ; chaque fichier est nommé par son chemin dans le ZIP
+    (member_name). Les fichiers vides sont ignorés ; les fichiers trop longs ou illisibles sont
+    enregistrés directement en erreur.
+    Lève BulkJobError si le ZIP est invalide, sans fichier txt, avec trop de fichiers ou avec
+    deux fichiers de même nom.
+    """
+    max_files = max_files or settings.BULK_JOB_MAX_FILES
+    try:
+        zf = zipfile.ZipFile(uploaded_zip)
+    except zipfile.BadZipFile:
+        raise BulkJobError(_("Invalid ZIP file."))
+
+    with zf:
+        members = sorted((info for info in zf.infolist()
+                          if not info.is_dir() and info.filename.lower().endswith(".txt")),
+                         key=lambda info: (Path(info.filename).name, member_name(info.filename)))
+        if not members:
+            raise BulkJobError(_("No TXT files found in the ZIP."))
+        if len(members) > max_files:
+            raise BulkJobError(_("Too many files in ZIP. Maximum allowed is %(max_files)s.")
+                              % {"max_files": max_files})
+
+        names = [member_name(info.filename) for info in members]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise BulkJobError(_("Duplicate file name in ZIP: %(name)s.") % {"name": duplicates[0]})
+
+        files = []
+        for info, fname in zip(members, names):
+            file = BulkJobFile(name=fname)
+            try:
+                text = zf.read(info).decode("utf-8")
+            except Exception as e:
+                file.status = BulkJobFile.ERROR
+                file.error = f"{fname}: {str(e)}"
+                files.append(file)
+                continue
+            # Ignore les fichiers vides
+            if not text.strip():
+                continue
+            if len(text) > max_text_length():
+                file.status = BulkJobFile.TOO_LONG
+                file.error = f"File '{fname}' is too long. Maximum allowed is {max_text_length():,} characters."
+            else:
+                file.text = text
+            files.append(file)
+
+    with transaction.atomic():
+        job = BulkJob.objects.create(zip_name=getattr(uploaded_zip, "name", "") or "bulk.zip")
+        for position, file in enumerate(files):
+            file.job = job
+            file.position = position
+        BulkJobFile.objects.bulk_create(files)
+    return job
+
+
+def claim_next_job():
+    """
+    Réserve le plus ancien job en attente (passage atomique queued -> running).
+    Renvoie le job, ou None si la file est vide.
+    """
+    for job_id in BulkJob.objects.filter(status=BulkJob.QUEUED).values_list("id", flat=True)[:5]:
+        now = timezone.now()
+        claimed = BulkJob.objects.filter(pk=job_id, status=BulkJob.QUEUED).update(
+            status=BulkJob.RUNNING, started_at=now, heartbeat_at=now)
+        if claimed:
+            return BulkJob.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Analyse les fichiers en attente d'un job dans le pool de processus ;
+    chaque fichier est enregistré (done/error) dès que son analyse est terminée.
+    Les textes déjà analysés sont repris du cache (gama.cache).
+    """
+    futures = {}
+    files = []
+    for file in job.files.filter(status=BulkJobFile.QUEUED):
+        cached = get_cached_analysis(file.text)
+        if cached is not None:
+            file.results_data = cached[1]
+            file.status = BulkJobFile.DONE
+            file.save(update_fields=["status", "results_data"])
+        else:
+            files.append(file)
+    for file in files:
+        futures[submit_analysis(file.text)] = file
+
+    try:
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                scansion, file.results_data = analysis_result(future)
+                file.status = BulkJobFile.DONE
+                store_analysis(file.text, scansion, file.results_data)
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                logger.error("Error with %s: %s", file.name, e)
+                file.status = BulkJobFile.ERROR
+                file.error = f"{file.name}: {str(e)}"
+            file.save(update_fields=["status", "error", "results_data"])
+            heartbeat(job)
+    except BrokenProcessPool as e:
+        # Un processus du pool est mort : le pool est recréé, le job est en échec
+        logger.error("Bulk job %s failed: %s", job.pk, e)
+        reset_bulk_executor()
+        job.files.filter(status=BulkJobFile.QUEUED).update(
+            status=BulkJobFile.ERROR, error=str(e))
+        finish_job(job, BulkJob.FAILED, str(e))
+        return job
+
+    finish_job(job, BulkJob.DONE)
+    return job
+
+
+def heartbeat(job):
+    """Signale que le job est toujours en cours de traitement (voir requeue_stale_jobs)."""
+    BulkJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now())
+
+
+def finish_job(job, status, error=""):
+    """Enregistre la fin d'un job (done ou failed)."""
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+
+
+def run_next_job():
+    """
+    Traite le prochain job de la file. Renvoie le job traité, ou None.
+    Les compteurs de l'analyse (poèmes, vers, cache...) sont ajoutés aux métriques (gama.metrics).
+    """
+    job = claim_next_job()
+    if job is None:
+        return None
+    logger.info("Bulk job %s started (%s)", job.pk, job.zip_name)
+    with timed() as timer:
+        try:
+            run_job(job)
+        except Exception as e:
+            logger.exception("Bulk job %s failed", job.pk)
+            finish_job(job, BulkJob.FAILED, str(e))
+    metrics.record_timer(timer)
+    metrics.flush()
+    logger.info("Bulk job %s %s", job.pk, job.status)
+    return job
+
+
+def requeue_stale_jobs(stale_after=None):
+    """
+    Remet en file les jobs interrompus (arrêt du worker pendant leur traitement) : jobs en
+    cours dont le worker n'a pas signalé d'avancement (heartbeat, sinon début du traitement)
+    depuis `stale_after` secondes (settings.BULK_JOB_STALE_AFTER). Les jobs des autres
+    workers, toujours actifs, ne sont pas repris.
+    """
+    stale_after = settings.BULK_JOB_STALE_AFTER if stale_after is None else stale_after
+    limit = timezone.now() - timedelta(seconds=stale_after)
+    stale = (Q(heartbeat_at__lt=limit)
+             | Q(heartbeat_at__isnull=True, started_at__lt=limit)
+             | Q(heartbeat_at__isnull=True, started_at__isnull=True))
+    return BulkJob.objects.filter(stale, status=BulkJob.RUNNING).update(
+        status=BulkJob.QUEUED, started_at=None, heartbeat_at=None)
+
+
+def delete_old_jobs(days=None):
+    """Supprime les jobs terminés depuis plus de `days` jours (settings.BULK_JOB_RETENTION_DAYS)."""
+    days = settings.BULK_JOB_RETENTION_DAYS if days is None else days
+    limit = timezone.now() - timedelta(days=days)
+    deleted, _details = BulkJob.objects.filter(status__in=[BulkJob.DONE, BulkJob.FAILED],
+                                               finished_at__lt=limit).delete()
+    return deleted
+
+
+def job_progress(job):
+    """État d'un job et de chacun de ses fichiers (pour le suivi côté client)."""
+    files = list(job.files.values("name", "status", "error"))
+    return {
+        "job_id": str(job.pk),
+        "status": job.status,
+        "files_total": len(files),
+        "files_done": sum(f["status"] != BulkJobFile.QUEUED for f in files),
+        "files": files,
+    }
+
+
+def job_errors(job):
+    """
+    Erreurs d'un job, dans l'ordre des fichiers.
+    Renvoie (messages d'erreur, nombre de fichiers trop longs).
+    """
+    rows = list(job.files.filter(status__in=[BulkJobFile.ERROR, BulkJobFile.TOO_LONG])
+                .values_list("status", "error"))
+    errors = [error for status, error in rows]
+    too_long = sum(status == BulkJobFile.TOO_LONG for status, error in rows)
+    return errors, too_long
+
+
+def job_entries(job, results_header):
+    """
+    Fichiers du ZIP de résultats d'un job terminé (générés paresseusement) :
+    un TSV par poème analysé (au même chemin que le fichier dans le ZIP soumis), puis
+    errors.txt si des erreurs existent.
+    """
+    files = job.files.filter(status=BulkJobFile.DONE).only("name", "results_data")
+    for file in files.iterator():
+        yield f"{PurePosixPath(file.name).with_suffix('')}_results.tsv", results_tsv(file.results_data, results_header)
+    errors, too_long = job_errors(job)
+    if errors:
+        yield "errors.txt", "".join(line + "\n" for line in errors)
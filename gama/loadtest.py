@@ -0,0 +1,230 @@
+"""
+Test de charge des pages de l'application (`manage.py loadtest`), contre un serveur local.
+
+Chaque utilisateur virtuel (un thread, avec ses propres cookies : session, CSRF) enchaîne
+le parcours d'un visiteur : index, analysis (POST d'un texte), analysis_results,
+export_results, puis bulk_analysis (POST d'un ZIP de quelques textes). Les textes sont
+les poèmes exemples (gama/ext_data/ex_poem.json) et des textes synthétiques composés de
+leurs vers ; avec `unique`, chaque texte est différent pour ne pas mesurer le cache.
+
+Pour tester sans les modèles lourds, lancer le serveur avec settings.PREPRO_STAND_IN_MODELS.
+
+Le rapport (JSON) donne pour chaque vue et au total : nombre de requêtes, débit (requêtes
+par seconde), latences p50/p95/p99 (ms) et taux d'erreur (exception, ou statut HTTP
+inattendu, ex. 503 du contrôle d'admission).
+"""
+
+from http.cookiejar import CookieJar
+import io
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zipfile
+
+ENDPOINTS = ["index", "analysis", "analysis_results", "export_results", "bulk_analysis"]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Les redirections (analysis -> résultats) sont des réponses mesurées, pas suivies."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def percentile(values, p):
+    """Percentile `p` (0-100) d'une liste de valeurs, méthode du rang le plus proche."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def example_texts(path):
+    """Textes des poèmes exemples."""
+    with open(path, encoding="utf-8") as f:
+        return [poem["text"] for poem in json.load(f).values()]
+
+
+def synthetic_text(rng, lines, stanzas=4, stanza_length=4):
+    """Texte synthétique : strophes de vers tirés au hasard parmi `lines`."""
+    return "\n\n".join("\n".join(rng.choice(lines) for _ in range(stanza_length)) for _ in range(stanzas))
+
+
+class TextSource:
+    """
+    Textes envoyés par les utilisateurs virtuels : poèmes exemples et textes synthétiques,
+    ou seulement des textes synthétiques tous différents (`unique`, pas de réponse du cache).
+    """
+
+    def __init__(self, examples, seed=0, unique=False):
+        self.examples = examples
+        self.lines = [line for text in examples for line in text.splitlines() if line.strip()]
+        self.rng = random.Random(seed)
+        self.unique = unique
+        self.lock = threading.Lock()
+
+    def text(self):
+        with self.lock:
+            if self.unique or self.rng.random() < 0.5:
+                return synthetic_text(self.rng, self.lines)
+            return self.rng.choice(self.examples)
+
+
+class Recorder:
+    """Latences (secondes) et erreurs des requêtes, par vue."""
+
+    def __init__(self):
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.statuses = {name: {} for name in ENDPOINTS}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, status, ok):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][str(status)] = self.statuses[name].get(str(status), 0) + 1
+            if not ok:
+                self.errors[name] += 1
+
+
+class VirtualUser:
+    """Un visiteur : client HTTP avec cookies, qui parcourt les vues de `endpoints`."""
+
+    def __init__(self, base_url, recorder, texts, endpoints, bulk_files=3, timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.texts = texts
+        self.endpoints = endpoints
+        self.bulk_files = bulk_files
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, name, path, data=None, content_type=None, expected=(200,), redirect_to=None):
+        """
+        Envoie une requête et enregistre sa latence ; renvoie (statut, contenu).
+        `redirect_to` : début attendu du chemin de redirection (sinon erreur, ex. page d'erreur).
+        """
+        headers = {"Referer": self.base_url + "/"}
+        if data is not None:
+            headers["X-CSRFToken"] = self.csrf_token()
+            headers["Content-Type"] = content_type
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, body, location = response.status, response.read(), None
+        except urllib.error.HTTPError as e:
+            status, body, location = e.code, e.read(), e.headers.get("Location")
+        except Exception:
+            status, body, location = "exception", b"", None
+        ok = status in expected and (redirect_to is None or (location or "").startswith(redirect_to))
+        self.recorder.record(name, time.perf_counter() - start, status, ok)
+        return status, body
+
+    def run_once(self):
+        """Un parcours complet du visiteur."""
+        if "index" in self.endpoints or not self.csrf_token():
+            self.request("index", "/en/gama/")
+        if "analysis" in self.endpoints:
+            data = urllib.parse.urlencode({"text": self.texts.text()}).encode("utf-8")
+            self.request("analysis", "/en/gama/analysis", data, "application/x-www-form-urlencoded",
+                         expected=(302,), redirect_to="/en/gama/results/")
+        if "analysis_results" in self.endpoints:
+            self.request("analysis_results", "/en/gama/results/")
+        if "export_results" in self.endpoints:
+            self.request("export_results", "/en/gama/export_results/")
+        if "bulk_analysis" in self.endpoints:
+            data, content_type = self.bulk_upload()
+            self.request("bulk_analysis", "/en/gama/bulk_analysis/", data, content_type)
+
+    def bulk_upload(self):
+        """Corps multipart du formulaire d'analyse par lot : un ZIP de `bulk_files` textes."""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            for i in range(self.bulk_files):
+                zf.writestr(f"poem_{i}.txt", self.texts.text())
+        boundary = uuid.uuid4().hex
+        body = (f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="zip_file"; filename="corpus.zip"\r\n'
+                f"Content-Type: application/zip\r\n\r\n").encode("utf-8")
+        body += archive.getvalue() + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        return body, f"multipart/form-data; boundary={boundary}"
+
+
+def summary(latencies, errors, seconds):
+    """Débit, latences (ms) et taux d'erreur d'une liste de requêtes."""
+    n = len(latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "requests": n,
+        "errors": errors,
+        "error_rate": round(errors / n, 4) if n else None,
+        "throughput_rps": round(n / seconds, 3) if seconds else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / n) if n else None,
+            "max": ms(max(latencies)) if n else None,
+        },
+    }
+
+
+def run_load_test(base_url, examples, concurrency=4, iterations=None, duration=None, endpoints=ENDPOINTS,
+                  bulk_files=3, unique=False, seed=0, timeout=300):
+    """
+    Lance `concurrency` utilisateurs virtuels, chacun faisant `iterations` parcours, ou
+    des parcours pendant `duration` secondes. Renvoie le rapport (dictionnaire sérialisable en JSON).
+    """
+    if iterations is None and duration is None:
+        iterations = 1
+    recorder = Recorder()
+    texts = TextSource(examples, seed=seed, unique=unique)
+    deadline = None if duration is None else time.monotonic() + duration
+
+    def user_loop():
+        user = VirtualUser(base_url, recorder, texts, endpoints, bulk_files=bulk_files, timeout=timeout)
+        done = 0
+        while (iterations is None or done < iterations) and (deadline is None or time.monotonic() < deadline):
+            user.run_once()
+            done += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user_loop, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    report = {
+        "target": base_url,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(time.time() - seconds)),
+        "concurrency": concurrency,
+        "iterations": iterations,
+        "duration_s": round(seconds, 3),
+        "unique_texts": unique,
+        "endpoints": {},
+    }
+    for name in endpoints:
+        report["endpoints"][name] = summary(recorder.latencies[name], recorder.errors[name], seconds)
+        report["endpoints"][name]["statuses"] = recorder.statuses[name]
+    all_latencies = [value for name in endpoints for value in recorder.latencies[name]]
+    report["total"] = summary(all_latencies, sum(recorder.errors[name] for name in endpoints), seconds)
+    return report
@@ -0,0 +1,180 @@
+"""
+Mode texte long : analyse en parallèle des textes de plus de `settings.LONG_TEXT_CHUNK_SIZE`
+caractères (jusqu'à `settings.LONG_TEXT_MAX_LENGTH`), ex. poèmes narratifs, recueils entiers.
+
+Le texte est découpé en morceaux aux limites des strophes (lignes vides), une strophe trop
+longue étant coupée entre deux vers. L'analyse se fait en trois tours dans le pool de
+processus (gama.pipeline.get_bulk_executor), chaque tâche ne traitant qu'un morceau :
+
+1. prétraitement des morceaux (le prétraitement d'une ligne ne dépend que de cette ligne) ;
+   les remplacements de gumper sont ensuite appliqués au texte prétraité entier ;
+2. premier calcul de la scansion de chaque vers (gumper.gumper.analizar_versos) ;
+3. désambiguïsation des vers (gumper.gumper.desambiguar_versos) : les mètres fréquents
+   du poème entier sont calculés entre les tours 2 et 3, et chaque morceau reçoit le nombre
+   de syllabes des `contexto` vers qui l'entourent (chevauchement), pour que la fenêtre
+   des poèmes polymétriques (`contexto=14` de escandir_lista_versos) donne le même
+   résultat qu'une analyse séquentielle.
+
+Les résultats sont recollés dans l'ordre du texte : ils sont identiques à ceux de
+gama.pipeline.analyze_text.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from django.conf import settings
+
+from gumper import config as gcf
+from gumper.gumper import analizar_versos, desambiguar_versos, medidas_frecuentes
+from gumper.gumper_client_web import clean_text, scan_results
+
+from .pipeline import bulk_analysis_workers, count, get_bulk_executor, merge, preprocess_text, stage, text_lines, timed
+
+# Contexte de la désambiguïsation des poèmes polymétriques (escandir_lista_versos)
+CONTEXTO = 14
+
+
+def split_text(text, max_length):
+    """
+    Découpe un texte en morceaux d'au plus `max_length` caractères, aux limites des
+    strophes ; une strophe plus longue est coupée entre deux vers.
+    Chaque ligne non vide du texte est dans exactement un morceau, dans l'ordre.
+    """
+    stanzas = []
+    stanza = []
+    for line in text_lines(text):
+        line = line.rstrip("\n")
+        if line.strip():
+            stanza.append(line)
+        elif stanza:
+            stanzas.append(stanza)
+            stanza = []
+    if stanza:
+        stanzas.append(stanza)
+
+    chunks = []
+    current = []
+    size = 0
+    for stanza in stanzas:
+        stanza_size = sum(len(line) + 1 for line in stanza) + 1
+        if current and size + stanza_size > max_length:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        if stanza_size <= max_length:
+            current.extend(stanza + [""])
+            size += stanza_size
+            continue
+        # strophe trop longue pour un morceau : coupée entre deux vers
+        for line in stanza:
+            if current and size + len(line) + 1 > max_length:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def split_range(total, parts):
+    """Découpe range(total) en au plus `parts` intervalles (début, fin) consécutifs de tailles proches."""
+    parts = max(1, min(parts, total))
+    bounds = [total * i // parts for i in range(parts + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+# Tâches du pool : chacune renvoie son résultat et son chronomètre
+
+def preprocess_chunk(text):
+    with timed() as timer, stage("preprocess"):
+        return preprocess_text(text), timer
+
+
+def scan_chunk(versos):
+    with timed() as timer, stage("scansion"):
+        return analizar_versos(versos), timer
+
+
+def disambiguate_chunk(x, silabas, desplazamiento, inicio, total, metrica_mixta, versos_frecuentes):
+    with timed() as timer, stage("scansion"):
+        return desambiguar_versos(x, silabas, desplazamiento, inicio, total, metrica_mixta,
+                                  versos_frecuentes, CONTEXTO), timer
+
+
+def _pool_round(executor, fn, *iterables):
+    """Un tour de tâches dans le pool ; renvoie leurs résultats dans l'ordre (chronomètres ajoutés au chronomètre actif)."""
+    results = []
+    for result, timer in executor.map(fn, *iterables):
+        merge(timer)
+        results.append(result)
+    return results
+
+
+def analyze_long_text(text, executor=None):
+    """
+    Analyse d'un texte long découpé en morceaux traités en parallèle dans le pool de
+    processus (ou dans `executor`, qui doit avoir une méthode `map`).
+    Renvoie (scansion, results_data), comme gama.pipeline.analyze_text.
+    """
+    executor = executor or get_bulk_executor()
+    chunks = split_text(text, settings.LONG_TEXT_CHUNK_SIZE)
+
+    # 1. Prétraitement
+    prepro_lines = [line for lines in _pool_round(executor, preprocess_chunk, chunks) for line in lines]
+    with stage("scansion"):
+        versos = clean_text(gcf, prepro_lines).split("\n")
+
+    esc = scan_verses(versos, len(chunks), executor)
+
+    with stage("scansion"):
+        scansion, results_data = scan_results(text, esc)
+    count("poems")
+    count("lines", len(results_data))
+    return scansion, results_data
+
+
+def scan_verses(versos, parts, executor):
+    """
+    Scansion d'une liste de vers (tours 2 et 3) en `parts` morceaux traités en parallèle
+    dans `executor` ; même résultat que gumper.gumper.escandir_lista_versos(versos).
+    """
+    # 2. Premier calcul de la scansion, vers par vers
+    ranges = split_range(len(versos), parts)
+    x = [row for rows in _pool_round(executor, scan_chunk, [versos[a:b] for a, b in ranges]) for row in rows]
+
+    # 3. Désambiguïsation avec les mètres fréquents du poème entier
+    #    et le contexte (chevauchement de CONTEXTO vers) de chaque morceau
+    columna_silabas_v = list(map(list, zip(*x)))[2]
+    metrica_mixta, versos_frecuentes = medidas_frecuentes(columna_silabas_v)
+    total = len(x)
+    ranges = split_range(total, parts)
+    offsets = [max(0, a - CONTEXTO) for a, b in ranges]
+    esc = _pool_round(executor, disambiguate_chunk,
+                      [x[a:b] for a, b in ranges],
+                      [columna_silabas_v[offset:min(total, b + CONTEXTO)] for offset, (a, b) in zip(offsets, ranges)],
+                      offsets, [a for a, b in ranges], [total] * len(ranges),
+                      [metrica_mixta] * len(ranges), [versos_frecuentes] * len(ranges))
+    return [row for rows in esc for row in rows]
+
+
+def timed_analyze_long_text(text):
+    """analyze_long_text avec son propre chronomètre, comme gama.pipeline.timed_analyze_text."""
+    with timed() as timer, stage("analysis"):
+        scansion, results_data = analyze_long_text(text)
+    return scansion, results_data, timer
+
+
+# Threads qui répartissent les textes longs dans le pool et attendent leurs résultats
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def submit_long_analysis(text):
+    """Lance timed_analyze_long_text dans un thread ; renvoie son Future (voir gama.pipeline.submit_analysis)."""
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = ThreadPoolExecutor(max_workers=bulk_analysis_workers(),
+                                              thread_name_prefix="longdoc")
+    return _coordinator.submit(timed_analyze_long_text, text)
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from gama.corpus import CHECKPOINT_NAME, analyze_corpus
+from gama.pipeline import reset_bulk_executor
+
+
+class Command(BaseCommand):
+    """
+    Analyse hors ligne d'un dossier de poèmes (gama.corpus) : un TSV de résultats par
+    fichier txt, analyse parallèle dans le pool de processus, reprise après interruption.
+    Les fichiers longs sont analysés en morceaux (gama.longdoc), sans limite de longueur
+    par défaut (--max-length).
+    """
+    help = ("Analyze all txt files of a directory into per-file result TSVs (resumable). "
+            "Files longer than LONG_TEXT_CHUNK_SIZE characters are analyzed in chunks; "
+            "there is no length limit unless --max-length is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("input_dir", help="Directory of the corpus (txt files, searched recursively).")
+        parser.add_argument("output_dir", help="Directory of the result TSVs, errors.txt and the checkpoint.")
+        parser.add_argument("--workers", type=int, default=settings.BULK_ANALYSIS_WORKERS,
+                            help="Number of analysis processes.")
+        parser.add_argument("--pattern", default="*.txt", help="Glob pattern of the files to analyze.")
+        parser.add_argument("--max-length", type=int, default=0,
+                            help="Maximum length of a file in characters; longer files are listed in "
+                                 "errors.txt (default: 0, no limit).")
+        parser.add_argument("--progress-every", type=int, default=100,
+                            help="Report progress every N files (0: never).")
+
+    def handle(self, *args, **options):
+        every = options["progress_every"]
+
+        def progress(relpath, stats):
+            if every and (stats.done + stats.errors) % every == 0:
+                self.stdout.write(f"{stats.done} done, {stats.errors} errors, "
+                                  f"{stats.lines_per_second:.1f} lines/s ({relpath})")
+
+        try:
+            stats = self.analyze(options, progress)
+        except KeyboardInterrupt as e:
+            self.report(e.stats)
+            raise CommandError(f"Interrupted: run the command again to resume ({CHECKPOINT_NAME}).")
+        except Exception as e:
+            if hasattr(e, "stats"):
+                self.report(e.stats)
+            raise CommandError(f"{e}: run the command again to resume ({CHECKPOINT_NAME}).")
+        self.report(stats)
+
+    def analyze(self, options, progress):
+        # Pool de la taille demandée : créé pendant la commande seulement, sans modifier les
+        # réglages du processus (call_command depuis un worker ou les tests)
+        with override_settings(BULK_ANALYSIS_WORKERS=options["workers"]):
+            reset_bulk_executor(wait=True)
+            try:
+                return analyze_corpus(options["input_dir"], options["output_dir"], self.results_header(),
+                                      pattern=options["pattern"], max_pending=2 * options["workers"],
+                                      progress=progress, max_length=options["max_length"])
+            finally:
+                reset_bulk_executor(wait=True)
+
+    def results_header(self):
+        from gama.views import results_header
+        return results_header()
+
+    def report(self, stats):
+        self.stdout.write(f"{stats.done} files analyzed, {stats.skipped} already done, {stats.errors} errors")
+        self.stdout.write(f"{stats.lines} lines in {stats.seconds:.1f} s: {stats.lines_per_second:.1f} lines/s")
@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gama.loadtest import ENDPOINTS, example_texts, run_load_test
+
+
+class Command(BaseCommand):
+    """
+    Test de charge d'un serveur local (gama.loadtest) : rapport JSON avec débit,
+    latences p50/p95/p99 et taux d'erreur par vue.
+    """
+    help = "Load test a running server and report throughput, latency percentiles and error rate as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Number of virtual users.")
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument("--iterations", type=int, help="Visits per virtual user (default: 1).")
+        group.add_argument("--duration", type=float, help="Seconds of visits per virtual user.")
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                            help=f"Comma-separated views to request, among: {', '.join(ENDPOINTS)}.")
+        parser.add_argument("--bulk-files", type=int, default=3, help="Texts in each bulk_analysis ZIP.")
+        parser.add_argument("--unique", action="store_true",
+                            help="Only send distinct synthetic texts (no analysis cache hits).")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the text choices.")
+        parser.add_argument("--timeout", type=float, default=300, help="Timeout of a request (seconds).")
+        parser.add_argument("--output", help="File of the JSON report (default: standard output).")
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options["endpoints"].split(",") if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        examples = example_texts(Path(settings.BASE_DIR) / "gama" / "ext_data" / "ex_poem.json")
+        report = run_load_test(options["url"], examples, concurrency=options["concurrency"],
+                               iterations=options["iterations"], duration=options["duration"],
+                               endpoints=endpoints, bulk_files=options["bulk_files"],
+                               unique=options["unique"], seed=options["seed"], timeout=options["timeout"])
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output + "\n", encoding="utf-8")
+            total = report["total"]
+            self.stdout.write(f"{total['requests']} requests, {total['throughput_rps']} req/s, "
+                              f"p95 {total['latency_ms']['p95']} ms, error rate {total['error_rate']}")
+        else:
+            self.stdout.write(output)
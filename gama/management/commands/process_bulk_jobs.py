@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gama.jobs import delete_old_jobs, requeue_stale_jobs, run_next_job
+
+
+class Command(BaseCommand):
+    """
+    Worker local des analyses par lot : traite les jobs en file (gama.models.BulkJob),
+    un job à la fois, les fichiers d'un job étant analysés en parallèle dans le pool
+    de processus (settings.BULK_ANALYSIS_WORKERS).
+    """
+    help = "Process queued bulk-analysis jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Process the queued jobs and exit instead of polling.")
+        parser.add_argument("--poll-interval", type=float, default=settings.BULK_JOB_POLL_INTERVAL,
+                            help="Seconds between two checks of an empty queue.")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                # Jobs interrompus par l'arrêt d'un worker (pas ceux des workers actifs)
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} interrupted job(s)")
+                delete_old_jobs()
+                job = run_next_job()
+                if job is not None:
+                    self.stdout.write(f"Job {job.pk} ({job.zip_name}): {job.status}")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,353 @@
+"""
+Métriques de l'application au format texte de Prometheus (vue metrics, `/metrics`).
+
+Chaque processus (workers Django, worker des jobs) garde ses métriques en mémoire et
+les écrit dans son propre fichier de `settings.METRICS_DIR` (`<pid>.json`, écriture
+atomique) : après chaque job, après les requêtes au plus une fois par FLUSH_INTERVAL
+secondes (pas une écriture par requête), et à la sortie du processus. La vue metrics
+additionne les fichiers de tous les processus. Les compteurs et histogrammes des
+processus arrêtés sont reportés dans `retired.json` et leurs fichiers supprimés ;
+leurs jauges sont ignorées.
+
+Les durées des étapes et les compteurs du pipeline (poèmes et vers analysés, tokens OOV
+normalisés, requêtes KenLM, mémo des syllabations, cache) viennent du chronomètre de la requête
+(gama.pipeline.timed, voir gama.middleware).
+"""
+
+import atexit
+from collections import defaultdict
+import fcntl
+import json
+import math
+import os
+from pathlib import Path
+import threading
+import time
+
+from django.conf import settings
+
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+
+# nom : (type, description)
+METRICS = {
+    "gama_requests_total": ("counter", "HTTP requests by view, method and status."),
+    "gama_request_duration_seconds": ("histogram", "HTTP request latency by view (until the response is returned)."),
+    "gama_stage_seconds_total": ("counter", "Time spent in each stage of the analysis."),
+    "gama_analysis_cache_requests_total": ("counter", "Analysis cache lookups by result (hit, miss)."),
+    "gama_analysis_cache_hit_ratio": ("gauge", "Ratio of analysis cache lookups that were hits."),
+    "gama_poems_analyzed_total": ("counter", "Poems preprocessed and scanned (cache misses)."),
+    "gama_lines_analyzed_total": ("counter", "Lines preprocessed and scanned (cache misses)."),
+    "gama_oov_tokens_total": ("counter", "Out-of-vocabulary tokens sent to the normalizer."),
+    "gama_oov_normalized_total": ("counter", "Out-of-vocabulary tokens replaced by a normalization candidate."),
+    "gama_lm_queries_total": ("counter", "KenLM scoring queries."),
+    "gama_syllabification_memo_requests_total": ("counter", "Word syllabification memo lookups by result (hit, miss)."),
+    "gama_syllabification_lexicon_hits_total": ("counter", "Words syllabified from the precomputed lexicon."),
+    "gama_analyses_in_progress": ("gauge", "Analyses submitted to the process pools and not finished."),
+    "gama_bulk_jobs": ("gauge", "Background bulk jobs by status (queue depth: queued)."),
+    "gama_admission_running": ("gauge", "Analyses holding an admission slot on the host."),
+    "gama_admission_queued": ("gauge", "Analysis requests waiting for an admission slot on the host."),
+    "gama_admission_max_running": ("gauge", "Admission limit: ANALYSIS_MAX_CONCURRENT."),
+    "gama_admission_max_queued": ("gauge", "Admission limit: ANALYSIS_MAX_QUEUED."),
+    "gama_admission_wait_seconds": ("histogram", "Time spent waiting for an admission slot."),
+    "gama_admission_rejected_total": ("counter", "Analysis requests rejected with a 503, by reason (queue_full, timeout)."),
+}
+
+# compteur du chronomètre (gama.pipeline.count) : (métrique, labels)
+TIMER_COUNTS = {
+    "cache_hits": ("gama_analysis_cache_requests_total", {"result": "hit"}),
+    "cache_misses": ("gama_analysis_cache_requests_total", {"result": "miss"}),
+    "poems": ("gama_poems_analyzed_total", {}),
+    "lines": ("gama_lines_analyzed_total", {}),
+    "oov_tokens": ("gama_oov_tokens_total", {}),
+    "oov_normalized": ("gama_oov_normalized_total", {}),
+    "lm_queries": ("gama_lm_queries_total", {}),
+    "syllabify_hits": ("gama_syllabification_memo_requests_total", {"result": "hit"}),
+    "syllabify_misses": ("gama_syllabification_memo_requests_total", {"result": "miss"}),
+    "lexicon_hits": ("gama_syllabification_lexicon_hits_total", {}),
+}
+
+_lock = threading.Lock()
+# (nom, labels) -> valeur ; labels : tuple trié de (label, valeur)
+_counters = defaultdict(float)
+_gauges = defaultdict(float)
+# (nom, labels) -> [nombre d'observations par borne..., somme]
+_histograms = {}
+_loaded = False
+
+# Intervalle minimal entre deux écritures du fichier du processus après une requête (secondes)
+FLUSH_INTERVAL = 1.0
+# Fichier des compteurs et histogrammes des processus arrêtés
+RETIRED_FILE = "retired.json"
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+# METRICS_DIR des métriques pas encore écrites (écrites à la sortie du processus)
+_pending_dir = None
+_atexit_registered = False
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _metrics_file(pid=None):
+    return Path(settings.METRICS_DIR) / f"{pid or os.getpid()}.json"
+
+
+def _load_previous():
+    """
+    Reprend les compteurs d'un fichier laissé par un processus arrêté qui avait le même
+    pid, pour ne pas les écraser au premier enregistrement.
+    """
+    global _loaded
+    _loaded = True
+    if not settings.METRICS_DIR:
+        return
+    try:
+        with open(_metrics_file(), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    for name, labels, value in data["counters"]:
+        _counters[(name, _labels(labels))] += value
+    for name, labels, values in data["histograms"]:
+        key = (name, _labels(labels))
+        _histograms[key] = [a + b for a, b in zip(_histograms.get(key, [0] * len(values)), values)]
+
+
+def inc(name, labels=None, value=1):
+    """Incrémente un compteur."""
+    with _lock:
+        if not _loaded:
+            _load_previous()
+        _counters[(name, _labels(labels or {}))] += value
+
+
+def add_gauge(name, value, labels=None):
+    """Ajoute `value` (éventuellement négative) à une jauge du processus."""
+    with _lock:
+        _gauges[(name, _labels(labels or {}))] += value
+
+
+def observe(name, value, labels=None):
+    """Ajoute une observation (secondes) à un histogramme de latence."""
+    with _lock:
+        if not _loaded:
+            _load_previous()
+        key = (name, _labels(labels or {}))
+        values = _histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 1))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                values[i] += 1
+        values[-1] += value
+
+
+def record_timer(timer):
+    """Ajoute les durées des étapes et les compteurs d'un chronomètre (gama.pipeline.timed)."""
+    for stage, seconds in timer.durations.items():
+        if stage != "total":
+            inc("gama_stage_seconds_total", {"stage": stage}, seconds)
+    for event, n in timer.counts.items():
+        if event in TIMER_COUNTS:
+            name, labels = TIMER_COUNTS[event]
+            inc(name, labels, n)
+
+
+def record_request(view, method, status, seconds, timer):
+    """
+    Enregistre une requête HTTP et son chronomètre. Le fichier du processus est écrit au plus
+    une fois par FLUSH_INTERVAL secondes (cette fonction est appelée sur la boucle d'événements
+    pour les vues asynchrones).
+    """
+    inc("gama_requests_total", {"view": view, "method": method, "status": str(status)})
+    observe("gama_request_duration_seconds", seconds, {"view": view})
+    record_timer(timer)
+    flush(min_interval=FLUSH_INTERVAL)
+
+
+def _snapshot():
+    with _lock:
+        if not _loaded:
+            _load_previous()
+        return {
+            "pid": os.getpid(),
+            "counters": [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+            "gauges": [[name, dict(labels), value] for (name, labels), value in _gauges.items()],
+            "histograms": [[name, dict(labels), list(values)] for (name, labels), values in _histograms.items()],
+        }
+
+
+def flush(min_interval=0):
+    """
+    Écrit les métriques du processus dans son fichier de METRICS_DIR (si défini).
+    `min_interval` : ne rien écrire si le fichier l'a été il y a moins de `min_interval`
+    secondes ; les métriques seront écrites par la prochaine écriture, au plus tard à la
+    sortie du processus.
+    """
+    global _last_flush, _pending_dir, _atexit_registered
+    metrics_dir = settings.METRICS_DIR
+    if not metrics_dir:
+        return
+    with _flush_lock:
+        now = time.monotonic()
+        if now - _last_flush < min_interval:
+            _pending_dir = metrics_dir
+            if not _atexit_registered:
+                atexit.register(_flush_pending)
+                _atexit_registered = True
+            return
+        _last_flush = now
+        _pending_dir = None
+    _write(Path(metrics_dir))
+
+
+def _flush_pending():
+    if _pending_dir:
+        _write(Path(_pending_dir))
+
+
+def _write(metrics_dir):
+    path = metrics_dir / f"{os.getpid()}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(data, other):
+    """Ajoute à `data` les compteurs et histogrammes de `other` (contenus de fichiers de métriques)."""
+    counters = defaultdict(float, {(name, _labels(labels)): value for name, labels, value in data["counters"]})
+    for name, labels, value in other["counters"]:
+        counters[(name, _labels(labels))] += value
+    histograms = {(name, _labels(labels)): values for name, labels, values in data["histograms"]}
+    for name, labels, values in other["histograms"]:
+        key = (name, _labels(labels))
+        histograms[key] = [a + b for a, b in zip(histograms.get(key, [0] * len(values)), values)]
+    data["counters"] = [[name, dict(labels), value] for (name, labels), value in counters.items()]
+    data["histograms"] = [[name, dict(labels), values] for (name, labels), values in histograms.items()]
+
+
+def _retire_dead_processes(metrics_dir):
+    """
+    Reporte les compteurs et histogrammes des fichiers des processus arrêtés dans RETIRED_FILE,
+    puis supprime ces fichiers (un seul processus à la fois : verrou sur `.lock`).
+    """
+    with open(metrics_dir / ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [path for path in metrics_dir.glob("*.json")
+                if path.stem.isdigit() and int(path.stem) != os.getpid() and not _pid_alive(int(path.stem))]
+        if not dead:
+            return
+        retired_path = metrics_dir / RETIRED_FILE
+        try:
+            with open(retired_path, encoding="utf-8") as f:
+                retired = json.load(f)
+        except (OSError, ValueError):
+            retired = {"pid": None, "counters": [], "gauges": [], "histograms": []}
+        for path in dead:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    _merge(retired, json.load(f))
+            except (OSError, ValueError):
+                pass
+        tmp_path = retired_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(retired, f)
+        os.replace(tmp_path, retired_path)
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """
+    Additionne les métriques de tous les processus (fichiers de METRICS_DIR, ou seulement
+    le processus courant si METRICS_DIR n'est pas défini).
+    Renvoie (compteurs, jauges, histogrammes), indexés par (nom, labels).
+    """
+    flush()
+    snapshots = [_snapshot()]
+    if settings.METRICS_DIR:
+        _retire_dead_processes(Path(settings.METRICS_DIR))
+        snapshots = []
+        for path in Path(settings.METRICS_DIR).glob("*.json"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    counters = defaultdict(float)
+    gauges = defaultdict(float)
+    histograms = {}
+    for data in snapshots:
+        for name, labels, value in data["counters"]:
+            counters[(name, _labels(labels))] += value
+        # jauges des processus arrêtés ignorées
+        if data["pid"] is not None and (data["pid"] == os.getpid() or _pid_alive(data["pid"])):
+            for name, labels, value in data["gauges"]:
+                gauges[(name, _labels(labels))] += value
+        for name, labels, values in data["histograms"]:
+            key = (name, _labels(labels))
+            histograms[key] = [a + b for a, b in zip(histograms.get(key, [0] * len(values)), values)]
+    return counters, gauges, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def exposition(extra_gauges=()):
+    """
+    Métriques de tous les processus au format texte de Prometheus (version 0.0.4).
+    `extra_gauges` : jauges calculées au moment de la lecture, liste de (nom, labels, valeur).
+    """
+    counters, gauges, histograms = collect()
+    for name, labels, value in extra_gauges:
+        gauges[(name, _labels(labels))] = value
+    hits = counters.get(("gama_analysis_cache_requests_total", (("result", "hit"),)), 0)
+    misses = counters.get(("gama_analysis_cache_requests_total", (("result", "miss"),)), 0)
+    if hits + misses:
+        gauges[("gama_analysis_cache_hit_ratio", ())] = hits / (hits + misses)
+
+    lines = []
+    for name, (mtype, description) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {mtype}")
+        if mtype == "histogram":
+            for (hname, labels), values in sorted(histograms.items()):
+                if hname != name:
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, values):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {values[len(LATENCY_BUCKETS) - 1]}")
+        else:
+            series = counters if mtype == "counter" else gauges
+            for (sname, labels), value in sorted(series.items()):
+                if sname == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,69 @@
+"""
+Mesure du temps passé dans chaque étape des requêtes, et métriques des requêtes.
+
+Le middleware active un chronomètre par requête (module timing du preprocessing,
+via gama.pipeline) : les vues (cache, analyse, enregistrement, rendu...), le pipeline
+de prétraitement (chargement des modèles, candidats, KenLM, syllabation...), le pool
+de processus et le service de prétraitement y ajoutent la durée de leurs étapes.
+
+Les durées sont envoyées dans l'en-tête HTTP `Server-Timing` et journalisées en une
+ligne JSON par requête (logger `gama.timing`). Pour une réponse en streaming, seul le
+temps passé avant l'envoi du premier octet est mesuré.
+
+Chaque requête est aussi comptée dans les métriques Prometheus (gama.metrics) : nombre de
+requêtes, latence par vue, durées des étapes et compteurs du chronomètre.
+"""
+
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+from .pipeline import timed
+
+logger = logging.getLogger("gama.timing")
+
+
+def add_timing(request, response, timer, start):
+    """
+    Ajoute la durée totale, l'en-tête Server-Timing et la ligne de log JSON de la requête,
+    et l'enregistre dans les métriques.
+    """
+    total = time.perf_counter() - start
+    timer.add("total", total)
+    response["Server-Timing"] = timer.server_timing()
+    durations = timer.milliseconds()
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match else None
+    # Vue inconnue (404...) : un seul label, pour ne pas créer une série par URL
+    metrics.record_request(view or "unmatched", request.method, response.status_code, total, timer)
+    logger.info(json.dumps({
+        "method": request.method,
+        "path": request.path,
+        "view": view,
+        "status": response.status_code,
+        "total_ms": durations.pop("total"),
+        "stages": durations,
+    }))
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Chronomètre chaque requête (vues synchrones et asynchrones)."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            with timed() as timer:
+                response = await get_response(request)
+            return add_timing(request, response, timer, start)
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            with timed() as timer:
+                response = get_response(request)
+            return add_timing(request, response, timer, start)
+    return middleware
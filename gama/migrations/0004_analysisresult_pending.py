@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gama', '0003_analysisresult'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analysisresult',
+            name='results_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,100 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class BulkJob(models.Model):
+    """
+    Analyse par lot en tâche de fond : un ZIP soumis, dont les fichiers sont
+    analysés par le worker local (commande `process_bulk_jobs`).
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    zip_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # mis à jour par le worker pendant le traitement (jobs d'un worker arrêté : gama.jobs.requeue_stale_jobs)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.zip_name} ({self.status})"
+
+
+class BulkJobFile(models.Model):
+    """
+    Un fichier texte d'un BulkJob, avec son état et ses résultats
+    (results_data de gumper_main, pour l'export tsv).
+    """
+    QUEUED = "queued"
+    DONE = "done"
+    ERROR = "error"
+    TOO_LONG = "too_long"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (DONE, "Done"),
+        (ERROR, "Error"),
+        (TOO_LONG, "Too long"),
+    ]
+
+    job = models.ForeignKey(BulkJob, related_name="files", on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)
+    text = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(blank=True)
+    results_data = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["job", "position"]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class AnalysisCacheEntry(models.Model):
+    """
+    Résultat d'analyse mis en cache (gama.cache), adressé par le contenu :
+    la clé est un hash du texte, des options du pipeline et des versions des données.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    scansion = models.JSONField()
+    results_data = models.JSONField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class AnalysisResult(models.Model):
+    """
+    Résultat d'une analyse de texte, référencé depuis la session par son id
+    (gama.results) : texte, métadonnées et une ligne de résultats par vers.
+    Le tableau html de la page de résultats est généré à partir de results_data.
+    results_data est None tant que l'analyse est en cours (résultats envoyés en streaming).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    text = models.TextField()
+    metadata = models.JSONField(default=dict)
+    results_data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.id)
@@ -0,0 +1,349 @@
+"""
+Accès au pipeline de prétraitement (normalisation + syllabation) depuis les vues.
+
+Le pipeline (vocabulaire, modèle KenLM...) est chargé une seule fois par processus,
+au premier appel, puis réutilisé pour toutes les requêtes. Les analyses se font dans
+le pool de processus (get_bulk_executor) : avec `settings.PRELOAD_MODELS`, les modèles
+sont chargés avant la création du pool (gama.warmup.preload), et ses processus, créés
+par fork, en partagent les pages (copie sur écriture).
+
+Si `settings.PREPRO_SERVICE_SOCKET` est défini, le prétraitement est délégué au
+service partagé (preprocessing/service.py) via un client avec pool de connexions :
+les modèles ne sont alors chargés que par les workers du service.
+
+Les étapes de l'analyse sont chronométrées, et ses événements comptés (poèmes, vers,
+tokens OOV, requêtes KenLM...), avec le module timing du preprocessing (réexporté ici :
+`stage`, `count`, `timed`, `merge`) quand un chronomètre est actif
+(gama.middleware.server_timing_middleware).
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from gumper import config as gcf
+from gumper.gumper_client_web import scan_text
+
+# Les modules de preprocessing s'importent entre eux sans préfixe de paquet
+# (`import config as cf`...), leur dossier doit donc être dans le sys.path
+if str(settings.PREPRO_DIR) not in sys.path:
+    sys.path.insert(0, str(settings.PREPRO_DIR))
+
+from pipeline import text_lines  # noqa: E402
+from timing import count, merge, stage, timed  # noqa: E402
+
+from . import metrics  # noqa: E402
+
+
+# Options du pipeline, équivalentes à `g2s_client_running_text.py -p -d -n -s`
+PIPELINE_OPTIONS = {"preprocess": True, "destress": True, "normalize": True, "spanishfy": True}
+
+# Longueur maximale (caractères) d'un texte à analyser, hors mode texte long (gama.longdoc)
+MAX_TEXT_LENGTH = 4500
+
+
+def max_text_length():
+    """Longueur maximale d'un texte à analyser : settings.LONG_TEXT_MAX_LENGTH si le mode texte long est activé."""
+    return settings.LONG_TEXT_MAX_LENGTH or MAX_TEXT_LENGTH
+
+
+def pipeline_options():
+    """
+    Options effectives du pipeline : PIPELINE_OPTIONS, ou, avec des modèles de substitution
+    (settings.PREPRO_STAND_IN_MODELS), sans normalisation.
+    """
+    if settings.PREPRO_STAND_IN_MODELS:
+        return {**PIPELINE_OPTIONS, "normalize": False, "stand_in": True}
+    return PIPELINE_OPTIONS
+
+
+@lru_cache(maxsize=1)
+def get_pipeline():
+    """
+    Renvoie le pipeline de prétraitement du worker (créé au premier appel),
+    avec les options PIPELINE_OPTIONS.
+
+    Avec settings.PREPRO_STAND_IN_MODELS (tests de charge sans les modèles), le vocabulaire
+    n'est pas chargé (pas de normalisation) et KenLM est remplacé par StandInLMManager.
+    """
+    from pipeline import PreprocessingPipeline
+    if settings.PREPRO_STAND_IN_MODELS:
+        from normalization.lm_manager import StandInLMManager
+        return PreprocessingPipeline(**{**PIPELINE_OPTIONS, "normalize": False}, nglm=StandInLMManager())
+    return PreprocessingPipeline(**PIPELINE_OPTIONS)
+
+
+@lru_cache(maxsize=1)
+def get_service_client():
+    """
+    Renvoie le client du service de prétraitement partagé (créé au premier appel).
+    """
+    from service import PreprocessingClient
+    return PreprocessingClient(settings.PREPRO_SERVICE_SOCKET,
+                               pool_size=settings.PREPRO_SERVICE_POOL_SIZE,
+                               timeout=settings.PREPRO_SERVICE_TIMEOUT)
+
+
+def preprocess_text(text):
+    """
+    Prétraite un texte et renvoie ses lignes normalisées
+    (contenu du fichier `*_pp_out_norm_spa_*.txt` du script de preprocessing).
+    Passe par le service partagé s'il est configuré, sinon par le pipeline du worker.
+    """
+    if settings.PREPRO_SERVICE_SOCKET:
+        return get_service_client().process(text)
+    return get_pipeline().process(text)
+
+
+
+def analyze_text(text):
+    """
+    Prétraitement + analyse métrique d'un texte, entièrement en mémoire
+    (aucun fichier écrit).
+
+    Renvoie (scansion, results_data) :
+    - scansion : lignes html du tableau de résultats
+    - results_data : liste de dictionnaires (une ligne par vers) pour l'export tsv
+    """
+    with stage("preprocess"):
+        prepro_lines = preprocess_text(text)
+    with stage("scansion"):
+        scansion, results_data = scan_text(gcf, text, prepro_lines)
+    count("poems")
+    count("lines", len(results_data))
+    return scansion, results_data
+
+
+def timed_analyze_text(text):
+    """
+    analyze_text avec son propre chronomètre, pour un processus du pool.
+    Renvoie (scansion, results_data, chronomètre) ;
+    `analysis` est la durée totale de l'analyse dans le processus.
+    """
+    with timed() as timer, stage("analysis"):
+        scansion, results_data = analyze_text(text)
+    return scansion, results_data, timer
+
+
+def timed_scan_line(line):
+    """
+    Prétraitement et scansion provisoire d'une ligne seule, pour un processus du pool
+    (analyse en streaming, gama.stream). Renvoie (lignes prétraitées, lignes du tableau,
+    chronomètre) ; aucune ligne du tableau si le prétraitement est vide.
+    """
+    with timed() as timer:
+        with stage("preprocess"):
+            prepro_lines = preprocess_text(line)
+        rows = []
+        if any(pp.strip() for pp in prepro_lines):
+            with stage("line_scansion"):
+                _scansion, rows = scan_text(gcf, line, prepro_lines)
+    return prepro_lines, rows, timer
+
+
+def timed_scan_text(text, prepro_lines):
+    """
+    Scansion du poème complet à partir de ses lignes prétraitées (timed_scan_line),
+    pour un processus du pool. Renvoie (scansion, results_data, chronomètre).
+    """
+    with timed() as timer:
+        with stage("scansion"):
+            scansion, results_data = scan_text(gcf, text, prepro_lines)
+        count("poems")
+        count("lines", len(results_data))
+    return scansion, results_data, timer
+
+
+def submit_analysis(text, long_text=None):
+    """
+    Envoie l'analyse d'un texte au pool de processus (timed_analyze_text), ou, en mode
+    texte long, ses morceaux si le texte est plus long que settings.LONG_TEXT_CHUNK_SIZE
+    (gama.longdoc). Le résultat est à récupérer avec analysis_result ou analyze_in_pool.
+    `long_text` : mode texte long, par défaut s'il est activé (settings.LONG_TEXT_MAX_LENGTH).
+    """
+    if long_text is None:
+        long_text = bool(settings.LONG_TEXT_MAX_LENGTH)
+    metrics.add_gauge("gama_analyses_in_progress", 1)
+    submitted_at = time.perf_counter()
+    if long_text and len(text) > settings.LONG_TEXT_CHUNK_SIZE:
+        from .longdoc import submit_long_analysis
+        future = submit_long_analysis(text)
+    else:
+        future = get_bulk_executor().submit(timed_analyze_text, text)
+    future.submitted_at = submitted_at
+    future.add_done_callback(_analysis_done)
+    return future
+
+
+def _analysis_done(future):
+    future.finished_at = time.perf_counter()
+    metrics.add_gauge("gama_analyses_in_progress", -1)
+
+
+def analysis_result(future):
+    """
+    Attend le résultat (scansion, results_data) d'une analyse envoyée par submit_analysis.
+    Le chronomètre du processus est ajouté au chronomètre actif, avec `pool_wait` :
+    attente d'un processus libre (ou de son démarrage) et échanges.
+    """
+    scansion, results_data, timer = future.result()
+    finished_at = getattr(future, "finished_at", None) or time.perf_counter()
+    timer.add("pool_wait", max(finished_at - future.submitted_at - timer.durations["analysis"], 0.0))
+    merge(timer)
+    return scansion, results_data
+
+
+async def analyze_in_pool(text):
+    """Analyse un texte dans le pool de processus sans bloquer la boucle d'événements."""
+    future = submit_analysis(text)
+    await asyncio.wrap_future(future)
+    return analysis_result(future)
+
+
+# Pool de processus pour l'analyse par lot ----------------------
+
+_executor = None
+# processus qui a créé le pool (un pool hérité par fork n'est pas utilisable)
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# Modèles chargés dans ce processus, ou dans son parent avant le fork (gama.warmup.preload) :
+# les processus du pool sont alors créés par fork et partagent leurs pages
+_models_preloaded = False
+_fork_hooks_registered = False
+# fork des processus du pool en cours (gardé dans ces processus)
+_forking_pool = False
+
+# Réglages transmis aux processus du pool : lancés en "spawn", ils relisent gamaweb.settings,
+# sans les réglages modifiés dans le processus parent (ex. override_settings des tests)
+POOL_SETTINGS = ["PREPRO_SERVICE_SOCKET", "PREPRO_SERVICE_POOL_SIZE", "PREPRO_SERVICE_TIMEOUT",
+                 "PREPRO_STAND_IN_MODELS"]
+
+# Durées de chargement des ressources dans ce processus du pool (_init_bulk_worker)
+_worker_load_durations = {}
+
+
+def _init_bulk_worker(pool_settings=None):
+    """
+    Précharge les ressources des analyses dans chaque processus du pool (gama.warmup.warm_up ;
+    pas les modèles si service partagé) et garde leurs durées de chargement pour warm_up_pool.
+    """
+    for name, value in (pool_settings or {}).items():
+        setattr(settings, name, value)
+    from .warmup import warm_up
+    _worker_load_durations.update(warm_up())
+
+
+def _warm_up_worker(barrier):
+    """Tâche de warm_up_pool : attend que tous les processus du pool aient la leur, renvoie (pid, durées)."""
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    return os.getpid(), dict(_worker_load_durations)
+
+
+def warm_up_pool(timeout=600):
+    """
+    Lance tous les processus du pool d'analyse et attend qu'ils aient chargé leurs ressources.
+    Renvoie, pour chaque processus (pid), la durée de chargement de chaque ressource (secondes).
+
+    Les processus sont lancés à la demande : une tâche par processus, chacune attendant les
+    autres (barrière, au plus `timeout` secondes), pour que chaque processus en reçoive une.
+    """
+    executor = get_bulk_executor()
+    workers = bulk_analysis_workers()
+    with mp.get_context("spawn").Manager() as manager:
+        barrier = manager.Barrier(workers, timeout=timeout)
+        futures = [executor.submit(_warm_up_worker, barrier) for _ in range(workers)]
+        return dict(future.result() for future in futures)
+
+
+def bulk_analysis_workers():
+    """
+    Taille du pool d'analyse d'un worker Django : `settings.BULK_ANALYSIS_WORKERS`, limitée
+    pour que tous les workers de la machine n'aient pas plus de
+    `settings.ANALYSIS_PROCESSES_PER_HOST` processus d'analyse à eux tous. Le nombre de workers
+    est lu dans la variable d'environnement WEB_CONCURRENCY (celle de gunicorn et uvicorn),
+    1 si elle n'est pas définie.
+    """
+    workers = settings.BULK_ANALYSIS_WORKERS
+    if settings.ANALYSIS_PROCESSES_PER_HOST:
+        web_workers = int(os.environ.get("WEB_CONCURRENCY") or 1)
+        workers = min(workers, max(settings.ANALYSIS_PROCESSES_PER_HOST // web_workers, 1))
+    return workers
+
+
+def get_bulk_executor():
+    """
+    Renvoie le pool de processus de l'analyse par lot, créé au premier appel
+    (taille : bulk_analysis_workers) et partagé par les requêtes du worker
+    (analyse par lot, API, vues asynchrones analysis et bulk_analysis).
+
+    Si les modèles ont été préchargés (use_preloaded_models), tous les processus du pool sont
+    créés tout de suite par fork et héritent des modèles. Sinon, ils sont lancés en "spawn"
+    (pas de fork d'un worker Django qui peut avoir des threads) et chargent chacun les leurs.
+    """
+    global _executor, _executor_pid, _forking_pool
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            context = mp.get_context("fork" if _models_preloaded else "spawn")
+            _executor = ProcessPoolExecutor(max_workers=bulk_analysis_workers(), mp_context=context,
+                                            initializer=_init_bulk_worker,
+                                            initargs=({name: getattr(settings, name) for name in POOL_SETTINGS},))
+            _executor_pid = os.getpid()
+            if _models_preloaded:
+                # avec fork, tous les processus sont créés à la première tâche : maintenant, pas
+                # plus tard depuis une requête (threads du worker)
+                _forking_pool = True
+                try:
+                    _executor.submit(os.getpid)
+                finally:
+                    _forking_pool = False
+        return _executor
+
+
+def reset_bulk_executor(wait=False):
+    """
+    Abandonne le pool (ex. après BrokenProcessPool), un nouveau sera créé au prochain appel.
+    `wait` : attendre l'arrêt de ses processus et de ses threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+
+
+def use_preloaded_models():
+    """
+    Indique que les modèles sont chargés dans ce processus (gama.warmup.preload) : le pool
+    d'analyse sera créé par fork, dans ce processus et dans ceux qu'il forkera ensuite.
+
+    Pour un maître (gunicorn --preload), son pool est arrêté avant chaque fork d'un worker
+    (le fork se fait sans ses threads), et chaque worker crée le sien juste après le fork,
+    avant d'avoir des threads : workers et processus du pool partagent les pages des modèles.
+    """
+    global _models_preloaded, _fork_hooks_registered
+    _models_preloaded = True
+    if not _fork_hooks_registered:
+        os.register_at_fork(before=_before_fork, after_in_child=_after_fork_in_child)
+        _fork_hooks_registered = True
+
+
+def _before_fork():
+    if _models_preloaded and not _forking_pool:
+        reset_bulk_executor(wait=True)
+
+
+def _after_fork_in_child():
+    if _models_preloaded and not _forking_pool:
+        get_bulk_executor()
@@ -0,0 +1,60 @@
+"""
+Stockage côté serveur des résultats d'analyse.
+
+Chaque analyse est enregistrée une seule fois dans la base (gama.models.AnalysisResult) ;
+la session ne contient que son id. La page de résultats et l'export sont générés à
+partir de ce résultat, ce qui évite de sérialiser le tableau html et les lignes de
+résultats dans la session à chaque requête.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from gumper.gumper_client_web import scansion_row
+
+from .models import AnalysisResult
+
+# Clé de session de l'id du résultat de la dernière analyse
+SESSION_KEY = "analysis_id"
+
+
+def save_result(request, text, metadata, results_data):
+    """
+    Enregistre le résultat d'une analyse et le référence depuis la session.
+    Supprime au passage les résultats expirés (plus vieux que settings.ANALYSIS_RESULT_MAX_AGE).
+    """
+    delete_expired_results()
+    result = AnalysisResult.objects.create(text=text, metadata=metadata, results_data=results_data)
+    request.session[SESSION_KEY] = str(result.pk)
+    return result
+
+
+def get_result(request):
+    """Renvoie le résultat de la dernière analyse de la session, ou None."""
+    result_id = request.session.get(SESSION_KEY)
+    if not result_id:
+        return None
+    return AnalysisResult.objects.filter(pk=result_id).first()
+
+
+def forget_result(request):
+    """Supprime la référence au résultat de la session."""
+    request.session.pop(SESSION_KEY, None)
+
+
+def delete_expired_results():
+    """Supprime les résultats plus vieux que settings.ANALYSIS_RESULT_MAX_AGE."""
+    limit = timezone.now() - timedelta(seconds=settings.ANALYSIS_RESULT_MAX_AGE)
+    AnalysisResult.objects.filter(created_at__lt=limit).delete()
+
+
+def scansion_rows(results_data):
+    """Lignes html du tableau de résultats (identiques à celles de gumper)."""
+    return [scansion_row(row) for row in results_data]
+
+
+def render_scansion(results_data):
+    """Contenu html du tableau de résultats."""
+    return "".join(scansion_rows(results_data))
@@ -0,0 +1,164 @@
+"""
+Envoi des résultats d'une analyse ligne par ligne (server-sent events).
+
+Le prétraitement d'une ligne ne dépend que de cette ligne : chaque ligne est
+prétraitée et scandée dans le pool de processus de l'analyse (gama.pipeline), et sa
+ligne de tableau est envoyée au client dès qu'elle est prête (événement `line`). La
+scansion de gumper tient compte du contexte (mètres les plus fréquents du poème), les
+lignes envoyées sont donc provisoires : une fois tout le texte prétraité, le poème
+complet est scandé (dans le pool) et le tableau définitif est envoyé (événement
+`done`) puis enregistré (gama.results, gama.cache).
+
+L'analyse occupe une place du contrôle d'admission (gama.admission) pendant tout
+l'envoi. Sous ASGI, les événements sont produits par un itérateur asynchrone
+(aanalysis_events) : sinon Django lirait tout le générateur avant d'envoyer la réponse.
+"""
+
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from gumper.gumper_client_web import scansion_row
+
+from . import metrics
+from .admission import AdmissionRejected, aadmitted, admitted
+from .cache import get_cached_analysis, store_analysis
+from .export import _aiter
+from .pipeline import get_bulk_executor, merge, reset_bulk_executor, text_lines, timed_scan_line, timed_scan_text
+
+
+def sse_event(event, data):
+    """Message server-sent events : type d'événement et données JSON."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _analysis_steps(text):
+    """
+    Analyse de `text` dans le pool de processus. Générateur qui produit les événements
+    `line` et les futures des tâches du pool : le pilote (analysis_events ou
+    aanalysis_events) attend chaque future et renvoie son résultat par send().
+    Renvoie (StopIteration) le résultat définitif (scansion, results_data).
+
+    Toutes les lignes sont envoyées au pool d'un coup, leurs résultats sont lus dans
+    l'ordre ; les tâches restantes sont annulées si l'envoi s'interrompt.
+    """
+    executor = get_bulk_executor()
+    lines = [line for line in text_lines(text) if line.strip()]
+    metrics.add_gauge("gama_analyses_in_progress", 1)
+    futures = [executor.submit(timed_scan_line, line) for line in lines]
+    try:
+        prepro_lines = []
+        for line_number, future in enumerate(futures, 1):
+            line_prepro, rows, timer = yield future
+            merge(timer)
+            prepro_lines.extend(line_prepro)
+            for row in rows:
+                row["line"] = line_number
+                yield sse_event("line", {"row": scansion_row(row)})
+        scansion, results_data, timer = yield executor.submit(timed_scan_text, text, prepro_lines)
+        merge(timer)
+    finally:
+        for future in futures:
+            future.cancel()
+        metrics.add_gauge("gama_analyses_in_progress", -1)
+    return scansion, results_data
+
+
+def analysis_events(result, error_message, busy_message):
+    """
+    Générateur des événements de l'analyse d'un résultat en attente (results_data None) :
+    `line` (ligne provisoire du tableau), puis `done` (tableau définitif) ou `analysis_error`
+    (avec `error_message`, ou `busy_message` si le contrôle d'admission refuse l'analyse ;
+    messages traduits avant l'envoi de la réponse). Version synchrone (WSGI).
+    """
+    text = result.text
+    cached = get_cached_analysis(text)
+    if cached is None:
+        try:
+            with admitted(), closing(_analysis_steps(text)) as steps:
+                try:
+                    step = next(steps)
+                    while True:
+                        if isinstance(step, Future):
+                            step = steps.send(step.result())
+                        else:
+                            yield step
+                            step = next(steps)
+                except StopIteration as stop:
+                    scansion, results_data = stop.value
+            store_analysis(text, scansion, results_data)
+        except AdmissionRejected:
+            yield sse_event("analysis_error", {"message": busy_message})
+            return
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # Un processus du pool est mort : le pool sera recréé à la prochaine analyse
+                reset_bulk_executor()
+            print(f"Unexpected error during analysis: {e}")
+            yield sse_event("analysis_error", {"message": error_message})
+            return
+    else:
+        scansion, results_data = cached
+
+    result.results_data = results_data
+    result.save(update_fields=["results_data"])
+    yield sse_event("done", {"rows": scansion})
+
+
+async def aanalysis_events(result, error_message, busy_message):
+    """
+    Version asynchrone de analysis_events (ASGI) : les attentes (admission, tâches du pool,
+    base de données) ne bloquent pas la boucle d'événements.
+    """
+    text = result.text
+    cached = await sync_to_async(get_cached_analysis)(text)
+    if cached is None:
+        try:
+            async with aadmitted():
+                with closing(_analysis_steps(text)) as steps:
+                    try:
+                        step = next(steps)
+                        while True:
+                            if isinstance(step, Future):
+                                step = steps.send(await asyncio.wrap_future(step))
+                            else:
+                                yield step
+                                step = next(steps)
+                    except StopIteration as stop:
+                        scansion, results_data = stop.value
+            await sync_to_async(store_analysis)(text, scansion, results_data)
+        except AdmissionRejected:
+            yield sse_event("analysis_error", {"message": busy_message})
+            return
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                reset_bulk_executor()
+            print(f"Unexpected error during analysis: {e}")
+            yield sse_event("analysis_error", {"message": error_message})
+            return
+    else:
+        scansion, results_data = cached
+
+    result.results_data = results_data
+    await sync_to_async(result.save)(update_fields=["results_data"])
+    yield sse_event("done", {"rows": scansion})
+
+
+def event_stream_response(events, asynchronous=False):
+    """
+    Réponse HTTP en streaming (text/event-stream) des événements `events`.
+    `asynchronous` : vue servie en ASGI, un itérateur synchrone est fourni par un
+    itérateur asynchrone.
+    """
+    if asynchronous and not hasattr(events, "__aiter__"):
+        events = _aiter(events)
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Pas de mise en mémoire tampon par nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
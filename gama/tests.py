@@ -1,5 +1,16 @@
-from django.test import TestCase, Client
+import io
+import json
+import os
+from pathlib import Path
+import tempfile
+from unittest import mock
+import zipfile
+
+from asgiref.sync import sync_to_async
+
+from django.test import TestCase, AsyncClient, Client, LiveServerTestCase, override_settings
 from django.urls import reverse
+from django.utils import translation
 from django.utils.translation import gettext as _
 
 # Create your tests here.
@@ -75,3 +86,657 @@ class IndexTests(TestCase):
         self.assertContains(response, f'href="{self.clear_session_url}"', html=False)
         self.assertContains(response, _('Analyze ZIP'))
 
+    def test_length_messages_translated(self):
+        # Les messages avec la longueur maximale (%(max_length)s) sont traduits
+        from .views import bulk_status_message
+        with translation.override("fr"):
+            self.assertIn("Longueur maximale : 4500 caractères",
+                          _("The input text is too long. Maximum length allowed: %(max_length)s characters.")
+                          % {"max_length": 4500})
+            self.assertIn("nombre maximal de caractères (4,500)", bulk_status_message(1, 1))
+        with translation.override("gl"):
+            self.assertIn("Máximo permitido: 4500 caracteres",
+                          _("The input text is too long. Maximum length allowed: %(max_length)s characters.")
+                          % {"max_length": 4500})
+
+        # Formulaire ZIP de la page index, en français
+        response = self.client.post(self.index_url, {"language": "fr"})
+        self.assertContains(response, "fichiers de 4,500 caractères chacun")
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.export_url = reverse('gama:export_results')
+        self.bulk_url = reverse('gama:bulk_analysis')
+
+    def test_export_without_results(self):
+        # Sans analyse en session, pas d'export possible
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, 400)
+
+    def save_result(self):
+        # Résultat d'analyse enregistré et référencé en session, comme après la vue analysis
+        from .models import AnalysisResult
+        result = AnalysisResult.objects.create(
+            text="Os que decís",
+            metadata={"corpus_name": "—", "doc_name": "—", "doc_subtitle": "—", "author": "Unknown", "date": "—"},
+            results_data=[{"line": 1, "original_text": "Os que decís", "preprocessing": "Os que decís",
+                           "metrical_syllables": 4, "stressed_syllables": "4", "no_extra_rhythmic": "4"}])
+        session = self.client.session
+        session['analysis_id'] = str(result.pk)
+        session.save()
+        return result
+
+    def test_results_page(self):
+        self.save_result()
+        response = self.client.get(reverse('gama:analysis_result'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "<td class='col-preprocessing'>Os que decís", html=False)
+
+    def test_export_zip_streamed(self):
+        result = self.save_result()
+
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, 200)
+
+        # Le ZIP est envoyé en streaming
+        self.assertTrue(response.streaming)
+        self.assertIn(f'results_scansion_{str(result.pk)[:6]}.zip', response['Content-Disposition'])
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ["input.txt", "metadata.tsv", "results.tsv"])
+        self.assertEqual(archive.read("input.txt").decode("utf-8"), "Os que decís")
+        results = archive.read("results.tsv").decode("utf-8").splitlines()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[1].split("\t"), ["1", "Os que decís", "Os que decís", "4", "4", "4"])
+
+    def test_results_page_timing(self):
+        # Durées des étapes : en-tête Server-Timing et une ligne de log JSON par requête
+        self.save_result()
+        with self.assertLogs('gama.timing', level='INFO') as logs:
+            response = self.client.get(reverse('gama:analysis_result'))
+        metrics = [metric.split(";")[0] for metric in response['Server-Timing'].split(", ")]
+        self.assertEqual(metrics, ["load", "render", "total"])
+        self.assertEqual(len(logs.records), 1)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "gama:analysis_result")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(list(entry["stages"]), ["load", "render"])
+
+    async def test_export_zip_asgi(self):
+        # Sous ASGI, la vue asynchrone envoie le ZIP avec un itérateur asynchrone
+        result = await sync_to_async(self.save_result)()
+        client = AsyncClient()
+        client.cookies = self.client.cookies
+
+        response = await client.get(self.export_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        self.assertEqual(archive.namelist(), ["input.txt", "metadata.tsv", "results.tsv"])
+        self.assertIn(str(result.pk)[:6], response['Content-Disposition'])
+
+    def test_bulk_too_long_only(self):
+        # ZIP avec un seul fichier trop long : pas d'analyse, seulement errors.txt
+        upload = io.BytesIO()
+        with zipfile.ZipFile(upload, "w") as zf:
+            zf.writestr("long.txt", "verso\n" * 1000)
+        upload.seek(0)
+        upload.name = "corpus.zip"
+
+        response = self.client.post(self.bulk_url, {"zip_file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Analysis-Status', response)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ["errors.txt"])
+        self.assertIn("long.txt", archive.read("errors.txt").decode("utf-8"))
+
+class BulkJobTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.submit_url = reverse('gama:bulk_job_submit')
+
+    def test_bulk_job_too_long_only(self):
+        from .jobs import run_next_job
+
+        # ZIP avec un fichier vide et un fichier trop long : job créé, rien à analyser
+        upload = io.BytesIO()
+        with zipfile.ZipFile(upload, "w") as zf:
+            zf.writestr("empty.txt", "")
+            zf.writestr("long.txt", "verso\n" * 1000)
+        upload.seek(0)
+        upload.name = "corpus.zip"
+
+        response = self.client.post(self.submit_url, {"zip_file": upload})
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+
+        # Job en attente : suivi possible, téléchargement pas encore
+        status = self.client.get(job["status_url"]).json()
+        self.assertEqual(status["status"], "queued")
+        self.assertEqual([f["name"] for f in status["files"]], ["long.txt"])
+        self.assertEqual(self.client.get(job["download_url"]).status_code, 409)
+
+        # Traitement par le worker
+        self.assertEqual(str(run_next_job().pk), job["job_id"])
+        self.assertIsNone(run_next_job())
+
+        status = self.client.get(job["status_url"]).json()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["files_done"], 1)
+        self.assertIsNotNone(status["message"])
+
+        response = self.client.get(job["download_url"])
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ["errors.txt"])
+        self.assertIn("long.txt", archive.read("errors.txt").decode("utf-8"))
+
+    def test_bulk_job_same_name_in_folders(self):
+        # Fichiers de même nom dans des dossiers différents : noms distincts (chemin dans le ZIP)
+        upload = io.BytesIO()
+        with zipfile.ZipFile(upload, "w") as zf:
+            zf.writestr("b/poem.txt", "verso\n" * 1000)
+            zf.writestr("a/poem.txt", "verso\n" * 1000)
+            zf.writestr("../c/poem.txt", "verso\n" * 1000)
+        upload.seek(0)
+        upload.name = "corpus.zip"
+        job = self.client.post(self.submit_url, {"zip_file": upload}).json()
+        status = self.client.get(job["status_url"]).json()
+        self.assertEqual([f["name"] for f in status["files"]], ["a/poem.txt", "b/poem.txt", "c/poem.txt"])
+        # ...et résultats à des chemins distincts dans le ZIP de résultats
+        from .jobs import job_entries
+        from .models import BulkJob, BulkJobFile
+        bulk_job = BulkJob.objects.get(pk=job["job_id"])
+        bulk_job.files.update(status=BulkJobFile.DONE, results_data=[])
+        self.assertEqual([name for name, _content in job_entries(bulk_job, [])],
+                         ["a/poem_results.tsv", "b/poem_results.tsv", "c/poem_results.tsv"])
+
+        # Deux fichiers au même chemin : ZIP refusé
+        upload = io.BytesIO()
+        with zipfile.ZipFile(upload, "w") as zf:
+            zf.writestr("a/poem.txt", "verso")
+            zf.writestr("./a/poem.txt", "verso")
+        upload.seek(0)
+        upload.name = "corpus.zip"
+        response = self.client.post(self.submit_url, {"zip_file": upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("a/poem.txt", response.json()["error"])
+
+    def test_requeue_only_stale_jobs(self):
+        # Seuls les jobs sans nouvelles de leur worker depuis BULK_JOB_STALE_AFTER sont remis en file
+        from datetime import timedelta
+        from django.utils import timezone
+        from .jobs import requeue_stale_jobs
+        from .models import BulkJob
+        now = timezone.now()
+        BulkJob.objects.create(zip_name="active.zip", status=BulkJob.RUNNING,
+                               started_at=now - timedelta(hours=2), heartbeat_at=now)
+        BulkJob.objects.create(zip_name="stale.zip", status=BulkJob.RUNNING,
+                               started_at=now - timedelta(hours=2), heartbeat_at=now - timedelta(hours=1))
+        BulkJob.objects.create(zip_name="started.zip", status=BulkJob.RUNNING,
+                               started_at=now - timedelta(hours=1))
+        with self.settings(BULK_JOB_STALE_AFTER=600):
+            self.assertEqual(requeue_stale_jobs(), 2)
+        statuses = dict(BulkJob.objects.values_list("zip_name", "status"))
+        self.assertEqual(statuses, {"active.zip": BulkJob.RUNNING, "stale.zip": BulkJob.QUEUED,
+                                    "started.zip": BulkJob.QUEUED})
+
+    def test_bulk_job_invalid_zip(self):
+        upload = io.BytesIO(b"not a zip")
+        upload.name = "corpus.zip"
+        response = self.client.post(self.submit_url, {"zip_file": upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json())
+
+class AnalysisCacheTests(TestCase):
+    def test_cache_hit_and_lru_eviction(self):
+        from .cache import cache_key, evict, get_cached_analysis, store_analysis
+        from .models import AnalysisCacheEntry
+
+        rows = [{"line": 1, "original_text": "Os que decís", "preprocessing": "Os que decís",
+                 "metrical_syllables": 4, "stressed_syllables": "4", "no_extra_rhythmic": "4"}]
+
+        # Même texte -> même clé ; texte différent -> autre clé
+        self.assertEqual(cache_key("Os que decís"), cache_key("Os que decís"))
+        self.assertNotEqual(cache_key("Os que decís"), cache_key("Os que decís\n"))
+
+        self.assertIsNone(get_cached_analysis("a"))
+        for text in ["a", "b", "c"]:
+            store_analysis(text, ["<tr></tr>"], rows)
+        self.assertEqual(get_cached_analysis("a"), (["<tr></tr>"], rows))
+
+        # "a" vient d'être utilisé : "b" est le moins récemment utilisé, supprimé en premier
+        size = AnalysisCacheEntry.objects.get(pk=cache_key("a")).size
+        evict(2 * size)
+        self.assertIsNone(get_cached_analysis("b"))
+        self.assertIsNotNone(get_cached_analysis("a"))
+        self.assertIsNotNone(get_cached_analysis("c"))
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.api_url = reverse('gama:api_analysis')
+
+    def post(self, payload):
+        return self.client.post(self.api_url, json.dumps(payload), content_type="application/json")
+
+    def test_api_invalid_request(self):
+        self.assertEqual(self.client.post(self.api_url, "{", content_type="application/json").status_code, 400)
+        self.assertEqual(self.post({"poems": "Os que decís"}).status_code, 400)
+        self.assertEqual(self.client.get(self.api_url).status_code, 405)
+
+    def test_api_results(self):
+        from .cache import store_analysis
+
+        # Poème déjà analysé (en cache) : pas de chargement des modèles
+        text = "Os que decís que eu son"
+        store_analysis(text, ["<tr></tr>"], [{
+            "line": 1, "original_text": text, "preprocessing": text, "metrical_syllables": 7,
+            "stressed_syllables": "4 5 6", "no_extra_rhythmic": "4 6",
+            "meter_name": "Heptasílabo sáfico puro", "match_ratio": 0.8333333333333334}])
+
+        response = self.post({"poems": [{"id": "a", "text": text}, {"id": "b", "text": " \n"},
+                                        "verso\n" * 1000]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([(r["id"], r["error"]) for r in results], [("a", None), ("b", "empty"), (None, "too_long")])
+        line = results[0]["lines"][0]
+        self.assertEqual(line["stressed_syllables"], [4, 5, 6])
+        self.assertEqual(line["no_extra_rhythmic"], [4, 6])
+        self.assertEqual(line["meter_name"], "Heptasílabo sáfico puro")
+
+class StreamTests(TestCase):
+    @override_settings(ANALYSIS_STREAMING=True)
+    def test_stream_cached_result(self):
+        from .cache import store_analysis
+        from .models import AnalysisResult
+
+        # Texte déjà en cache : l'analyse n'est pas relancée, seul le tableau définitif est envoyé
+        text = "Os que decís que eu son"
+        row = {"line": 1, "original_text": text, "preprocessing": text, "metrical_syllables": 7,
+               "stressed_syllables": "4 5 6", "no_extra_rhythmic": "4 6",
+               "meter_name": "Heptasílabo sáfico puro", "match_ratio": 0.8333333333333334}
+        store_analysis(text, ["<tr></tr>"], [row])
+        result = AnalysisResult.objects.create(text=text, results_data=None)
+        session = self.client.session
+        session['analysis_id'] = str(result.pk)
+        session.save()
+
+        # Page de résultats d'une analyse en cours
+        response = self.client.get(reverse('gama:analysis_result'))
+        self.assertContains(response, reverse('gama:analysis_stream'), html=False)
+
+        response = self.client.get(reverse('gama:analysis_stream'))
+        self.assertEqual(response['Content-Type'], "text/event-stream")
+        events = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(events, 'event: done\ndata: {"rows": ["<tr></tr>"]}\n\n')
+        result.refresh_from_db()
+        self.assertEqual(result.results_data, [row])
+
+    def pending_result(self, text):
+        from .models import AnalysisResult
+        from .pipeline import reset_bulk_executor
+
+        # Pool neuf (réglages des tests transmis à ses processus), abandonné à la fin
+        reset_bulk_executor()
+        self.addCleanup(reset_bulk_executor)
+        result = AnalysisResult.objects.create(text=text, results_data=None)
+        session = self.client.session
+        session['analysis_id'] = str(result.pk)
+        session.save()
+        return result
+
+    def parse_events(self, content):
+        return [(event.split("\n")[0][len("event: "):], json.loads(event.split("\n")[1][len("data: "):]))
+                for event in content.split("\n\n") if event]
+
+    @override_settings(ANALYSIS_STREAMING=True, PREPRO_STAND_IN_MODELS=True, BULK_ANALYSIS_WORKERS=2)
+    def test_stream_analysis_in_pool(self):
+        # Analyse faite dans le pool de processus : lignes provisoires puis tableau définitif
+        text = "Os que decís que eu son\n\nunha tola da Galicia"
+        result = self.pending_result(text)
+        response = self.client.get(reverse('gama:analysis_stream'))
+        events = self.parse_events(b"".join(response.streaming_content).decode("utf-8"))
+        self.assertEqual([event for event, _data in events], ["line", "line", "done"])
+        self.assertEqual(len(events[-1][1]["rows"]), 2)
+        result.refresh_from_db()
+        self.assertEqual([row["line"] for row in result.results_data], [1, 2])
+
+    @override_settings(ANALYSIS_STREAMING=True, PREPRO_STAND_IN_MODELS=True, BULK_ANALYSIS_WORKERS=2)
+    async def test_stream_analysis_asgi(self):
+        # Sous ASGI, les événements sont produits par un itérateur asynchrone
+        text = "Os que decís que eu son\nunha tola da Galicia"
+        result = await sync_to_async(self.pending_result)(text)
+        client = AsyncClient()
+        client.cookies = self.client.cookies
+
+        response = await client.get(reverse('gama:analysis_stream'))
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8")
+        self.assertEqual([event for event, _data in self.parse_events(content)], ["line", "line", "done"])
+        await result.arefresh_from_db()
+        self.assertEqual(len(result.results_data), 2)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_metrics_aggregated_across_processes(self):
+        # Fichier laissé par un autre processus (arrêté) : ses compteurs sont additionnés,
+        # pas ses jauges
+        Path(self.tmpdir.name, "999999999.json").write_text(json.dumps({
+            "pid": 999999999,
+            "counters": [["gama_poems_analyzed_total", {}, 3], ["gama_lines_analyzed_total", {}, 42]],
+            "gauges": [["gama_analyses_in_progress", {}, 2]],
+            "histograms": [],
+        }))
+        with self.settings(METRICS_DIR=self.tmpdir.name):
+            self.client.get(reverse('gama:index'))
+            response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode("utf-8")
+        # Les métriques du processus courant incluent les requêtes des autres tests
+        self.assertRegex(body, r'gama_requests_total\{method="GET",status="200",view="gama:index"\} [1-9]')
+        self.assertRegex(body, r'gama_request_duration_seconds_bucket\{view="gama:index",le="\+Inf"\} [1-9]')
+        self.assertRegex(body, r"gama_poems_analyzed_total [1-9]")
+        self.assertIn("gama_lines_analyzed_total 42", body)
+        self.assertNotIn("gama_analyses_in_progress 2", body)
+        self.assertIn('gama_bulk_jobs{status="queued"} 0', body)
+
+        # Le fichier du processus arrêté est supprimé, ses compteurs gardés (une seule fois)
+        self.assertFalse(Path(self.tmpdir.name, "999999999.json").exists())
+        self.assertTrue(Path(self.tmpdir.name, "retired.json").exists())
+        with self.settings(METRICS_DIR=self.tmpdir.name):
+            body = self.client.get('/metrics').content.decode("utf-8")
+        self.assertIn("gama_lines_analyzed_total 42", body)
+
+    def test_flush_throttled(self):
+        # Après une requête, le fichier du processus est écrit au plus une fois par FLUSH_INTERVAL
+        from . import metrics
+        from .pipeline import timed
+        path = Path(self.tmpdir.name, f"{os.getpid()}.json")
+        with self.settings(METRICS_DIR=self.tmpdir.name), mock.patch.object(metrics, "_last_flush", 0.0), \
+                timed() as timer:
+            metrics.record_request("gama:index", "GET", 200, 0.01, timer)
+            self.assertTrue(path.exists())
+            path.unlink()
+            metrics.record_request("gama:index", "GET", 200, 0.01, timer)
+            self.assertFalse(path.exists())
+            metrics.flush()
+            self.assertTrue(path.exists())
+
+    def test_metrics_dir_outside_source_tree(self):
+        # Fichiers des métriques hors du dépôt (répertoire temporaire pendant les tests)
+        from django.conf import settings
+        self.assertFalse(Path(settings.METRICS_DIR).is_relative_to(settings.BASE_DIR))
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_busy_server_rejects_analysis(self):
+        # Une seule place d'analyse, déjà prise, et pas de file d'attente : réponse 503 immédiate
+        from .admission import admission_state, admitted
+        with self.settings(ANALYSIS_MAX_CONCURRENT=1, ANALYSIS_MAX_QUEUED=0, ADMISSION_DIR=self.tmpdir.name,
+                           METRICS_DIR=None):
+            with admitted():
+                self.assertEqual(admission_state()["running"], 1)
+                response = self.client.post(reverse('gama:api_analysis'), json.dumps({"poems": ["Os que decís"]}),
+                                            content_type="application/json")
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], "30")
+                self.assertIn("error", response.json())
+
+                metrics = self.client.get('/metrics').content.decode("utf-8")
+                self.assertIn("gama_admission_running 1", metrics)
+                self.assertRegex(metrics, r'gama_admission_rejected_total\{reason="queue_full"\} [1-9]')
+            self.assertEqual(admission_state()["running"], 0)
+
+    def test_state_does_not_lock_slots(self):
+        # Lecture de l'occupation sans verrouiller les places : pas de 503 pour une requête concurrente
+        import fcntl
+        from .admission import admission_state, admitted
+        with self.settings(ANALYSIS_MAX_CONCURRENT=2, ANALYSIS_MAX_QUEUED=1, ADMISSION_DIR=self.tmpdir.name,
+                           METRICS_DIR=None):
+            with admitted():
+                with mock.patch.object(fcntl, "flock", wraps=fcntl.flock) as flock:
+                    state = admission_state()
+                flock.assert_not_called()
+                self.assertEqual(state, {"running": 1, "queued": 0, "max_running": 2, "max_queued": 1})
+                with admitted():
+                    self.assertEqual(admission_state()["running"], 2)
+            self.assertEqual(admission_state()["running"], 0)
+
+    def test_admission_dir_outside_source_tree(self):
+        # Fichiers verrous des places hors du dépôt (répertoire temporaire pendant les tests)
+        from django.conf import settings
+        self.assertFalse(Path(settings.ADMISSION_DIR).is_relative_to(settings.BASE_DIR))
+
+
+class WarmupTests(TestCase):
+    def test_warm_up_loads_rules(self):
+        # Avec le service partagé, seuls les fichiers de règles et le lexique sont chargés
+        from .warmup import preload, warm_up
+        with self.settings(PREPRO_SERVICE_SOCKET="/nonexistent.sock"):
+            durations = warm_up()
+        self.assertEqual(list(durations), ["text_replacements", "syllable_replacements", "syllabification_lexicon",
+                                           "gumper_replacements"])
+        # préchargement désactivé par défaut
+        with self.assertNoLogs("gama.warmup"):
+            preload()
+
+    @override_settings(PRELOAD_MODELS=True, PREPRO_STAND_IN_MODELS=True, BULK_ANALYSIS_WORKERS=2,
+                       ANALYSIS_PROCESSES_PER_HOST=None)
+    def test_preload_shares_models_with_pool(self):
+        # Les modèles sont chargés dans le processus, puis les processus du pool sont créés
+        # par fork et héritent du même pipeline
+        import gc
+        from . import pipeline
+        from .warmup import preload
+        pipeline.reset_bulk_executor()
+        pipeline.get_pipeline.cache_clear()
+        self.addCleanup(pipeline.get_pipeline.cache_clear)
+        self.addCleanup(gc.unfreeze)
+        self.addCleanup(setattr, pipeline, "_models_preloaded", False)
+        self.addCleanup(pipeline.reset_bulk_executor, wait=True)
+        with self.assertLogs("gama.warmup", level="INFO") as logs:
+            preload()
+        messages = [record.getMessage() for record in logs.records]
+        self.assertTrue(any(message.startswith("Preloaded syllabification_lexicon") for message in messages))
+        self.assertIn("(2 pool processes)", messages[-1])
+
+        executor = pipeline.get_bulk_executor()
+        self.assertEqual(executor._mp_context.get_start_method(), "fork")
+        pipelines = {executor.submit(pipeline_id).result() for _ in range(4)}
+        self.assertEqual(pipelines, {id(pipeline.get_pipeline())})
+
+    @override_settings(BULK_ANALYSIS_WORKERS=4, ANALYSIS_PROCESSES_PER_HOST=6)
+    def test_pool_size_capped_per_host(self):
+        # Les pools des workers Django (WEB_CONCURRENCY) se partagent ANALYSIS_PROCESSES_PER_HOST
+        from .pipeline import bulk_analysis_workers
+        with mock.patch.dict("os.environ", {"WEB_CONCURRENCY": "3"}):
+            self.assertEqual(bulk_analysis_workers(), 2)
+        with mock.patch.dict("os.environ", {"WEB_CONCURRENCY": "8"}):
+            self.assertEqual(bulk_analysis_workers(), 1)
+        with mock.patch.dict("os.environ", {"WEB_CONCURRENCY": ""}):
+            self.assertEqual(bulk_analysis_workers(), 4)
+        with self.settings(ANALYSIS_PROCESSES_PER_HOST=None), mock.patch.dict("os.environ", {"WEB_CONCURRENCY": "3"}):
+            self.assertEqual(bulk_analysis_workers(), 4)
+
+
+def pipeline_id():
+    # tâche du pool : identité du pipeline du processus
+    from .pipeline import get_pipeline
+    return id(get_pipeline())
+
+
+class LineSplitTests(TestCase):
+    def setUp(self):
+        from .pipeline import get_pipeline
+        get_pipeline.cache_clear()
+        self.addCleanup(get_pipeline.cache_clear)
+
+    @override_settings(PREPRO_STAND_IN_MODELS=True)
+    def test_unicode_line_separators(self):
+        # U+2028, saut de page... ne séparent pas les vers : autant de lignes prétraitées que de vers
+        from .longdoc import split_text
+        from .pipeline import analyze_text
+
+        texts = {"Os que decís que eu son\u2028unha rosa na fonte": ["Os que decís que eu son\u2028unha rosa na fonte"],
+                 "Os que decís\x0cque eu son": ["Os que decís\x0cque eu son"],
+                 "Os que decís\r\nque eu son\runha rosa\x85na fonte\n": ["Os que decís", "que eu son",
+                                                                          "unha rosa\x85na fonte"]}
+        for text, lines in texts.items():
+            _scansion, results_data = analyze_text(text)
+            self.assertEqual([row["original_text"] for row in results_data], lines)
+            self.assertEqual(split_text(text, 4500), ["\n".join(lines + [""])])
+
+
+class LongTextTests(TestCase):
+    def test_chunked_scansion_matches_sequential(self):
+        # Poème polymétrique découpé en morceaux : même scansion qu'en une fois (contexte de 14 vers)
+        from concurrent.futures import ThreadPoolExecutor
+        from gumper.gumper import escandir_lista_versos
+        from .longdoc import scan_verses, split_text
+        from .views import load_example_poems
+
+        lines = [line for poem in load_example_poems().values() for line in poem["text"].splitlines()]
+        versos = lines[::2] + [""] + lines[1::3] + lines[::5]
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            for parts in (1, 4, 9):
+                self.assertEqual(scan_verses(versos, parts, executor), escandir_lista_versos(versos))
+
+        text = "\n".join(lines)
+        chunks = split_text(text, 300)
+        self.assertTrue(all(len(chunk) <= 300 for chunk in chunks))
+        self.assertEqual([line for chunk in chunks for line in chunk.splitlines() if line.strip()],
+                         [line for line in lines if line.strip()])
+
+
+class CorpusTests(TestCase):
+    def test_resume_from_checkpoint(self):
+        # Fichier déjà noté dans le point de reprise : pas analysé à nouveau
+        from django.core.management import call_command
+        from .corpus import CHECKPOINT_NAME, ERRORS_NAME, load_checkpoint
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            corpus, out = Path(tmpdir) / "corpus", Path(tmpdir) / "out"
+            (corpus / "a").mkdir(parents=True)
+            (corpus / "a" / "one.txt").write_text("Os que decís que eu son\n", encoding="utf-8")
+            (corpus / "empty.txt").write_text(" \n", encoding="utf-8")
+            (corpus / "long.txt").write_text("verso\n" * 1000, encoding="utf-8")
+            out.mkdir()
+            (out / CHECKPOINT_NAME).write_text('{"file": "a/one.txt", "lines": 1}\n{"fi', encoding="utf-8")
+
+            stdout = io.StringIO()
+            call_command("analyze_corpus", str(corpus), str(out), "--max-length", "4500", stdout=stdout)
+            self.assertIn("0 files analyzed, 1 already done, 1 errors", stdout.getvalue())
+            self.assertIn("lines/s", stdout.getvalue())
+            self.assertEqual(load_checkpoint(out), {"a/one.txt"})
+            self.assertIn("long.txt", (out / ERRORS_NAME).read_text(encoding="utf-8"))
+
+    @override_settings(PREPRO_STAND_IN_MODELS=True, BULK_ANALYSIS_WORKERS=2)
+    def test_long_file_analyzed_in_chunks(self):
+        # Sans limite de longueur (par défaut), un fichier long est analysé en morceaux (gama.longdoc)
+        from django.conf import settings
+        from django.core.management import call_command
+        from .corpus import ERRORS_NAME, load_checkpoint, result_path
+        from .pipeline import reset_bulk_executor
+
+        reset_bulk_executor()
+        self.addCleanup(reset_bulk_executor)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            corpus, out = Path(tmpdir) / "corpus", Path(tmpdir) / "out"
+            corpus.mkdir()
+            text = "Os que decís que eu son\nunha tola da Galicia\n\n" * 100
+            self.assertGreater(len(text), settings.LONG_TEXT_CHUNK_SIZE)
+            (corpus / "long.txt").write_text(text, encoding="utf-8")
+
+            stdout = io.StringIO()
+            call_command("analyze_corpus", str(corpus), str(out), "--workers", "3", stdout=stdout)
+            self.assertIn("1 files analyzed, 0 already done, 0 errors", stdout.getvalue())
+            # taille du pool passée à la commande seulement
+            self.assertEqual(settings.BULK_ANALYSIS_WORKERS, 2)
+            self.assertEqual(load_checkpoint(out), {"long.txt"})
+            self.assertFalse((out / ERRORS_NAME).exists())
+            rows = result_path(out, Path("long.txt")).read_text(encoding="utf-8").splitlines()
+            self.assertEqual(len(rows), 1 + 200)
+
+
+class DatabaseTests(TestCase):
+    def test_sqlite_concurrent_writers(self):
+        # Base SQLite en mode WAL : une transaction d'écriture attend le verrou au lieu d'échouer
+        import threading
+        import time
+        from django.db import connection, connections, transaction
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            settings_dict = {**connection.settings_dict, "NAME": str(Path(tmpdir) / "db.sqlite3")}
+            first = DatabaseWrapper(settings_dict, "first")
+            try:
+                with first.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("CREATE TABLE t (x INTEGER)")
+
+                def write():
+                    # autre connexion (dans son thread) : transaction qui lit puis écrit pendant que
+                    # `first` tient le verrou (en mode DEFERRED, sa lecture serait périmée et
+                    # l'écriture échouerait avec "database is locked")
+                    second = DatabaseWrapper(settings_dict, "second")
+                    connections["second"] = second
+                    try:
+                        start = time.perf_counter()
+                        with transaction.atomic(using="second"), second.cursor() as cursor:
+                            cursor.execute("SELECT COUNT(*) FROM t")
+                            result["count"] = cursor.fetchone()[0]
+                            cursor.execute("INSERT INTO t VALUES (2)")
+                        result["waited"] = time.perf_counter() - start
+                    except Exception as e:
+                        result["error"] = e
+                    finally:
+                        second.close()
+                        del connections["second"]
+
+                result = {}
+                first.set_autocommit(False)
+                first.cursor().execute("INSERT INTO t VALUES (1)")
+                writer = threading.Thread(target=write)
+                writer.start()
+                time.sleep(0.5)
+                first.commit()
+                first.set_autocommit(True)
+                writer.join()
+                self.assertNotIn("error", result)
+                self.assertEqual(result["count"], 1)
+                self.assertGreaterEqual(result["waited"], 0.4)
+                with first.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM t")
+                    self.assertEqual(cursor.fetchone()[0], 2)
+            finally:
+                first.close()
+
+
+class LoadTestTests(LiveServerTestCase):
+    def test_index_load_report(self):
+        from .loadtest import percentile, run_load_test
+
+        self.assertEqual(percentile([3, 1, 2, 4], 50), 2)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+
+        with self.settings(METRICS_DIR=None):
+            report = run_load_test(self.live_server_url, ["Os que decís"], concurrency=2, iterations=3,
+                                   endpoints=["index"])
+        index = report["endpoints"]["index"]
+        self.assertEqual(index["requests"], 6)
+        self.assertEqual(index["error_rate"], 0)
+        self.assertEqual(index["statuses"], {"200": 6})
+        self.assertLessEqual(index["latency_ms"]["p50"], index["latency_ms"]["p99"])
@@ -0,0 +1,385 @@
+"""
+Tests du preprocessing (dossier preprocessing) : règles de remplacement, syllabation,
+normalisation et service de prétraitement.
+"""
+
+from pathlib import Path
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+# gama.pipeline ajoute le dossier du preprocessing au sys.path : ses modules s'importent
+# ensuite sans préfixe de paquet (`import rewrite`, `import pipeline as prepro_pipeline`...)
+from .pipeline import PIPELINE_OPTIONS, get_pipeline
+
+
+class RewriteTests(TestCase):
+    def test_compiled_rules_match_sequential_substitutions(self):
+        # Règles compilées (rewrite, preprocessing) : même résultat que les re.sub successifs
+        import re
+        from gumper import config as gcf
+        from gumper import utils as gut
+        from gumper.gumper import quitar_puntuacion
+        from rewrite import RewriteRules, apply_sequentially, compile_rules
+        from .views import load_example_poems
+        import config as prepro_cf
+        import utils as prepro_ut
+
+        texts = [poem["text"] for poem in load_example_poems().values()]
+        lines = [line for text in texts for line in text.splitlines()]
+        lines += ["d' os homes", "D’ELES e d'unha", "Y-alma y  o meu", "c’a nosa qu' eu", "S. Xoán", "prôs  nosos"]
+        for rules in (prepro_ut.load_text_replacements(prepro_cf), gut.load_t_replacements(gcf),
+                      gut.load_w_replacements(gcf)):
+            compiled = compile_rules(rules.items())
+            for text in lines + texts:
+                self.assertEqual(compiled.apply(text), apply_sequentially(rules.items(), text))
+
+        # règles d'un caractère (une seule table de traduction) et règles qui dépendent de l'ordre
+        rules = [("a", "b"), ("c", ""), ("b", "c"), (re.compile("(d)\\1", re.I), "x"), (re.compile("'"), "d")]
+        self.assertEqual(len(RewriteRules(rules).passes), 4)
+        for text in ["abc", "dD'", "'d", "cab'dd"]:
+            self.assertEqual(RewriteRules(rules).apply(text), apply_sequentially(rules, text))
+
+        quitar = [':', ',', '.', ';', '–', '(', ')', '\n', '\r', '¿', '?', '!', '¡', '—', '»', '”', '“', '«', '-', '/',
+                  "'", '‘', '’', '´', '`']
+        for text in lines:
+            self.assertEqual(quitar_puntuacion(text), apply_sequentially([(re.escape(q), "") for q in quitar], text))
+
+
+class RuleRegistryTests(TestCase):
+    def test_reload_when_file_changes(self):
+        # Fichier de règles chargé une fois, rechargé quand il change, gardé s'il est invalide
+        import os
+        import types
+        from rewrite import RuleRegistry
+        import utils as prepro_ut
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "replacements.tsv"
+            path.write_text("meu\tmeo\n", encoding="utf-8")
+            config = types.ModuleType("config")
+            config.text_level_replacements = path
+            registry = RuleRegistry(check_interval=0)
+
+            rules = registry.get(path, prepro_ut.load_text_replacements, config)
+            self.assertIs(registry.get(path, prepro_ut.load_text_replacements, config), rules)
+            self.assertEqual(list(rules.values()), ["meo"])
+
+            path.write_text("meu\tmeo\nteu\tteo\tcs\n", encoding="utf-8")
+            rules = registry.get(path, prepro_ut.load_text_replacements, config)
+            self.assertEqual(list(rules.values()), ["meo", "teo"])
+
+            path.write_text("meu\n", encoding="utf-8")
+            with self.assertLogs("main.rewrite", "ERROR"):
+                self.assertIs(registry.get(path, prepro_ut.load_text_replacements, config), rules)
+
+            # pas de nouvelle vérification avant check_interval
+            registry.check_interval = 3600
+            path.write_text("seu\tseo\n", encoding="utf-8")
+            os.utime(path, ns=(0, 0))
+            self.assertIs(registry.get(path, prepro_ut.load_text_replacements, config), rules)
+
+    def test_missing_file_keeps_rules(self):
+        # Fichier brièvement absent (remplacé par un déploiement) : règles et version gardées
+        import types
+        from rewrite import RuleRegistry
+        import utils as prepro_ut
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "replacements.tsv"
+            path.write_text("meu\tmeo\n", encoding="utf-8")
+            config = types.ModuleType("config")
+            config.text_level_replacements = path
+            registry = RuleRegistry(check_interval=0)
+
+            rules = registry.get(path, prepro_ut.load_text_replacements, config)
+            stamp = registry.stamp(path)
+            path.unlink()
+            with self.assertLogs("main.rewrite", "WARNING"):
+                self.assertIs(registry.get(path, prepro_ut.load_text_replacements, config), rules)
+                self.assertEqual(registry.stamp(path), stamp)
+
+            # fichier jamais trouvé : erreur
+            with self.assertRaises(FileNotFoundError):
+                registry.get(Path(tmpdir) / "missing.tsv", prepro_ut.load_text_replacements, config)
+
+    def test_single_rewrite_module(self):
+        # gumper et le preprocessing partagent le même module rewrite (un seul registre, un seul cache)
+        import sys
+        from gumper import gumper_client_web, utils as gut
+        import pipeline as prepro_pipeline
+        import rewrite
+
+        self.assertIs(gumper_client_web.rule_files, rewrite.rule_files)
+        self.assertIs(gut.compile_rules, prepro_pipeline.rewrite.compile_rules)
+        self.assertNotIn("preprocessing.rewrite", sys.modules)
+
+
+class SyllabificationMemoTests(TestCase):
+    def test_memo_returns_finished_syllabification(self):
+        # Deuxième syllabation d'un mot : trouvée dans le mémo, identique au calcul complet
+        import grapheme2syllable as g2s
+        import pipeline as prepro_pipeline
+
+        memo = prepro_pipeline.syllabification_memo
+        memo.clear()
+        for word in ["Ángel", "cantaba", "Ángel", "cantaba", "Ángel"]:
+            expected = tuple(prepro_pipeline.postprocess_syllable_str(s) for s in g2s.syllabify_full(word)[:3])
+            self.assertEqual(prepro_pipeline.syllabify_word(word)[:3], expected)
+            self.assertEqual(prepro_pipeline.syllabify_word(word)[3], g2s.syllabify_full(word)[3])
+        stats = memo.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (8, 2, 2))
+        self.assertEqual(stats["hit_rate"], 0.8)
+
+        # mémo borné (LRU), vidé quand les règles de postprocessing changent
+        small = prepro_pipeline.SyllabificationMemo(maxsize=2)
+        rules = object()
+        for word in ["a", "b", "a", "c"]:
+            if small.get((word, "´", False), rules) is None:
+                small.put((word, "´", False), rules, (word,))
+        self.assertIsNone(small.get(("b", "´", False), rules))
+        self.assertEqual(small.get(("a", "´", False), rules), ("a",))
+        self.assertIsNone(small.get(("a", "´", False), object()))
+
+
+class SyllabifierTests(TestCase):
+    def test_single_scan_matches_regex_implementation(self):
+        # Syllabation en un passage : même résultat que l'implémentation par regex qu'elle remplace
+        from django.conf import settings
+        from .views import load_example_poems
+        from scripts.compare_syllabification import compare, load_words
+
+        words = load_words(settings.PREPRO_DIR / "test" / "lista_palabras.txt")
+        words += [word for poem in load_example_poems().values() for word in poem["text"].split()]
+        words += ["", "Ángel", "muíño", "guía", "CHUVIIÑA", "burla", "bulra", "lla", "ou", "pai", "Kilo", "a b"]
+        # sauts de ligne : traités par la syllabation en un passage comme par re.search
+        words += ["can\nta", "\nsol", "bu\n\nrla", "a\nb", "tra\nba\nllo"]
+        # les corrections s'arrêtent au saut de ligne comme les regex (`.` ne le traverse pas,
+        # `$` correspond aussi avant un saut de ligne final)
+        words += ["ug\nhuugcql", "p\nlmliíu", "bd\nc\n\niíar", "uaí\nmuú", "mu\níño", "cuu\nl", "p\nra"]
+        self.assertEqual(compare(words), [])
+
+    def test_trailing_line_break(self):
+        # Saut de ligne final (l'implémentation par regex échouait) : pas de syllabe ajoutée
+        import grapheme2syllable as g2s
+
+        self.assertEqual(g2s.syllabify_core("sol\n"), "sol\n")
+        self.assertEqual(g2s.syllabify_core("cantaba\n\n"), "can-ta-ba\n\n")
+
+    def test_vocabulary_matches_regex_implementation(self):
+        # Comparaison sur le vocabulaire du normaliseur (un mot sur `step`, pour la durée du test ;
+        # scripts/compare_syllabification.py compare tout le vocabulaire)
+        import pickle
+        from normalization import normconfig as ncf
+        from scripts.compare_syllabification import compare, load_words
+
+        try:
+            words = load_words(ncf.IVDICO)
+        except (OSError, pickle.UnpicklingError):
+            self.skipTest(f"vocabulary not available: {ncf.IVDICO}")
+        step = max(1, len(words) // 20000)
+        self.assertEqual(compare(words[::step]), [])
+
+
+class SyllabificationLexiconTests(TestCase):
+    def test_lexicon_lookup_matches_syllabification(self):
+        # Lexique projeté en mémoire : mêmes syllabations que g2s.syllabify_full, consulté par syllabify_word
+        import grapheme2syllable as g2s
+        import lexicon
+        import pipeline as prepro_pipeline
+
+        words = ["Ángel", "cantaba", "muíño", "pai", "burla", "ou"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "lexicon.bin"
+            self.assertEqual(lexicon.write_lexicon(words + ["dúas palabras", ""], path, g2s.syllabify_full),
+                             len(words))
+            lex = lexicon.load_lexicon(path)
+            try:
+                for word in words:
+                    for spanishfy in (False, True):
+                        self.assertEqual(lex.get(word, spanishfy), g2s.syllabify_full(word, spanishfy=spanishfy))
+                self.assertIsNone(lex.get("cantabas"))
+                self.assertNotIn("dúas palabras", lex)
+
+                # syllabify_word : mot trouvé dans le lexique, même résultat
+                expected = prepro_pipeline.syllabify_word("Ángel", spanishfy=True)
+                prepro_pipeline.syllabification_memo.clear()
+                with mock.patch.object(prepro_pipeline, "syllabification_lexicon", return_value=lex), \
+                        mock.patch.object(g2s, "syllabify_full", side_effect=AssertionError):
+                    self.assertEqual(prepro_pipeline.syllabify_word("Ángel", spanishfy=True), expected)
+            finally:
+                lex.close()
+                prepro_pipeline.syllabification_memo.clear()
+
+            # lexique construit avec un autre code de syllabation : pas utilisé
+            with mock.patch.object(lexicon, "code_fingerprint", return_value="other"):
+                self.assertIsNone(lexicon.load_lexicon(path))
+
+
+class DeletionIndexTests(TestCase):
+    def test_index_candidates_match_edits1(self):
+        # Candidats à distance 2 trouvés dans l'index des suppressions : les mêmes qu'avec edits1
+        import random
+        from django.conf import settings
+        from normalization import deletion_index, editor
+        from scripts.compare_levdist_candidates import compare, misspell
+        from scripts.compare_syllabification import load_words
+
+        words = load_words(settings.PREPRO_DIR / "test" / "lista_palabras.txt")[:1500]
+        words += ["ABCE", "abce", "abcé", "àààà", "CASA", "Ángel", "o", "á", ""]
+        rng = random.Random(0)
+        short_words = [word for word in words if len(word) <= 7]
+        oovs = [misspell(rng.choice(short_words), rng) for _ in range(30)]
+        oovs += ["", "a", "Á", "ABCdE", "ÀÀÀbÀ", "CASAS", "Angel", "ANGEL", "cása", "o'"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "index.bin"
+            vocab_path = Path(tmpdir) / "vocab.pkl"
+            vocab_path.write_bytes(b"vocabulary")
+            deletion_index.write_index(words, path, deletion_index.vocabulary_fingerprint(vocab_path))
+            index = deletion_index.load_index(path, vocab_path)
+            try:
+                self.assertEqual(len(index), len(set(words)))
+                edimgr = editor.EdManager({}, set(words), index)
+                edimgr.prep_alphabet()
+                self.assertEqual(compare(edimgr, oovs), [])
+                self.assertIn("abce", edimgr.generate_levdist_candidates("ABCdE"))
+            finally:
+                index.close()
+
+            # index construit à partir d'un autre vocabulaire : pas utilisé
+            vocab_path.write_bytes(b"other vocabulary")
+            self.assertIsNone(deletion_index.load_index(path, vocab_path))
+
+
+class LevdistBatchTests(TestCase):
+    def test_batch_distances_match_levdist(self):
+        # Distances pondérées calculées par lot avec la table dense des coûts : les mêmes que levdist
+        import random
+        from normalization import edcosts, editor
+
+        score_matrix = editor.EdScoreMatrix(edcosts)
+        score_matrix.read_cost_matrix()
+        edimgr = editor.EdManager(score_matrix.create_matrix_hash(), set())
+        rng = random.Random(0)
+        chars = "abcdeilnosuzáéíóúüñçÁÉÑAZ'-İ"
+        batches = [("historicamente", ["históricamente", "historicamente", "HISTORICAMENTE", "istoricament", ""]),
+                   ("", ["a", "", "Ángel"]), ("cása", [])]
+        for _ in range(200):
+            batches.append(("".join(rng.choice(chars) for _ in range(rng.randint(0, 10))),
+                            ["".join(rng.choice(chars) for _ in range(rng.randint(0, 12))) for _ in range(5)]))
+        for oov, cands in batches:
+            self.assertEqual(edimgr.levdist_batch(cands, oov), [edimgr.levdist(cand, oov) for cand in cands])
+
+
+class PreprocessingServiceTests(TestCase):
+    def start_service(self, socket_path=None, **options):
+        # Service avec des modèles de substitution, dans un thread, sur un socket temporaire
+        import threading
+        import time
+        import service
+
+        if socket_path is None:
+            tmpdir = tempfile.TemporaryDirectory()
+            self.addCleanup(tmpdir.cleanup)
+            socket_path = Path(tmpdir.name) / "prepro.sock"
+        options = {"workers": 1, "pipeline_options": PIPELINE_OPTIONS, "stand_in_models": True, **options}
+        prepro_service = service.PreprocessingService(socket_path, **options)
+        thread = threading.Thread(target=prepro_service.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 30)
+        self.addCleanup(prepro_service.shutdown)
+        client = service.PreprocessingClient(socket_path, pool_size=1, timeout=60)
+        self.addCleanup(client.close)
+        deadline = time.monotonic() + 10
+        while not socket_path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return prepro_service, client
+
+    def wait_for(self, condition, timeout=60):
+        import time
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+    def test_framing(self):
+        # Messages préfixés par leur longueur : lecture en plusieurs morceaux, taille maximale
+        import socket
+        import service
+
+        left, right = socket.socketpair()
+        with left, right:
+            message = {"op": "process", "text": "Os que decís\nque eu son" * 1000}
+            data = service.encode_message(message)
+            self.assertEqual(service.HEADER.unpack_from(data)[0], len(data) - service.HEADER.size)
+            left.sendall(data[:3])
+            left.sendall(data[3:])
+            self.assertEqual(service.read_message(right), message)
+
+            left.sendall(service.HEADER.pack(service.MAX_MESSAGE_SIZE + 1))
+            with self.assertRaises(service.ServiceError):
+                service.read_message(right)
+
+            left.sendall(data[:10])
+            left.close()
+            with self.assertRaises(ConnectionError):
+                service.read_message(right)
+
+    @override_settings(PREPRO_STAND_IN_MODELS=True)
+    def test_client_reuses_connections(self):
+        # Connexion gardée ouverte et réutilisée par les requêtes suivantes
+        get_pipeline.cache_clear()
+        self.addCleanup(get_pipeline.cache_clear)
+        _service, client = self.start_service()
+        text = "Os que decís que eu son\nunha tola da Galicia"
+        self.assertEqual(client.process(text), get_pipeline().process(text))
+        self.assertEqual(client._idle.qsize(), 1)
+        sock = client._idle.queue[0]
+        self.assertTrue(client.ping()["ok"])
+        self.assertIs(client._idle.queue[0], sock)
+
+    @override_settings(PREPRO_STAND_IN_MODELS=True)
+    def test_client_reconnects_after_restart(self):
+        # Connexion gardée ouverte, fermée par un redémarrage du service : la requête est
+        # renvoyée sur une nouvelle connexion
+        prepro_service, client = self.start_service()
+        self.assertTrue(client.process("Os que decís"))
+        stale = client._idle.queue[0]
+        socket_path = Path(client.socket_path)
+        prepro_service.shutdown()
+        self.wait_for(lambda: not socket_path.exists())
+        self.start_service(socket_path=socket_path)
+        self.assertTrue(client.process("que eu son"))
+        self.assertEqual(client._idle.qsize(), 1)
+        self.assertIsNot(client._idle.queue[0], stale)
+
+    def test_worker_respawned(self):
+        # Processus remplacé après max_jobs tâches, et quand il meurt
+        import os
+        import signal
+
+        prepro_service, client = self.start_service(max_jobs=1)
+        self.assertTrue(client.process("Os que decís"))
+        self.wait_for(lambda: client.ping()["respawns"] == 1 and client.ping()["workers"][0]["ready"])
+        status = client.ping()
+        self.assertEqual(len(status["workers"]), 1)
+        os.kill(status["workers"][0]["pid"], signal.SIGKILL)
+        self.wait_for(lambda: client.ping()["respawns"] == 2)
+        self.assertTrue(client.process("que eu son"))
+        self.assertEqual(client.ping()["jobs_done"], 2)
+
+    def test_load_failure_reported(self):
+        # Échec du chargement des modèles : nouvelles tentatives espacées, puis erreur renvoyée au client
+        import service
+
+        with self.assertLogs("main.service", level="WARNING") as logs:
+            _service, client = self.start_service(pipeline_options={"unknown_option": True}, max_restarts=1,
+                                                  restart_backoff=0.01)
+            with self.assertRaisesRegex(service.ServiceError, "failed to start: TypeError"):
+                client.process("Os que decís")
+        self.assertEqual(len(logs.records), 2)
+        with self.assertRaisesRegex(service.ServiceError, "failed to start"):
+            client.process("que eu son")
+        with self.assertRaises(service.ServiceError):
+            client.ping()
@@ -10,6 +10,11 @@ urlpatterns = [
     path("export_results/", views.export_results, name="export_results"),
     path("about/", views.about, name="about"),
     path("results/", views.analysis_results, name="analysis_result"),
+    path("results/stream/", views.analysis_stream, name="analysis_stream"),
     path('clear-session/', views.clear_session, name='clear_session'),
     path('bulk_analysis/', views.bulk_analysis, name='bulk_analysis'),
+    path('bulk_jobs/', views.bulk_job_submit, name='bulk_job_submit'),
+    path('bulk_jobs/<uuid:job_id>/', views.bulk_job_status, name='bulk_job_status'),
+    path('bulk_jobs/<uuid:job_id>/download/', views.bulk_job_download, name='bulk_job_download'),
+    path('api/analysis/', views.api_analysis, name='api_analysis'),
 ]
\ No newline at end of file
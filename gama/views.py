@@ -2,26 +2,42 @@ from django.shortcuts import render
 
 # Create your views here.
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count
 from django.http import HttpResponse, JsonResponse
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.utils.translation import gettext as _
 from django.utils import translation
 
 from pathlib import Path
-import subprocess
 import zipfile
 import time
 import uuid
 import re
-import csv
 import tempfile
 import json
 import os
 import base64
+import itertools
+import asyncio
 
-from gumper import config as gcf
-from gumper.gumper_client_web import main as gumper_main
+from concurrent.futures.process import BrokenProcessPool
+
+from . import metrics
+from .admission import AdmissionRejected, aadmitted, admission_state, admitted
+from .export import metadata_tsv, results_tsv, zip_response
+from .jobs import BulkJobError, create_bulk_job, job_entries, job_errors, job_progress
+from .models import BulkJob
+from .cache import acached_analyze_text, get_cached_analysis, store_analysis
+from .pipeline import (analysis_result, analyze_in_pool, max_text_length, reset_bulk_executor, stage, submit_analysis,
+                       text_lines)
+from .results import forget_result, get_result, render_scansion, save_result, scansion_rows
+from .stream import aanalysis_events, analysis_events, event_stream_response, sse_event
 
 
 DBG = False
@@ -37,10 +53,7 @@ def clear_session(request):
     """
     Supprime les données d'analyse stockées en session et redirige vers la page index
     """
-    try:
-        del request.session['analysis_data']
-    except KeyError:
-        pass
+    forget_result(request)
     return redirect('gama:index')
 
 def handle_language(request):
@@ -82,6 +95,18 @@ def load_example_poems():
     except Exception:
         return {}
 
+def bulk_form_context():
+    """
+    Contexte du formulaire d'analyse par lot : analyse en tâche de fond
+    (settings.BULK_JOB_QUEUE) ou synchrone, nombre maximal de fichiers du ZIP et
+    longueur maximale des textes.
+    """
+    return {
+        "bulk_job_queue": settings.BULK_JOB_QUEUE,
+        "bulk_max_files": settings.BULK_JOB_MAX_FILES if settings.BULK_JOB_QUEUE else 10,
+        "max_text_length": f"{max_text_length():,}",
+    }
+
 def index(request):
     """
     Page d'accueil de l'application.
@@ -89,7 +114,7 @@ def index(request):
     Étapes :
     1. Gére la langue via handle_language.
     2. Charge les poèmes d'exemple pour l'affichage.
-    3. Récupère les données précédemment saisies en session
+    3. Récupère les données précédemment saisies (résultat référencé en session)
        (si l'utilisateur revient sur la page les champs restent pré-remplis).
     4. Passe les données au template index.html pour affichage.
     """
@@ -101,15 +126,65 @@ def index(request):
     # Chargement des poèmes exemples
     example_poems = load_example_poems()
 
-    # Récupération des metadata depuis la session
-    initial_data = request.session.get('analysis_data', {})
+    # Récupération du texte et des metadata de la dernière analyse
+    result = get_result(request)
+    initial_data = {"text": result.text, **result.metadata} if result else {}
 
     # Rendu template html avec le context
     return render(request, "gama/index.html", {
             "example_poems": example_poems,
             "initial_data": initial_data,
+            **bulk_form_context(),
     })
 
+def results_header():
+    """En-têtes (traduits) des fichiers tsv de résultats."""
+    return ["#", _("original_text"), _("preprocessing"),
+            _("metrical_syllables"), _("stressed_syllables"), _("no_extra_rhythmic")]
+
+def bulk_status_message(errors_count, too_long_count):
+    """
+    Message (traduit) sur les erreurs d'une analyse par lot, ou None si aucune erreur.
+    """
+    if not errors_count:
+        return None
+    if too_long_count and errors_count == too_long_count:
+        # Cas 1 : uniquement des fichiers trop longs
+        return _("Files above max allowed characters (%(max_length)s) were not analyzed. See error log in ZIP.") % {
+            "max_length": f"{max_text_length():,}"}
+    if too_long_count:
+        # Cas 2 : mélange erreurs d'analyse ET fichiers trop longs
+        return _("Some files failed and files above max allowed characters (%(max_length)s) were not analyzed. "
+                 "See error log in ZIP.") % {"max_length": f"{max_text_length():,}"}
+    # Cas 3 : uniquement erreurs d'analyse
+    return _("Some files failed. See error log in ZIP.")
+
+def check_text(text):
+    """
+    Vérifie un texte à analyser.
+    Renvoie le type d'erreur ('empty', 'too_long', 'not_verse'), ou None si le texte est valide.
+    """
+    if not text:
+        return "empty"
+    if len(text) > max_text_length():
+        return "too_long"
+    if any(len(line.strip()) > 200 for line in text_lines(text) if line.strip()):
+        return "not_verse"
+    return None
+
+def busy_response(request, as_json=False):
+    """
+    Réponse 503 quand une analyse est refusée par le contrôle d'admission (gama.admission),
+    avec l'en-tête Retry-After : page d'erreur, ou JSON pour les requêtes JS et l'API.
+    """
+    message = _("The server is busy. Please try again in a few minutes.")
+    if as_json:
+        response = JsonResponse({"error": message}, status=503)
+    else:
+        response = render(request, "gama/error.html", {"message": message}, status=503)
+    response["Retry-After"] = str(settings.ANALYSIS_RETRY_AFTER)
+    return response
+
 def translate_if_default(value, key):
     """
     Traduit une valeur uniquement si elle correspond à une valeur par défaut
@@ -119,24 +194,24 @@ def translate_if_default(value, key):
         return _(value)
     return value
 
-def analysis(request):
+async def analysis(request):
     """
-    Traite le POST d'une analyse de texte.
+    Traite le POST d'une analyse de texte (vue asynchrone).
 
     Rôle :
     1. Vérifie et valide le texte soumis (taille, format des vers, etc.).
-    2. Récupère et stocke les metadata dans la session.
-       (utile pour conserver les valeurs si l'utilisateur change de langue)
-    3. Crée un dossier unique pour l'analyse et écrit le texte en fichier.
-    4. Lance le prétraitement via un script externe.
-    5. Effectue l'analyse métrique via gumper_main et stocke :
-       - scansion (pour affichage)
-       - results_data (pour export)
+    2. Récupère les metadata.
+    3. Lance le prétraitement et l'analyse métrique (en mémoire, via gumper) dans le
+       pool de processus (gama.pipeline), et attend le résultat sans bloquer le worker ;
+       ou reprend le résultat du cache si le même texte a déjà été analysé (gama.cache).
+       Si le serveur est surchargé (gama.admission), répond 503 avec Retry-After.
+    5. Enregistre le texte, les metadata et les résultats (gama.results) ;
+       la session ne garde que l'id du résultat.
     6. Redirige vers analysis_results pour afficher le résultat (PRG).
 
     Remarques :
     - Ne gère que le POST.
-    - Les résultats sont conservés en session pour permettre changement de langue
+    - Les résultats sont conservés côté serveur pour permettre changement de langue
       sans relancer l'analyse.
     """
     # Gestion de la langue via handle_language
@@ -145,12 +220,9 @@ def analysis(request):
     # Récupère et vérifie que le texte n'est pas vide, trop long, ou contient des vers trop longs
     if request.method == "POST":
         text = request.POST.get("text", "")
-        if not text:
-            return redirect("gama:error", errtype="empty")
-        if len(text) > 4500:
-            return redirect("gama:error", errtype="too_long")
-        if any(len(line.strip()) > 200 for line in text.splitlines() if line.strip()):
-            return redirect("gama:error", errtype="not_verse")
+        errtype = check_text(text)
+        if errtype:
+            return redirect("gama:error", errtype=errtype)
 
         # Récupération des métadonnées (or "valeur par défaut" si champ vide)
         corpus_name_key = request.POST.get("corpus_name") or "—"
@@ -159,10 +231,7 @@ def analysis(request):
         author_key = request.POST.get("author") or "Unknown"
         date_key = request.POST.get("date") or "—"
 
-        # Stockage en session des metadata pour pouvoir changer la langue sur la page
-        # (et éviter l'erreur et redirection 'empty' lors du changement)
-        request.session['analysis_data'] = {
-            "text": text,
+        metadata = {
             "corpus_name": corpus_name_key,
             "doc_name": doc_name_key,
             "doc_subtitle": doc_subtitle_key,
@@ -170,39 +239,32 @@ def analysis(request):
             "date": date_key,
         }
 
-        # ID unique et dossier de sortie
-        request.session["curid"] = str(uuid.uuid4())[0:6]
-        curid = request.session["curid"]
-        out_dir = settings.IO_DIR / curid
-        Path(out_dir).mkdir(parents=True, exist_ok=True)
-        with open(out_dir / "input.txt", encoding="utf8", mode="w") as f:
-            f.write(text)
+        # Analyse en streaming : le résultat est enregistré en attente, la page de
+        # résultats reçoit les lignes au fur et à mesure (analysis_stream)
+        if settings.ANALYSIS_STREAMING and await sync_to_async(get_cached_analysis)(text) is None:
+            await sync_to_async(save_result)(request, text, metadata, None)
+            return redirect("gama:analysis_result")
 
         try:
-            subprocess.run(
-                ["python", "../preprocessing/g2s_client_running_text.py",
-                 str(out_dir / "input.txt"), "-p", "-d", "-n", "-s", "-b", "001"],
-                check=True,
-                cwd=settings.PREPRO_DIR,
-            )
-
-            # Analyse métrique
-            orig_poem_path = out_dir / "input.txt"
-            prepro_poem_path = out_dir / "out_001" / "input_pp_out_norm_spa_001.txt"
+            # Prétraitement et analyse métrique dans le pool de processus,
+            # ou résultat en cache si le texte a déjà été analysé
             # scansion : texte formaté pour l'affichage
             # results_data : dictionnaire pour export tsv
-            scansion, results_data = gumper_main(gcf, orig_poem_path, prepro_poem_path)
+            scansion, results_data = await acached_analyze_text(text)
 
-            # Stockage résultats de l'analyse en session
+            # Stockage du texte, des metadata et des résultats (id du résultat en session)
             # Pour pouvoir changer lg depuis la page de résultats (sans relancer l'analyse)
-            request.session['analysis_result'] = "".join(scansion)
-
-            # Stockage des résultats pour l'export au format tsv
-            request.session['results_data'] = results_data
+            # et exporter les résultats au format tsv
+            with stage("save"):
+                await sync_to_async(save_result)(request, text, metadata, results_data)
 
             # Redirection vers analysis_results selon principe PRG
             return redirect("gama:analysis_result")
 
+        # Serveur surchargé (contrôle d'admission) : réponse 503 immédiate
+        except AdmissionRejected:
+            return await sync_to_async(busy_response)(request)
+
         # Si erreur lors de l'analyse
         except Exception as e:
             print(f"Unexpected error during analysis: {e}")
@@ -216,9 +278,8 @@ def analysis_results(request):
     Affiche les résultats d'une analyse de texte.
 
     Rôle :
-    1. Récupère depuis la session :
-       - `analysis_data` (texte + métadonnées)
-       - `analysis_result` (scansion du texte)
+    1. Récupère le résultat de l'analyse dont l'id est en session (gama.results) :
+       texte, métadonnées et résultats, à partir desquels le tableau html est généré.
     2. Si les données sont absentes, redirige vers une page d'erreur.
     3. Traduit les métadonnées par défaut si besoin,
        sans toucher aux valeurs saisies par l'utilisateur.
@@ -234,14 +295,17 @@ def analysis_results(request):
     # Gestion de la langue
     handle_language(request)
 
-    # Récupération des données stockées en session
+    # Récupération du résultat référencé en session
     # Permet d'afficher sans relancer l'analyse
-    analysis_data = request.session.get("analysis_data")
-    analysis_result = request.session.get("analysis_result")
+    with stage("load"):
+        result = get_result(request)
 
     # Si vide et qu'on ne peut rien afficher, redirection vers page erreur 'empty'
-    if not analysis_data or not analysis_result:
+    # (sauf analyse en cours : les lignes sont reçues en streaming par la page)
+    pending = result is not None and result.results_data is None
+    if result is None or not (result.results_data or pending):
         return redirect("gama:error", errtype="empty")
+    analysis_data = result.metadata
 
     # Traduction des métadonnées uniquement si valeurs par défaut
     # (ne traduit pas des valeurs saisies par l'utilisateur)
@@ -253,16 +317,43 @@ def analysis_results(request):
 
     # Context pour le rendu du template analysis.html
     context = {
-        "text": analysis_data.get("text", ""),
+        "text": result.text,
         "corpus_name": corpus_name,
         "doc_name": doc_name,
         "doc_subtitle": doc_subtitle,
         "author": author,
         "date": date,
-        "result": analysis_result,
+        "pending": pending,
     }
 
-    return render(request, "gama/analysis.html", context)
+    with stage("render"):
+        context["result"] = "" if pending else render_scansion(result.results_data)
+        return render(request, "gama/analysis.html", context)
+
+async def analysis_stream(request):
+    """
+    Résultats de l'analyse en cours, envoyés ligne par ligne (server-sent events, gama.stream ;
+    vue asynchrone). L'analyse est faite dans le pool de processus.
+
+    Pour un résultat déjà complet, seul l'événement `done` (tableau définitif) est envoyé.
+    Sous ASGI, les événements sont produits par un itérateur asynchrone (envoyés au fur et
+    à mesure, sans bloquer la boucle d'événements).
+    """
+
+    # Gestion de la langue
+    handle_language(request)
+
+    asynchronous = isinstance(request, ASGIRequest)
+    result = await sync_to_async(get_result)(request)
+    if result is None:
+        return HttpResponse("No analysis in progress.", status=404)
+    if result.results_data is not None:
+        events = iter([sse_event("done", {"rows": scansion_rows(result.results_data)})])
+    else:
+        stream_events = aanalysis_events if asynchronous else analysis_events
+        events = stream_events(result, _("An unexpected error occurred."),
+                               _("The server is busy. Please try again in a few minutes."))
+    return event_stream_response(events, asynchronous=asynchronous)
 
 def error(request, errtype):
     """
@@ -287,7 +378,8 @@ def error(request, errtype):
     if errtype == "empty":
         err_message = _("The input text cannot be empty.")
     elif errtype == "too_long":
-        err_message = _("The input text is too long. Maximum length allowed: 4500 characters.")
+        err_message = _("The input text is too long. Maximum length allowed: %(max_length)s characters.") % {
+            "max_length": max_text_length()}
     elif errtype == "not_verse":
         err_message = _("The input text does not seem to be in verse (lines too long?).")
     else:
@@ -302,14 +394,15 @@ def error(request, errtype):
     context = {
         "error_message": err_message,
         "example_poems": example_poems,
+        **bulk_form_context(),
     }
 
     # Rendu de la page d'accueil avec l'erreur
     return render(request, "gama/index.html", context)
 
-def export_results(request):
+async def export_results(request):
     """
-    Exporte les résultats d'une analyse sous forme de ZIP.
+    Exporte les résultats d'une analyse sous forme de ZIP (vue asynchrone).
 
     Contenu du ZIP :
     - input.txt : texte brut
@@ -318,27 +411,27 @@ def export_results(request):
 
     Étapes :
     1. Gestion de la langue.
-    2. Récupération des données en session : texte, métadonnées, résultats, ID unique.
+    2. Récupération du résultat référencé en session : texte, métadonnées, résultats, ID.
     3. Vérification que des résultats existent, sinon HTTP 400.
     4. Traduction conditionnelle des métadonnées par défaut.
-    5. Création d'un répertoire temporaire pour générer les fichiers.
-    6. Écriture des fichiers texte et TSV.
-    7. Création d'une archive ZIP contenant ces fichiers.
-    8. Envoi du ZIP en réponse HTTP avec header Content-Disposition.
+    5. Génération des fichiers texte et TSV en mémoire.
+    6. Envoi du ZIP en streaming (gama.export), avec header Content-Disposition :
+       l'archive est construite pendant l'envoi, sans fichier sur le disque.
     """
 
     # Gestion de la langue
     handle_language(request)
 
-    # Récupération des données depuis la session
-    analysis_data = request.session.get("analysis_data")
-    results_data = request.session.get("results_data")
-    text = analysis_data.get("text", "") if analysis_data else ""
-    curid = request.session.get("curid", "000000")
-
-    if not results_data:
+    # Récupération du résultat référencé en session
+    result = await sync_to_async(get_result)(request)
+    if result is None or not result.results_data:
         return HttpResponse("No analysis results to export.", status=400)
 
+    analysis_data = result.metadata
+    results_data = result.results_data
+    text = result.text
+    curid = str(result.pk)[:6]
+
     # Traduction des métadonnées uniquement si valeurs par défaut
     # (ne traduit pas des valeurs saisies par l'utilisateur)
     corpus_name_key = analysis_data.get("corpus_name", "Unnamed corpus")
@@ -353,47 +446,18 @@ def export_results(request):
     author = translate_if_default(author_key, "author")
     date = translate_if_default(date_key, "date")
 
-    # Création d'un répertoire temporaire pour générer fichiers de sortie
-    with tempfile.TemporaryDirectory() as tmpdir:
-        # input.txt
-        with open(f"{tmpdir}/input.txt", "w", encoding="utf-8") as f:
-            f.write(text)
-
-        # metadata.tsv
-        with open(f"{tmpdir}/metadata.tsv", "w", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f, delimiter="\t")
-            writer.writerow([_("corpus_name"), _("title"), _("subtitle"), _("author"), _("date")])
-            writer.writerow([corpus_name, doc_name, doc_subtitle, author,date])
-
-        # results.tsv
-        with open(f"{tmpdir}/results.tsv", "w", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                "#", _("original_text"), _("preprocessing"),
-                _("metrical_syllables"), _("stressed_syllables"), _("no_extra_rhythmic")
-            ], delimiter="\t")
-            writer.writeheader()
-            for row in results_data:
-                writer.writerow({
-                    "#": row["line"],
-                    _("original_text"): row["original_text"],
-                    _("preprocessing"): row["preprocessing"],
-                    _("metrical_syllables"): row["metrical_syllables"],
-                    _("stressed_syllables"): row["stressed_syllables"],
-                    _("no_extra_rhythmic"): row["no_extra_rhythmic"]
-                })
-        # Création du zip contenant les 3 fichiers
-        zip_filename = f"results_scansion_{curid}.zip"
-        zip_path = f"{tmpdir}/{zip_filename}"
-        with zipfile.ZipFile(zip_path, "w") as zipf:
-            zipf.write(f"{tmpdir}/input.txt", "input.txt")
-            zipf.write(f"{tmpdir}/metadata.tsv", "metadata.tsv")
-            zipf.write(f"{tmpdir}/results.tsv", "results.tsv")
-
-        # Lecture du zip + renvoi en réponse HTTP pour téléchargement
-        with open(zip_path, "rb") as f:
-            response = HttpResponse(f.read(), content_type="application/zip")
-            response["Content-Disposition"] = f"attachment; filename={zip_filename}"
-            return response
+    # En-têtes traduits maintenant : le ZIP est généré pendant l'envoi de la réponse
+    metadata_header = [_("corpus_name"), _("title"), _("subtitle"), _("author"), _("date")]
+
+    # Fichiers du zip (compressés et envoyés au fur et à mesure)
+    entries = (
+        ("input.txt", text),
+        ("metadata.tsv", metadata_tsv(metadata_header, [corpus_name, doc_name, doc_subtitle, author, date])),
+        ("results.tsv", results_tsv(results_data, results_header())),
+    )
+
+    # Envoi du zip en streaming pour téléchargement
+    return zip_response(entries, f"results_scansion_{curid}.zip", asynchronous=isinstance(request, ASGIRequest))
 
 def about(request):
     """'About' page for each language."""
@@ -401,24 +465,104 @@ def about(request):
     handle_language(request)
     return render(request, f"gama/about/about_{request.LANGUAGE_CODE}.html")
 
-def bulk_analysis(request):
+def read_bulk_zip(uploaded_zip):
+    """
+    Décompresse le ZIP uploadé dans un dossier temporaire (supprimé ensuite) et lit ses fichiers.
+
+    Renvoie (nombre de fichiers txt, fichiers), avec pour fichiers une liste de
+    (nom de fichier, texte, message d'erreur ou None), par ordre alphabétique ;
+    les fichiers vides sont ignorés.
     """
-    Analyse par lot de plusieurs poèmes à partir d'un ZIP contenant des fichiers txt.
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Sauvegarde temporaire du zip uploadé
+        zip_path = os.path.join(tmpdir, 'uploaded.zip')
+        with open(zip_path, 'wb') as f:
+            for chunk in uploaded_zip.chunks():
+                f.write(chunk)
+
+        # Extraction du zip
+        extract_dir = os.path.join(tmpdir, 'extracted')
+        os.makedirs(extract_dir, exist_ok=True)
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(extract_dir)
+
+        txt_files = [f for f in os.listdir(extract_dir) if f.lower().endswith('.txt')]
+
+        # Lecture des fichiers extraits (ordre alphabétique, pour un ZIP de sortie déterministe)
+        files = []
+        for fname in sorted(os.listdir(extract_dir)):
+            input_path = os.path.join(extract_dir, fname)
+            try:
+                # Lecture du texte
+                with open(input_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+
+                # Ignore les fichiers vides
+                if not text.strip():
+                    continue
+                files.append((fname, text, None))
+
+            except Exception as e:
+                print(f"Error with {fname}: {e}")
+                files.append((fname, None, f"{fname}: {str(e)}"))
+        return len(txt_files), files
+
+async def bulk_results(jobs):
+    """
+    Analyse dans le pool de processus les fichiers d'une analyse par lot (jobs de
+    bulk_analysis) et récupère les résultats dans l'ordre des fichiers, sans bloquer le worker.
+    Renvoie (résultats : liste de (nom du TSV, results_data), messages d'erreur).
+    """
+    results = []
+    errors = []
+    tasks = [asyncio.ensure_future(analyze_in_pool(text)) if job is None else job for fname, text, job in jobs]
+    for (fname, text, _job), job in zip(jobs, tasks):
+        if isinstance(job, str):
+            errors.append(job)
+            continue
+        try:
+            if isinstance(job, tuple):
+                _scansion, results_data = job
+            else:
+                scansion, results_data = await job
+                await sync_to_async(store_analysis)(text, scansion, results_data)
+
+            # Le fichier TSV sera généré pendant l'envoi du zip
+            result_name = f"{Path(fname).stem}_results.tsv"
+            results.append((result_name, results_data))
+
+        except BrokenProcessPool as e:
+            # Un processus du pool est mort : le pool sera recréé à la prochaine requête
+            print(f"Error with {fname}: {e}")
+            errors.append(f"{fname}: {str(e)}")
+            reset_bulk_executor()
+        except Exception as e:
+            print(f"Error with {fname}: {e}")
+            errors.append(f"{fname}: {str(e)}")
+            continue
+    return results, errors
+
+async def bulk_analysis(request):
+    """
+    Analyse par lot de plusieurs poèmes à partir d'un ZIP contenant des fichiers txt
+    (vue asynchrone : les analyses sont attendues sans bloquer le worker).
 
     Rôle :
     1. Gérer la langue via handle_language.
     2. Vérifier la présence d'un fichier ZIP uploadé.
-    3. Décompresser le ZIP dans un dossier temporaire.
-    4. Parcourir chaque fichier .txt et :
-       - Lire le texte
-       - Générer un ID unique pour l'analyse
-       - Sauvegarder le texte brut
-       - Prétraiter le texte via le script de preprocessing
-       - Analyser le texte (scansion et métrique)
-       - Générer un fichier TSV des résultats
-    5. Regrouper tous les TSV générés dans un ZIP de sortie.
-    6. Retourner le ZIP via une réponse HTTP avec header Content-Disposition
-       pour téléchargement direct.
+    3. Décompresser le ZIP dans un dossier temporaire et lire les fichiers (read_bulk_zip).
+    4. Pour chaque fichier .txt (ordre alphabétique) :
+       - Reprendre le résultat du cache si le texte a déjà été analysé (gama.cache)
+       - Sinon, envoyer son analyse (prétraitement, scansion et métrique) au pool de
+         processus, les fichiers sont analysés en parallèle
+         (taille du pool : gama.pipeline.bulk_analysis_workers)
+    5. Récupérer les résultats dans l'ordre des fichiers et générer un
+       fichier TSV des résultats par poème (erreurs dans errors.txt).
+    6. Retourner le ZIP via une réponse HTTP en streaming avec header
+       Content-Disposition pour téléchargement direct : les TSV sont générés et
+       compressés pendant l'envoi, rien n'est écrit sur le disque.
+       Les analyses sont toutes terminées avant l'envoi, car le header
+       X-Analysis-Status dépend des erreurs.
 
     Retour :
     - ZIP contenant les résultats TSV de tous les poèmes valides,
@@ -435,144 +579,252 @@ def bulk_analysis(request):
     uploaded_zip = request.FILES['zip_file']
 
     try:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Sauvegarde temporaire du zip uploadé
-            zip_path = os.path.join(tmpdir, 'uploaded.zip')
-            with open(zip_path, 'wb') as f:
-                for chunk in uploaded_zip.chunks():
-                    f.write(chunk)
-
-            # Extraction du zip
-            extract_dir = os.path.join(tmpdir, 'extracted')
-            os.makedirs(extract_dir, exist_ok=True)
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-
-            txt_files = [f for f in os.listdir(extract_dir) if f.lower().endswith('.txt')]
-
-            # Vérification du nombre de fichiers
-            if not txt_files:
-                return JsonResponse({"error": _("No TXT files found in the ZIP.")}, status=400)
-            if len(txt_files) > 10:
-                return JsonResponse({"error": _("Too many files in ZIP. Maximum allowed is 10.")}, status=400)
-
-            result_paths = []
-            errors = []
-            too_long_files = []
-
-            # Parcours des fichiers extraits
-            for fname in os.listdir(extract_dir):
-                input_path = os.path.join(extract_dir, fname)
-                try:
-                    # Lecture du texte
-                    with open(input_path, "r", encoding="utf-8") as f:
-                        text = f.read()
-
-                    # Ignore les fichiers vides
-                    if not text.strip():
-                        continue
-
-                    # Vérifie la taille du texte
-                    if len(text) > 4500:
-                        errors.append(f"File '{fname}' is too long. Maximum allowed is 4,500 characters.")
-                        too_long_files.append(fname)
-                        continue  # passe au fichier suivant
-
-                    # ID et dossier de sortie
-                    curid = str(uuid.uuid4())[:6]
-                    out_dir = settings.IO_DIR / f"bulk_{curid}"
-                    Path(out_dir).mkdir(parents=True, exist_ok=True)
-
-                    # Sauvegarde texte brut
-                    input_txt = out_dir / "input.txt"
-                    with open(input_txt, "w", encoding="utf-8") as f:
-                        f.write(text)
-
-                    # Prétraitement
-                    subprocess.run(
-                        ["python", "../preprocessing/g2s_client_running_text.py",
-                        str(input_txt), "-p", "-d", "-n", "-s", "-b", "001"],
-                        check=True,
-                        cwd=settings.PREPRO_DIR,
-                    )
-
-                    # Analyse
-                    orig_poem_path = input_txt
-                    prepro_poem_path = out_dir / "out_001" / "input_pp_out_norm_spa_001.txt"
-                    scansion, results_data = gumper_main(gcf, orig_poem_path, prepro_poem_path)
-
-                    # Création du fichier TSV
-                    result_name = f"{Path(fname).stem}_results.tsv"
-                    result_path = os.path.join(tmpdir, result_name)
-                    with open(result_path, "w", encoding="utf-8", newline="") as f:
-                        writer = csv.DictWriter(f, fieldnames=[
-                            "#", _("original_text"), _("preprocessing"),
-                            _("metrical_syllables"), _("stressed_syllables"), _("no_extra_rhythmic")
-                        ], delimiter="\t")
-                        writer.writeheader()
-                        for row in results_data:
-                            writer.writerow({
-                                "#": row["line"],
-                                _("original_text"): row["original_text"],
-                                _("preprocessing"): row["preprocessing"],
-                                _("metrical_syllables"): row["metrical_syllables"],
-                                _("stressed_syllables"): row["stressed_syllables"],
-                                _("no_extra_rhythmic"): row["no_extra_rhythmic"]
-                            })
-
-                    result_paths.append((result_name, result_path))
-
-                except Exception as e:
-                    print(f"Error with {fname}: {e}")
-                    errors.append(f"{fname}: {str(e)}")
-                    continue
-
-            # Si des erreurs existent, on crée errors.txt
-            if errors:
-                error_path = os.path.join(tmpdir, "errors.txt")
-                with open(error_path, "w", encoding="utf-8") as f:
-                    for line in errors:
-                        f.write(line + "\n")
-                result_paths.append(("errors.txt", error_path))
-
-            # Création du zip de sortie avec ID unique
-            curid = str(uuid.uuid4())[:6]
-            original_name = uploaded_zip.name
-            base_name = original_name.rsplit('.', 1)[0]
-            output_zip_name = f"{base_name}_results_{curid}.zip"
-
-            with zipfile.ZipFile(output_zip_name, 'w') as out_zip:
-                for name, path in result_paths:
-                    out_zip.write(path, arcname=name)
-
-            # Réponse HTTP pour téléchargement
-            with open(output_zip_name, 'rb') as f:
-                response = HttpResponse(f.read(), content_type='application/zip')
-                response['Content-Disposition'] = f'attachment; filename="{output_zip_name}"'
-                # Si erreurs lors de l'analyse
-                if errors:
-                    if too_long_files and len(errors) == len(too_long_files):
-                        # Cas 1 : uniquement des fichiers trop longs
-                        msg_utf8 = (
-                            _("Files above max allowed characters (4,500) were not analyzed. See error log in ZIP.")
-                        )
-                    elif too_long_files:
-                        # Cas 2 : mélange erreurs d'analyse ET fichiers trop longs
-                        msg_utf8 = (
-                            _("Some files failed and files above max allowed characters (4,500) were not analyzed. "
-                              "See error log in ZIP.")
-                        )
-                    else:
-                        # Cas 3 : uniquement erreurs d'analyse
-                        msg_utf8 = _("Some files failed. See error log in ZIP.")
-
-                    # Encodage Base64 pour passer les accents dans le header
-                    msg_b64 = base64.b64encode(msg_utf8.encode('utf-8')).decode('ascii')
-                    response['X-Analysis-Status'] = msg_b64
-                return response
+        # Lecture des fichiers du zip (hors de la boucle d'événements : accès disque)
+        txt_count, files = await sync_to_async(read_bulk_zip, thread_sensitive=False)(uploaded_zip)
+
+        # Vérification du nombre de fichiers
+        if not txt_count:
+            return JsonResponse({"error": _("No TXT files found in the ZIP.")}, status=400)
+        if txt_count > 10:
+            return JsonResponse({"error": _("Too many files in ZIP. Maximum allowed is 10.")}, status=400)
+
+        too_long_files = []
+
+        # Fichiers à analyser (ordre alphabétique des fichiers)
+        # jobs : liste de (nom de fichier, texte, None (à analyser), résultat en cache ou message d'erreur)
+        jobs = []
+        for fname, text, error in files:
+            if error:
+                jobs.append((fname, None, error))
+                continue
+
+            # Vérifie la taille du texte
+            if len(text) > max_text_length():
+                jobs.append((fname, text, f"File '{fname}' is too long. Maximum allowed is {max_text_length():,} characters."))
+                too_long_files.append(fname)
+                continue  # passe au fichier suivant
+
+            # Résultat en cache, sinon prétraitement et analyse dans le pool
+            jobs.append((fname, text, await sync_to_async(get_cached_analysis)(text)))
+
+        # Contrôle d'admission (gama.admission) si des fichiers sont à analyser
+        if any(job is None for fname, text, job in jobs):
+            try:
+                async with aadmitted():
+                    results, errors = await bulk_results(jobs)
+            except AdmissionRejected:
+                return busy_response(request, as_json=True)
+        else:
+            results, errors = await bulk_results(jobs)
+
+        # Nom du zip de sortie avec ID unique
+        curid = str(uuid.uuid4())[:6]
+        original_name = uploaded_zip.name
+        base_name = original_name.rsplit('.', 1)[0]
+        output_zip_name = f"{base_name}_results_{curid}.zip"
+
+        # Fichiers du zip : un TSV par poème (générés au fur et à mesure de l'envoi)
+        # et errors.txt si des erreurs existent
+        header = results_header()
+        entries = ((name, results_tsv(rows, header)) for name, rows in results)
+        if errors:
+            entries = itertools.chain(entries, [("errors.txt", "".join(line + "\n" for line in errors))])
+
+        # Réponse HTTP pour téléchargement, zip envoyé en streaming
+        response = zip_response(entries, output_zip_name, asynchronous=isinstance(request, ASGIRequest))
+        # Si erreurs lors de l'analyse
+        msg_utf8 = bulk_status_message(len(errors), len(too_long_files))
+        if msg_utf8:
+            # Encodage Base64 pour passer les accents dans le header
+            msg_b64 = base64.b64encode(msg_utf8.encode('utf-8')).decode('ascii')
+            response['X-Analysis-Status'] = msg_b64
+        return response
 
     except zipfile.BadZipFile:
         return JsonResponse({"error": _("Invalid ZIP file.")}, status=400)
     except Exception as e:
         print(e)
         return JsonResponse({"error": _("An unexpected error occurred.")}, status=400)
+
+def bulk_job_submit(request):
+    """
+    Soumet un ZIP de fichiers txt pour une analyse par lot en tâche de fond.
+
+    Le job est enregistré dans la base (gama.models.BulkJob) et traité par le worker
+    local (`python manage.py process_bulk_jobs`) : la requête se termine tout de suite.
+
+    Retour :
+    - HTTP 202 avec l'id du job et les URL de suivi et de téléchargement,
+      ou HTTP 400 si le ZIP est absent ou refusé.
+    """
+
+    # Gestion de la langue
+    handle_language(request)
+
+    # Vérification POST + fichier zip
+    if request.method != 'POST' or 'zip_file' not in request.FILES:
+        return JsonResponse({"error": _("No ZIP file uploaded or method not allowed.")}, status=400)
+
+    try:
+        job = create_bulk_job(request.FILES['zip_file'])
+    except BulkJobError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        print(e)
+        return JsonResponse({"error": _("An unexpected error occurred.")}, status=400)
+
+    return JsonResponse({
+        "job_id": str(job.pk),
+        "status_url": reverse("gama:bulk_job_status", args=[job.pk]),
+        "download_url": reverse("gama:bulk_job_download", args=[job.pk]),
+    }, status=202)
+
+def bulk_job_status(request, job_id):
+    """
+    État d'un job d'analyse par lot (JSON) : état du job et de chacun de ses fichiers,
+    nombre de fichiers traités, et message sur les erreurs une fois le job terminé.
+    """
+
+    # Gestion de la langue
+    handle_language(request)
+
+    job = get_object_or_404(BulkJob, pk=job_id)
+    progress = job_progress(job)
+    progress["message"] = None
+    if job.status == BulkJob.DONE:
+        errors, too_long = job_errors(job)
+        progress["message"] = bulk_status_message(len(errors), too_long)
+    elif job.status == BulkJob.FAILED:
+        progress["message"] = _("An unexpected error occurred.")
+    return JsonResponse(progress)
+
+def bulk_job_download(request, job_id):
+    """
+    Télécharge le ZIP des résultats d'un job terminé (envoyé en streaming,
+    même contenu que l'analyse par lot synchrone).
+    HTTP 409 si le job n'est pas terminé.
+    """
+
+    # Gestion de la langue
+    handle_language(request)
+
+    job = get_object_or_404(BulkJob, pk=job_id)
+    if job.status != BulkJob.DONE:
+        return JsonResponse({"error": _("The analysis is not finished yet."), "status": job.status}, status=409)
+
+    base_name = job.zip_name.rsplit('.', 1)[0]
+    output_zip_name = f"{base_name}_results_{str(job.pk)[:6]}.zip"
+    return zip_response(job_entries(job, results_header()), output_zip_name)
+
+def api_line(row):
+    """Résultats d'un vers pour l'API JSON (positions des accents en listes d'entiers)."""
+    return {
+        "line": row["line"],
+        "original_text": row["original_text"],
+        "preprocessing": row["preprocessing"],
+        "metrical_syllables": row["metrical_syllables"],
+        "stressed_syllables": [int(x) for x in row["stressed_syllables"].split()],
+        "no_extra_rhythmic": [int(x) for x in row["no_extra_rhythmic"].split()],
+        "meter_name": row["meter_name"],
+        "match_ratio": row["match_ratio"],
+    }
+
+@csrf_exempt
+@require_POST
+def api_analysis(request):
+    """
+    API JSON d'analyse par lot, pour les scripts.
+
+    Requête (POST, JSON) : {"poems": [{"id": ..., "text": "..."}, ...]}
+    (l'id est facultatif ; un poème peut aussi être donné directement sous forme de texte).
+    Au plus settings.API_MAX_POEMS poèmes, de 4500 caractères chacun (sauf mode texte long).
+
+    Réponse : {"results": [{"id": ..., "error": null, "lines": [...]}, ...]}, dans l'ordre
+    des poèmes, avec pour chaque vers : texte original, prétraitement, syllabes métriques,
+    positions des accents (avec et sans accents extrarythmiques), nom du mètre et ratio
+    de correspondance avec ce mètre.
+    Un poème invalide ou en échec n'interrompt pas le lot : son champ "error" contient
+    le type d'erreur ('empty', 'too_long', 'not_verse' ou 'unexpected').
+
+    Les poèmes sont analysés dans le pool de processus de l'analyse par lot (modèles
+    chargés une fois par processus), ou repris du cache (gama.cache).
+    Si le serveur est surchargé (gama.admission), répond 503 avec Retry-After.
+    """
+    try:
+        payload = json.loads(request.body)
+        poems = payload["poems"]
+        if not isinstance(poems, list):
+            raise TypeError("'poems' must be a list")
+        poems = [poem if isinstance(poem, dict) else {"text": poem} for poem in poems]
+        for poem in poems:
+            if not isinstance(poem.get("text", ""), str):
+                raise TypeError("'text' must be a string")
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({"error": f"Invalid request: {e}"}, status=400)
+    if len(poems) > settings.API_MAX_POEMS:
+        return JsonResponse({"error": f"Too many poems. Maximum allowed is {settings.API_MAX_POEMS}."},
+                            status=400)
+
+    # Résultat en cache, sinon analyse dans le pool
+    # jobs : liste de (texte, None (à analyser), résultat en cache ou type d'erreur)
+    jobs = []
+    for poem in poems:
+        text = poem.get("text", "")
+        errtype = check_text(text) if text.strip() else "empty"
+        if errtype:
+            jobs.append((text, errtype))
+            continue
+        jobs.append((text, get_cached_analysis(text)))
+
+    # Contrôle d'admission (gama.admission) si des poèmes sont à analyser
+    if any(job is None for text, job in jobs):
+        try:
+            with admitted():
+                return api_results(poems, jobs)
+        except AdmissionRejected:
+            return busy_response(request, as_json=True)
+    return api_results(poems, jobs)
+
+def api_results(poems, jobs):
+    """
+    Réponse de api_analysis : envoie au pool de processus les poèmes à analyser (job None)
+    puis récupère les résultats dans l'ordre des poèmes.
+    """
+    jobs = [(text, submit_analysis(text) if job is None else job) for text, job in jobs]
+    results = []
+    for poem, (text, job) in zip(poems, jobs):
+        result = {"id": poem.get("id"), "error": None, "lines": []}
+        try:
+            if isinstance(job, str):
+                result["error"] = job
+            elif isinstance(job, tuple):
+                result["lines"] = [api_line(row) for row in job[1]]
+            else:
+                scansion, results_data = analysis_result(job)
+                store_analysis(text, scansion, results_data)
+                result["lines"] = [api_line(row) for row in results_data]
+        except BrokenProcessPool as e:
+            print(f"Error with API poem {poem.get('id')}: {e}")
+            result["error"] = "unexpected"
+            reset_bulk_executor()
+        except Exception as e:
+            print(f"Error with API poem {poem.get('id')}: {e}")
+            result["error"] = "unexpected"
+        results.append(result)
+
+    return JsonResponse({"results": results})
+
+def prometheus_metrics(request):
+    """
+    Métriques de l'application au format texte de Prometheus (gama.metrics), additionnées
+    sur tous les processus, avec l'état de la file des jobs d'analyse par lot et du
+    contrôle d'admission.
+
+    À protéger au niveau du serveur web (accès réservé au serveur Prometheus).
+    """
+    jobs = dict(BulkJob.objects.values_list("status").annotate(n=Count("pk")))
+    gauges = [("gama_bulk_jobs", {"status": status}, jobs.get(status, 0))
+              for status, label in BulkJob.STATUS_CHOICES]
+    # Places du contrôle d'admission (analyses en cours et en attente sur la machine)
+    gauges += [(f"gama_admission_{name}", {}, value) for name, value in admission_state().items()]
+    return HttpResponse(metrics.exposition(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
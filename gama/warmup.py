@@ -0,0 +1,99 @@
+"""
+Préchargement des ressources lourdes au démarrage du serveur (`settings.PRELOAD_MODELS`).
+
+Les analyses se font dans les processus du pool d'analyse (gama.pipeline.get_bulk_executor),
+qui utilisent le vocabulaire et son index des suppressions, la matrice des coûts d'édition,
+le modèle KenLM, les règles de remplacement et le lexique des syllabations (warm_up).
+
+Sans préchargement, les processus du pool sont lancés en "spawn" à la première analyse
+d'un worker Django, et chacun charge sa propre copie de ces ressources.
+
+Avec PRELOAD_MODELS, gamaweb.wsgi et gamaweb.asgi appellent preload() une fois l'application
+créée : les ressources sont chargées dans le processus courant, puis les processus du pool
+sont créés par fork et en partagent les pages (copie sur écriture). Avec `gunicorn --preload`,
+elles ne sont chargées qu'une fois, dans le maître, avant le fork des workers : chaque worker
+crée son pool juste après le fork (gama.pipeline.use_preloaded_models). Sans --preload, elles
+sont chargées une fois par worker. Le partage n'est pas total : les pages des objets Python
+dont le compteur de références change sont copiées (gc.freeze() évite celles du ramasse-miettes).
+
+La durée de chargement de chaque ressource est journalisée (logger `gama.warmup`).
+"""
+
+import gc
+import logging
+import time
+
+from django.conf import settings
+
+from gumper import config as gcf
+from gumper.gumper_client_web import clean_text
+
+from .pipeline import get_pipeline, reset_bulk_executor, timed, use_preloaded_models, warm_up_pool
+
+# modules du preprocessing (dossier ajouté au sys.path par gama.pipeline)
+import config as prepro_cf  # noqa: E402
+import pipeline as prepro_pipeline  # noqa: E402
+import rewrite as prepro_rw  # noqa: E402
+import utils as prepro_ut  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def _timed_load(durations, name, load):
+    start = time.perf_counter()
+    load()
+    durations[name] = time.perf_counter() - start
+
+
+def warm_up():
+    """
+    Charge les ressources utilisées par les analyses dans le processus courant (un processus
+    du pool) et renvoie la durée de chargement de chacune (secondes), dans l'ordre de chargement.
+    """
+    durations = {}
+    if not settings.PREPRO_SERVICE_SOCKET:
+        # vocab_load, edit_costs_load, deletion_index_load, lm_load : étapes chronométrées du pipeline
+        with timed() as timer:
+            get_pipeline()
+        durations.update(timer.durations)
+    # règles chargées dans les registres (rewrite.rule_files) utilisés par les analyses, et compilées
+    _timed_load(durations, "text_replacements", lambda: prepro_rw.compile_rules(prepro_rw.rule_files.get(
+        prepro_cf.text_level_replacements, prepro_ut.load_text_replacements, prepro_cf).items()))
+    _timed_load(durations, "syllable_replacements", lambda: prepro_rw.rule_files.get(
+        prepro_cf.syllable_replacements, prepro_ut.load_syllable_replacements, prepro_cf))
+    _timed_load(durations, "syllabification_lexicon", prepro_pipeline.syllabification_lexicon)
+    _timed_load(durations, "gumper_replacements", lambda: clean_text(gcf, []))
+    return durations
+
+
+def preload():
+    """
+    Préchargement au démarrage si `settings.PRELOAD_MODELS` : version des données (clés du
+    cache) et ressources des analyses (warm_up) dans le processus courant, puis création du
+    pool d'analyse par fork.
+    """
+    if not settings.PRELOAD_MODELS:
+        return
+    start = time.perf_counter()
+    from .cache import data_version
+    durations = {}
+    try:
+        _timed_load(durations, "data_version", data_version)
+        durations.update(warm_up())
+    except Exception:
+        # ex. modèles introuvables : chaque processus du pool chargera les siens
+        logger.exception("Could not preload the models")
+        return
+    for name, seconds in durations.items():
+        logger.info("Preloaded %s in %.1f ms", name, seconds * 1000)
+    # objets déjà chargés exclus du ramasse-miettes, qui ne touche plus leurs pages après le fork
+    gc.freeze()
+    use_preloaded_models()
+    try:
+        workers = warm_up_pool()
+    except Exception:
+        logger.exception("Could not start the analysis pool")
+        reset_bulk_executor()
+        return
+    logger.info("Preload finished in %.1f ms (%d pool processes)", (time.perf_counter() - start) * 1000,
+                len(workers))
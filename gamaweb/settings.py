@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
+import tempfile
 from django.utils.translation import gettext_lazy as _
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Per-stage timing: Server-Timing header and one JSON log line per request
+    'gama.middleware.server_timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -92,6 +96,18 @@ LOGGING = {
         'level': 'DEBUG',
         'propagate': True,
     },
+    # Load time of each resource preloaded at startup (gama.warmup)
+    'gama.warmup': {
+        'handlers': ['file'],
+        'level': 'INFO',
+        'propagate': False,
+    },
+    # Request timings (gama.middleware), one JSON line per request
+    'gama.timing': {
+        'handlers': ['file'],
+        'level': 'INFO',
+        'propagate': False,
+    },
 },
 }
 #TODO: needed?
@@ -105,6 +121,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Several processes write to the database (Django workers, bulk job worker): in WAL
+        # mode reads do not wait for writes, transactions take the write lock when they begin
+        # (IMMEDIATE, so that a read can't be upgraded into a conflicting write), and a
+        # writer waits up to `timeout` seconds for the lock instead of failing at once
+        # with "database is locked".
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -163,6 +189,107 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # IO
 
-IO_DIR = BASE_DIR / 'io'
 PREPRO_DIR = BASE_DIR / 'preprocessing'
-GUMPER_DIR = BASE_DIR / 'gumper'
\ No newline at end of file
+GUMPER_DIR = BASE_DIR / 'gumper'
+
+# Runtime files shared by the processes of the host (metrics, admission slots), kept out of the source tree.
+# Use a distinct directory for each deployment on the same host.
+RUNTIME_DIR = Path(tempfile.gettempdir()) / 'gamaweb'
+
+# Test runner: runtime files of the tests go to a temporary directory (gamaweb.test_runner).
+TEST_RUNNER = 'gamaweb.test_runner.TestRunner'
+
+# Preprocessing
+
+# Unix socket of the shared preprocessing service (preprocessing/service.py).
+# If None, each Django worker loads its own preprocessing pipeline in-process.
+PREPRO_SERVICE_SOCKET = None
+PREPRO_SERVICE_POOL_SIZE = 4  # idle connections kept open per Django worker
+PREPRO_SERVICE_TIMEOUT = 300  # seconds
+
+# Replace the heavy models by lightweight stand-ins (no vocabulary, so no normalization,
+# and a length-based stand-in for KenLM), e.g. to load test the web app (gama.loadtest)
+# where the model files are unavailable. Results differ from the real pipeline.
+PREPRO_STAND_IN_MODELS = False
+
+# Load the preprocessing models (vocabulary, edit costs, KenLM) and the replacement rules
+# when the WSGI/ASGI application is created (gama.warmup), then fork the processes of the
+# analysis pool (BULK_ANALYSIS_WORKERS below), which share the pages of the models
+# (copy-on-write). With gunicorn --preload, the models are loaded once in the master and
+# shared by all workers; each worker forks its pool right after being forked. The load time
+# of each resource is logged.
+PRELOAD_MODELS = False
+
+# Size of the process pool of each Django worker, which runs the analyses (single texts,
+# API, streaming, and the files of a bulk ZIP analysis in parallel).
+# Memory: a host runs (Django workers) x BULK_ANALYSIS_WORKERS pool processes. Without
+# PRELOAD_MODELS or PREPRO_SERVICE_SOCKET, each of them loads its own copy of the models.
+# With PRELOAD_MODELS, they share the pages of the models of their worker (or of the
+# gunicorn master with --preload). With PREPRO_SERVICE_SOCKET, the models are only loaded
+# by the workers of the shared service.
+BULK_ANALYSIS_WORKERS = 4
+
+# Maximum number of pool processes of all the Django workers of the host: the pool of each
+# worker is capped to ANALYSIS_PROCESSES_PER_HOST // WEB_CONCURRENCY processes (the number of
+# workers, read from the environment variable WEB_CONCURRENCY, used by gunicorn and uvicorn;
+# 1 if unset). If None, no cap.
+ANALYSIS_PROCESSES_PER_HOST = os.cpu_count()
+
+# Long-document mode (gama.longdoc): texts longer than LONG_TEXT_CHUNK_SIZE characters are
+# split at stanza boundaries into chunks of at most that size, preprocessed and scanned in
+# parallel in the process pool above, and stitched back together (same results as a
+# sequential analysis). Texts of up to LONG_TEXT_MAX_LENGTH characters are accepted instead
+# of 4500. If None, the mode is disabled.
+LONG_TEXT_MAX_LENGTH = None
+LONG_TEXT_CHUNK_SIZE = 4500
+
+# Background bulk jobs (gama.jobs), processed by `python manage.py process_bulk_jobs`.
+# Maximum number of txt files in a ZIP submitted as a job.
+BULK_JOB_MAX_FILES = 200
+# Finished jobs (and their results) are deleted after this many days.
+BULK_JOB_RETENTION_DAYS = 2
+# Seconds between two checks of an empty queue by the worker.
+BULK_JOB_POLL_INTERVAL = 2
+# A running job is requeued (its worker was stopped) when its worker has not reported any
+# progress for this many seconds (one file analyzed, or the start of the job).
+BULK_JOB_STALE_AFTER = 600
+# Use background jobs for the multi-file form of the index page (requires the worker above);
+# otherwise the ZIP is analyzed during the upload request (max. 10 files).
+BULK_JOB_QUEUE = False
+
+# Cache of analysis results (gama.cache), keyed by a hash of the text, the pipeline
+# options and the data file versions. Least recently used entries are evicted when the
+# total size of the stored results (bytes of JSON) exceeds ANALYSIS_CACHE_MAX_SIZE.
+ANALYSIS_CACHE_ENABLED = True
+ANALYSIS_CACHE_MAX_SIZE = 100 * 1024 * 1024
+
+# Analysis results are stored in the database and referenced from the session by id
+# (gama.results). Results older than this many seconds are deleted
+# (two weeks, Django's default session lifetime).
+ANALYSIS_RESULT_MAX_AGE = 60 * 60 * 24 * 14
+
+# Maximum number of poems in one request to the JSON analysis API (gama:api_analysis).
+API_MAX_POEMS = 500
+
+# Send the results of an analysis line by line to the results page (server-sent events)
+# instead of waiting for the whole text before redirecting to it.
+ANALYSIS_STREAMING = False
+
+# Admission control of the analyses (gama.admission): at most ANALYSIS_MAX_CONCURRENT
+# analysis requests run at once on the host (all Django workers together), and at most
+# ANALYSIS_MAX_QUEUED requests wait for a free slot, for up to ANALYSIS_QUEUE_TIMEOUT
+# seconds. Other requests get a 503 response with a Retry-After header (seconds).
+# Slots are lock files in ADMISSION_DIR. Their occupancy (gama_admission_running and
+# gama_admission_queued in /metrics) is read from /proc/locks, on Linux only.
+# Set ANALYSIS_MAX_CONCURRENT to None to disable.
+ANALYSIS_MAX_CONCURRENT = 4
+ANALYSIS_MAX_QUEUED = 16
+ANALYSIS_QUEUE_TIMEOUT = 60
+ANALYSIS_RETRY_AFTER = 30
+ADMISSION_DIR = RUNTIME_DIR / 'admission'
+
+# Metrics in the Prometheus text format (gama.metrics), served at /metrics (restrict access
+# to it in the web server). Each process (Django workers, bulk job worker) writes its metrics
+# to a file in METRICS_DIR and the endpoint sums them. If None, /metrics only shows the
+# metrics of the process serving the request.
+METRICS_DIR = RUNTIME_DIR / 'metrics'
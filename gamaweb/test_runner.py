@@ -0,0 +1,25 @@
+"""
+Test runner of the project: the runtime files written during the tests (METRICS_DIR, ADMISSION_DIR)
+go to a temporary directory, deleted at the end, instead of settings.RUNTIME_DIR.
+"""
+
+from pathlib import Path
+import tempfile
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._runtime_dir = tempfile.TemporaryDirectory(prefix="gamaweb-tests-")
+        runtime_dir = Path(self._runtime_dir.name)
+        self._runtime_settings = override_settings(RUNTIME_DIR=runtime_dir, METRICS_DIR=runtime_dir / "metrics",
+                                                   ADMISSION_DIR=runtime_dir / "admission")
+        self._runtime_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._runtime_settings.disable()
+        self._runtime_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
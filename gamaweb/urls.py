@@ -18,8 +18,11 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf.urls.i18n import i18n_patterns
 
+from gama import views as gama_views
+
 urlpatterns = [
     path('i18n/', include('django.conf.urls.i18n')),  # Nécessaire pour set_language
+    path('metrics', gama_views.prometheus_metrics, name='metrics'),  # Prometheus, sans préfixe de langue
 ]
 
 urlpatterns += i18n_patterns(
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gamaweb.settings')
 
 application = get_wsgi_application()
+
+# Load the models now and fork the analysis pool if PRELOAD_MODELS is set (with
+# gunicorn --preload, in the master, shared by the workers), see gama.warmup
+from gama.warmup import preload  # noqa: E402
+
+preload()
@@ -16,7 +16,3 @@ oufi = oudir / "scansion.tsv"
 logdir = Path("logs")
 indir = Path("input")
 
-for dname in [oudir, logdir]:
-    if not Path(dname).exists():
-        Path(dname).mkdir(parents=True)
-
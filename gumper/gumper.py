@@ -141,12 +141,14 @@ MÓDULO DE ANALISIS DE PALABRA: COMPUTO DE SILABAS Y ACENTOS DE PALABRAS
 '''
 
 
+quitar = [':', ',', '.', ';', '.', '–', '(', ')', '\n', '\r', '¿', '?', '!', '¡', '—', '»', '”', '“', '«', '-','/', '/']
+quitar += ["'", '‘', '’', '´', '`'] # added pr
+# Todos los caracteres se quitan en una sola pasada
+tabla_quitar = str.maketrans('', '', ''.join(quitar))
+
+
 def quitar_puntuacion(texto):
-    quitar = [':', ',', '.', ';', '.', '–', '(', ')', '\n', '\r', '¿', '?', '!', '¡', '—', '»', '”', '“', '«', '-','/', '/']
-    quitar += ["'", '‘', '’', '´', '`'] # added pr
-    for q in quitar:
-        texto = texto.replace(q, '')
-    return texto
+    return texto.translate(tabla_quitar)
 
 
 def normalizar(texto):
@@ -704,19 +706,39 @@ def trocear_columna(x, c, i, contexto):
     return list(map(list, zip(*rodaja)))[c]
 
 
-def escandir_lista_versos(versos, contexto=14):
-    """Toma una lista de versos y devuelve el análisis métrico
+def trocear_silabas(silabas, desplazamiento, i, total, contexto):
+    """Equivalente a trocear_columna(x, 2, i, contexto) a partir de una ventana de la columna de sílabas.
+    Permite desambiguar un fragmento de un poema largo sin disponer de la tabla entera.
+
+        Args:
+            silabas (list): número de sílabas de los versos desde la posición 'desplazamiento', con al menos
+                            'contexto' versos antes y después del fragmento (o hasta el principio/final del poema)
+            desplazamiento (int): posición en el poema del primer elemento de 'silabas'
+            i (int): posición del verso en el poema
+            total (int): número de versos del poema
+            contexto (int): contexto que se quiere extraer
+        Returns:
+            list: la rodaja de columna
+    """
+
+    if i < contexto:
+        inicio, fin = 0, contexto
+    elif i + contexto >= total:
+        inicio, fin = i, total
+    else:
+        inicio, fin = i - contexto, i + contexto
+    return silabas[inicio - desplazamiento:fin - desplazamiento]
+
+
+def analizar_versos(versos):
+    """Primer cómputo de una lista de versos, con el módulo de ambigüedades desactivado (cada verso por separado)
 
         Args:
             versos (list of str): Lista de versos
-            contexto (int): en el caso en que se detecte un poema polimétrico, es el contexto para obtener
-                            las medidas frecuentes
         Returns:
-            list: una lista con el análisis métrico de todos los versos. Forma: [verso, v_etiquetado, silabas_v, acentos_v, acentos_ideales_v, tipo_v, ratio_v]
+            list: tabla con el análisis de los versos no vacíos. Forma: [verso, v_etiquetado, silabas_v, acentos_v, acentos_ideales_v, tipo_v, ratio_v]
     """
     x = []
-    nuevo = []
-    # computo con modulo de ambiguedades desactivado
     for verso_a in versos:
         v = verso_a.strip().replace('\n', '')
         if not v:
@@ -724,23 +746,48 @@ def escandir_lista_versos(versos, contexto=14):
         v_final, silabas_v, acentos_v, clasificacion_v = verso_silabas_acentos_tipo(verso_a, 0, 0)
         tipo_v, acentos_ideales_v, ratio_v = clasificacion_v
         x.append([v, v_final, silabas_v, acentos_v, acentos_ideales_v, tipo_v, ratio_v])
+    return x
 
-    # cálculo de versos frecuentes
-    columna_silabas_v = list(map(list, zip(*x)))[2]
+
+def medidas_frecuentes(columna_silabas_v):
+    """Calcula las medidas frecuentes del poema entero
+
+        Args:
+            columna_silabas_v (list): número de sílabas de todos los versos del poema
+        Returns:
+            tuple: (metrica_mixta, versos_frecuentes)
+    """
     versos_frecuentes = most_frequent(columna_silabas_v)
     if len(versos_frecuentes) == 1:
         metrica_mixta = False
     else:
         metrica_mixta = True
+    return metrica_mixta, versos_frecuentes
 
-    # computo de versos ambiguos
-    for i, dato_v in enumerate(x):
+
+def desambiguar_versos(x, silabas, desplazamiento, inicio, total, metrica_mixta, versos_frecuentes, contexto=14):
+    """Cómputo de los versos ambiguos de un fragmento del poema (o del poema entero), aproximándolos a las
+    medidas frecuentes del poema o, si es de métrica mixta, de su contexto
+
+        Args:
+            x (list): análisis de los versos del fragmento (ver analizar_versos)
+            silabas (list): ventana de la columna de sílabas del poema (ver trocear_silabas)
+            desplazamiento (int): posición en el poema del primer elemento de 'silabas'
+            inicio (int): posición en el poema del primer verso del fragmento
+            total (int): número de versos del poema
+            metrica_mixta (bool), versos_frecuentes (dict): medidas frecuentes del poema (ver medidas_frecuentes)
+            contexto (int): contexto para obtener las medidas frecuentes si el poema es polimétrico
+        Returns:
+            list: el análisis métrico de los versos del fragmento
+    """
+    nuevo = []
+    for j, dato_v in enumerate(x):
         silabas_v = dato_v[2]
         desambiguado = False
 
         # si es metrica mixta, se calculan las medidas frecuentes en un contexto n
         if metrica_mixta:
-            columna_silabas_v = trocear_columna(x, 2, i, contexto)
+            columna_silabas_v = trocear_silabas(silabas, desplazamiento, inicio + j, total, contexto)
             versos_frecuentes = most_frequent(columna_silabas_v)
 
         # aproximamos a los versos más frecuentes
@@ -757,6 +804,27 @@ def escandir_lista_versos(versos, contexto=14):
     return nuevo
 
 
+def escandir_lista_versos(versos, contexto=14):
+    """Toma una lista de versos y devuelve el análisis métrico
+
+        Args:
+            versos (list of str): Lista de versos
+            contexto (int): en el caso en que se detecte un poema polimétrico, es el contexto para obtener
+                            las medidas frecuentes
+        Returns:
+            list: una lista con el análisis métrico de todos los versos. Forma: [verso, v_etiquetado, silabas_v, acentos_v, acentos_ideales_v, tipo_v, ratio_v]
+    """
+    # computo con modulo de ambiguedades desactivado
+    x = analizar_versos(versos)
+
+    # cálculo de versos frecuentes
+    columna_silabas_v = list(map(list, zip(*x)))[2]
+    metrica_mixta, versos_frecuentes = medidas_frecuentes(columna_silabas_v)
+
+    # computo de versos ambiguos
+    return desambiguar_versos(x, columna_silabas_v, 0, 0, len(x), metrica_mixta, versos_frecuentes, contexto)
+
+
 def escandir_texto(texto):
     """Toma un poema y devuelve el análisis métrico
 
@@ -1,4 +1,5 @@
 import argparse
+import io
 from importlib import reload
 from pathlib import Path
 
@@ -8,6 +9,8 @@ import gumper
 from gumper.gumper import escandir_texto
 from gumper import config as cf
 from gumper import utils as ut
+# preprocessing directory added to sys.path by gumper.utils
+from rewrite import rule_files
 
 
 DBG = False
@@ -24,53 +27,113 @@ def parse_args():
     return parser.parse_args()
 
 def main(cf, origfile, infile):
-    reps_w = ut.load_w_replacements(cf)
-    reps_t = ut.load_t_replacements(cf)
+    """
+    Analyze a poem from files: the original text and its preprocessed version
+    (output of the preprocessing client). See :func:`scan_text`.
+    """
+    with open(origfile, encoding="utf8") as f:
+        orig_text = f.read()
+    with open(infile, encoding="utf8") as f:
+        # lines are obtained instead of just reading the text for compatibility with old code below
+        poem_lines = [line.strip() for line in f]
+    return scan_text(cf, orig_text, poem_lines)
+
+
+def scan_text(cf, orig_text, poem_lines):
+    """
+    Analyze a poem in memory.
+
+    Args:
+        cf: gumper config module
+        orig_text: original text of the poem
+        poem_lines: preprocessed lines of the poem
+
+    Returns:
+        Tuple with the html table rows of the scansion and the results as a list of dicts
+        (one per line, for the tsv export).
+    """
+    esc = escandir_texto(clean_text(cf, poem_lines))
+    return scan_results(orig_text, esc)
+
+
+def clean_text(cf, poem_lines):
+    """
+    Text to scan from the preprocessed lines of a poem, after the text- and word-level
+    replacements of the gumper config (one line per verse).
+    """
+    # loaded again only when the files change
+    reps_w = rule_files.get(cf.word_bound_replacements, ut.load_w_replacements, cf)
+    reps_t = rule_files.get(cf.text_level_replacements, ut.load_t_replacements, cf)
+
+    poem_lines = [line.strip() for line in poem_lines]
+    poem_text = "\n".join(poem_lines)
+    poem_text = ut.cleanup_text(poem_text, reps_t)
+    poem_text = ut.cleanup_text(poem_text, reps_w)
+    return poem_text
+
 
+def scan_results(orig_text, esc):
+    """
+    Results of the scansion of a poem, as returned by :func:`scan_text`.
+
+    Args:
+        orig_text: original text of the poem
+        esc: scansion of the poem (see :func:`gumper.gumper.escandir_lista_versos`)
+    """
     all_scansion_out = []
     # Pour construire le fichier results.tsv pour l'export
     # (Sinon les résultats de l'analyse sont sous forme html, compliquée à reformater dans un tsv)
     results_data = []
 
-    with open(origfile, encoding="utf8") as f:
-        # lines are obtained instead of just reading the text for compatibility with old code below
-        orig_lines = [line.strip() for line in f if line.strip() != ""]
+    # lines are obtained instead of just reading the text for compatibility with old code below
+    # (universal newlines, as when reading the text from a file)
+    orig_lines = [line.strip() for line in io.StringIO(orig_text, newline=None) if line.strip() != ""]
 
-    with open(infile, encoding="utf8") as f:
-        # lines are obtained instead of just reading the text for compatibility with old code below
-        poem_lines = [line.strip() for line in f]
-        poem_text = "\n".join(poem_lines)
-        poem_text = ut.cleanup_text(poem_text, reps_t)
-        poem_text = ut.cleanup_text(poem_text, reps_w)
-        esc = escandir_texto(poem_text)
-        for idx, result in enumerate(esc):
-            #TODO give possibility to hid postprocessed text via the web form,
-            #this was done as below with CLI arguments
-            #postpro_txt = "" if args.hide_post else f"{result[1]:<50}"
-            # Write output table lines
-            postpro_txt = f"{result[1]:<50}"
-            out_format = (f"<tr><td style='text-align:right'>{idx+1}.</td>"
-                  f"<td style='padding-left:1em'>{orig_lines[idx]:<50}</td>" 
-                  f"<td class='col-preprocessing'>{postpro_txt}"    #Ajout class pour fonction Afficher/Cacher colonne
-                  f"</td><td style='padding-left:3em;text-align:right'>{result[2]:>3}"
-                  f"</td><td style='padding-left:3em;text-align:right'>\t{' '.join([str(x) for x in result[3]]):>16}"
-                  f"</td><td style='padding-left:3em;text-align:right'>\t{' '.join([str(x) for x in result[4]]):>16}</td></tr>\n") 
-            DBG and print(out_format)
-            all_scansion_out.append(out_format)
-    #ut.write_output_file(all_poem_lines_out, all_scansion_out, f"001")
-
-            # Stockage données d'analyse pour tsv
-            results_data.append({
-                "line": idx + 1,
-                "original_text": orig_lines[idx],
-                "preprocessing": result[1],
-                "metrical_syllables": result[2],
-                "stressed_syllables": " ".join(map(str, result[3])),
-                "no_extra_rhythmic": " ".join(map(str, result[4]))
-            })
+    for idx, result in enumerate(esc):
+        #TODO give possibility to hid postprocessed text via the web form,
+        #this was done as below with CLI arguments
+        #postpro_txt = "" if args.hide_post else f"{result[1]:<50}"
+
+        # Stockage données d'analyse pour tsv
+        row = {
+            "line": idx + 1,
+            "original_text": orig_lines[idx],
+            "preprocessing": result[1],
+            "metrical_syllables": result[2],
+            "stressed_syllables": " ".join(map(str, result[3])),
+            "no_extra_rhythmic": " ".join(map(str, result[4])),
+            "meter_name": result[5].strip(),
+            "match_ratio": result[6],
+        }
+        results_data.append(row)
+
+        # Write output table lines
+        out_format = scansion_row(row)
+        DBG and print(out_format)
+        all_scansion_out.append(out_format)
+        #ut.write_output_file(all_poem_lines_out, all_scansion_out, f"001")
     # Retourner all_scansion_out (page html) et results_data (export)
     return all_scansion_out, results_data
 
+
+def scansion_row(row):
+    """
+    Html table row for the scansion of a line.
+
+    Args:
+        row: results of the line, as stored in the results list returned by :func:`scan_text`
+
+    Returns:
+        The row, as shown in the results page.
+    """
+    postpro_txt = f"{row['preprocessing']:<50}"
+    return (f"<tr><td style='text-align:right'>{row['line']}.</td>"
+            f"<td style='padding-left:1em'>{row['original_text']:<50}</td>"
+            f"<td class='col-preprocessing'>{postpro_txt}"    #Ajout class pour fonction Afficher/Cacher colonne
+            f"</td><td style='padding-left:3em;text-align:right'>{row['metrical_syllables']:>3}"
+            f"</td><td style='padding-left:3em;text-align:right'>\t{row['stressed_syllables']:>16}"
+            f"</td><td style='padding-left:3em;text-align:right'>\t{row['no_extra_rhythmic']:>16}</td></tr>\n")
+
 if __name__ == "__main__":
     for mod in [gumper, ut, cf]:
         reload(mod)
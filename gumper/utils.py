@@ -1,20 +1,31 @@
 from collections import OrderedDict
+from pathlib import Path
 import re
+import sys
 # imports work this way when importing :func:`gumper_client_web.main` from :mod:`gama.views`
 from gumper import config as cf
 
+# The preprocessing modules import each other without a package prefix (as in gama.pipeline):
+# `rewrite` must be imported under that same name, so that there is a single rule registry
+PREPRO_DIR = str(Path(__file__).resolve().parent.parent / "preprocessing")
+if PREPRO_DIR not in sys.path:
+    sys.path.insert(0, PREPRO_DIR)
+
+from rewrite import compile_rules  # noqa: E402
+
+APOSTROPHES = str.maketrans("", "", "'’‘")
+
 
 def cleanup_text(text, replacements=None):
     """
     Cleans up the text by removing unwanted characters and formatting
     and applying some replacements for single words and expresions.
+    The replacements are applied in order, with the compiled rule set of
+    :func:`rewrite.compile_rules` (preprocessing).
     """
     if replacements is not None:
-        for key, value in replacements.items():
-            text = re.sub(key, value, text)
-    text = text.replace("'", "")
-    text = text.replace("’", "")
-    text = text.replace("‘", "")
+        text = compile_rules(replacements.items()).apply(text)
+    text = text.translate(APOSTROPHES)
     text = text.strip()
     return text
 
@@ -64,6 +75,7 @@ def write_output_file(poem_lines, outinfo, poem_id):
                      info[-2]]  # meter name
             out_lines.append(keeps)
     ouname = cf.oufi.stem + f"_{str.zfill(poem_id, 3)}" + cf.oufi.suffix
+    cf.oufi.parent.mkdir(parents=True, exist_ok=True)
     with open(cf.oufi.with_name(ouname), "w", encoding="utf-8") as oufh:
         for line in out_lines:
             oufh.write("\t".join([str(x) for x in line]) + "\n")
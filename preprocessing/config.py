@@ -8,18 +8,29 @@ APOS = r"['‘’]"
 
 #IO
 
-data_dir = Path("data")
+# paths are relative to this file, so that the pipeline also works when imported
+# from another working directory (e.g. from the Django app)
+base_dir = Path(__file__).resolve().parent
+data_dir = base_dir / "data"
 text_level_replacements = data_dir / "replacements_text.tsv"
 syllable_replacements = data_dir / "syllabification_postprocessing.tsv"
 words_with_hyphen_to_keep = data_dir / "hyphens_to_keep.txt" # unused
 
-log_dir = "logs"
+log_dir = base_dir / "logs"
 log_fn_template = "log_{batch_id}.txt"
 if not Path(log_dir).exists():
     Path(log_dir).mkdir(parents=True)
 
 batch_cumulog = "batch_log.txt"
 
+# syllabification
+
+# maximum number of words in the memo of finished syllabifications (per process)
+syllabification_memo_size = 50000
+# precomputed syllabification of the vocabulary (scripts/build_syllabification_lexicon.py),
+# not used if the file does not exist
+syllabification_lexicon = data_dir / "syllabification_lexicon.bin"
+
 # pos-tagging
 
 pos_model_path = data_dir / "galician-treegal-ud-2.5-191206.udpipe"
\ No newline at end of file
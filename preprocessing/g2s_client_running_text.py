@@ -1,10 +1,7 @@
 import argparse
-from collections import OrderedDict
-import copy
 from importlib import reload
 import logging
 from pathlib import Path
-import re
 import sys
 import time
 
@@ -14,14 +11,10 @@ import grapheme2syllable as g2s
 from normalization import lm_manager as lmg
 from normalization import normalizer
 from normalization import normconfig as ncf
+import pipeline as ppl
 
 import utils as ut
 
-PUNCT_TO_REMOVE = ".,;?!¿¡:«»()”“„"
-PUNCT_TO_SPACE = "—"
-PUNCT_RE = re.compile(f"([{PUNCT_TO_REMOVE}]+)", re.UNICODE)
-PUNCT_TO_SPACE_RE = re.compile(f"([{PUNCT_TO_SPACE}]+)", re.UNICODE)
-
 
 def parse_args():
     """
@@ -45,190 +38,12 @@ def parse_args():
     return parser.parse_args()
 
 
-def preprocess_orthography(txt: str) -> str:
-    """
-    Preprocess the input text to modernize some sequences without altering metrically relevant content.
-
-    Args:
-        txt (str): The input text to preprocess.
-
-    Returns:
-        str: The preprocessed text.
-    """
-    pat2rep = ut.load_text_replacements(cf)
-    # breakpoint()
-    for pat, rep in pat2rep.items():
-        txt = re.sub(pat, rep, txt)
-    return txt
-
-
-def postprocess_syllable_str(syllable_str: str) -> str:
-    """
-    Postprocess the syllable sequence (as a string), according to the rules in
-    :obj:`cf.syllable_replacements`.
-
-    Args:
-        syllable_str (str): The input syllable string.
-
-    Returns:
-        str: The post-processed syllable string.
-    """
-    # Remove unwanted characters and format the syllable string
-    pat2rep = ut.load_syllable_replacements(cf)
-    for pat, (rep, postpro_info) in pat2rep.items():
-        # only apply postprocessing instructions if the pattern matches
-        if re.search(pat, syllable_str):
-            if postpro_info == "unstressed":
-                syllable_str = syllable_str.lower()
-        # apply the replacement (it's case insensitive so lowercasing above
-        # does not affect the replacement)
-        syllable_str = re.sub(pat, rep, syllable_str)
-
-    return syllable_str
-
-
-def apply_syllabification(line_list: list[str]) -> tuple[list[tuple], list[str]]:
-    """
-    Apply :func:`g2s.silabeo` to a list of lines, syllabifying each word in the lines.
-
-    Args:
-        line_list (list[str]): A list of lines to syllabify.
-
-    Returns:
-        tuple: A tuple containing two lists:
-            - A list of tuples, containing syllabified words with stress marks, without,
-              and the stressed syllable position.
-            - A list of strings with the syllabified words without stress marks.
-    """
-    # load data for preprocessing (word or regex lists)
-    logger.info("  - Start preprocessing: %s", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
-    hyphens_to_keep = ut.load_words_with_hyphen_to_keep(cf)  # unused so far
-    out_lines = []  # syllabification after orthographic preprocessing
-    out_lines_running_text = []  # orthographic preprocessing
-    for line in line_list:
-        text = line.strip()
-        # replacements that may affect a sequence of words
-        text = re.sub(PUNCT_TO_SPACE_RE, " ", text)
-        if args.preprocess:
-            text = preprocess_orthography(text)
-            text = re.sub(PUNCT_RE, r" \1 ", text)
-        words = [tok for tok in re.split(r"\s+", text) if tok.strip() != ""]
-        out_line = []
-        out_line_running_text = []
-
-        # handle apostrophes
-        updated_words = []
-
-        for widx, word in enumerate(words):
-            has_apos = re.search(r"(\w+)['‘’](\w*)", word)
-            if not has_apos:
-                updated_words.append(word)
-                continue
-
-            word_orig = word
-            base = has_apos.group(1)
-            suffix = has_apos.group(2)
-
-            split_parts = [base]
-            if suffix:
-                # for apostrophes, we only edit by adding a, e, o
-                split_parts.append(suffix.strip())
-
-            # Generate vowel edits for base
-            edits_noapos = [base + v for v in ['a', 'e', 'o']]
-            ed_scos = []
-
-            # Prepare a simulated token list for context computation
-            simulated_toklist = updated_words + [base] + words[widx + 1:]
-            simulated_idx = len(updated_words)  # index where base would be inserted
-            wlc, wrc = nglm.find_context_for_token(base, simulated_idx, simulated_toklist)
-
-            for ed in edits_noapos:
-                ed_sco = nglm.find_logprob_in_context(ed, (wlc, wrc))
-                ed_scos.append((ed, ed_sco))
-
-            best_ed_cand = sorted(ed_scos, key=lambda x: -x[1])
-
-            if not best_ed_cand:
-                updated_words.append(word_orig)
-            else:
-                new_word = best_ed_cand[0][0]
-                updated_words.append(new_word)
-                if len(split_parts) > 1:
-                    updated_words.extend(split_parts[1:])
-
-                logger.debug(
-                    f"Replace Apostrophe: [{word_orig}] to [{new_word}]+[{split_parts[1:] if len(split_parts) > 1 else ''}] context [{' '.join(updated_words)}]")
-
-        # handle other normalization cases than apostrophes
-        for widx, word in enumerate(updated_words):
-            if re.search(PUNCT_RE, word):
-                out_line.append((word, word, word, -1))  # no syllabification
-                out_line_running_text.append(re.sub(PUNCT_TO_SPACE_RE, " ", word).replace("-", ""))
-                continue
-            # remove punctuation (but hypen) from words
-            word = re.sub(PUNCT_TO_SPACE_RE, " ", word)
-            word = word.replace("-", "")
-            if word.strip() == "":
-                continue
-            # check if needs diacritic stress
-            #   if in list, line with unaccented and accented variants are scored
-            #   with n-gram lm and the best is chosen
-            if word in sti.diacritic_stress:
-                updated_words = words[0:widx] + [word] + words[widx + 1:]
-                wlc, wrc = nglm.find_context_for_token(word, widx, updated_words)
-                sco_unstressed = nglm.find_logprob_in_context(word, (wlc, wrc))
-                sco_stressed = nglm.find_logprob_in_context(sti.diacritic_stress[word], (wlc, wrc))
-                if sco_stressed > sco_unstressed:
-                    word_orig = word
-                    word = sti.diacritic_stress[word]
-                    logger.debug(
-                        f"LM Dia Stress: [{word_orig}] to [{sti.diacritic_stress[word_orig]}] context [{' '.join(updated_words)}]")
-            # do token normalization before syllabification
-            # normalizer is `nmlzr` instantiated in main block
-            if args.normalize and word not in nmlzr.vocab:
-                # version of word with initial caps may be in vocabulary, neutralize
-                if word.lower() not in nmlzr.vocab:
-                    # test if exact match in Spanish (castellanismo)
-                    if False and (word in nmlzr_es.vocab or word.lower() in nmlzr_es.vocab):
-                        logger.debug(f"Accept castellanismo [{word}]")
-                    else:
-                        wcands = nmlzr.collect_candidates(word)
-                        best_cand = nmlzr.rank_candidates(word, updated_words, widx, wcands, nglm)
-                        if best_cand is not None:
-                            logger.debug(f"LM Ed Norm: [{word}] to [{best_cand.form}]")
-                        else:
-                            logger.debug(f"No Norm: [{word}]")
-                        word = best_cand.form if best_cand is not None else word
-                        # respect case in orig text, using a case mask
-                        case_mask_norm = nmlzr.create_case_mask(word)
-                        word_cased = "".join([cha.upper() if cm == 1 else cha for (cha, cm) in zip(list(word), case_mask_norm)])
-                        word = word_cased
-            words_before_pos = copy.deepcopy(updated_words)
-
-            # sylllabification only after preprocessing each line as above
-            syllables = g2s.syllabify_full(re.sub(PUNCT_TO_SPACE_RE, " ", word), spanishfy=args.spanishfy)
-            syllables_orig = syllables
-            # several representations of the syllabified word are stored,
-            # along with the stressed syllable position
-            syllables = (postprocess_syllable_str(syllables[0]),  # stressed syllable in uppercase
-                         postprocess_syllable_str(syllables[1]),  # stressed syllable preceded by a diacritic
-                         postprocess_syllable_str(syllables[2]),  # no extra indication of stress
-                         syllables[-1])  # stressed syllable position
-            out_line.append(syllables)
-            out_line_running_text.append(syllables[2].replace("-", ""))
-        if len(out_line) > 0:
-            out_lines.append(out_line)
-        if len(out_line_running_text) > 0:
-            out_lines_running_text.append(out_line_running_text)
-    return out_lines, out_lines_running_text
-
-
 if __name__ == "__main__":
     reload(cf)
     reload(g2s)
     reload(ncf)
     reload(normalizer)
+    reload(ppl)
     reload(sti)
     reload(ut)
 
@@ -265,38 +80,20 @@ if __name__ == "__main__":
         nmlzr_es = normalizer.Normalizer(ncf, lang="es")
         # pos_tagger =
     else:
+        nmlzr = None
         print("Normalization off, run with --normalize to enable.")
 
     # Prepare n-gram language model
     nglm = lmg.KenLMManager()
 
     # Syllabification
-    out_lines, out_lines_running_text = apply_syllabification(lines_to_syllabify)
+    out_lines, out_lines_running_text = ppl.apply_syllabification(
+        lines_to_syllabify, nglm, nmlzr=nmlzr, preprocess=args.preprocess, spanishfy=args.spanishfy)
 
     # Destressing
     if args.destress:
-        destress_function = ut.destress_word_simple
-        # destress in running text
-        out_lines_running_text_destressed = copy.deepcopy(out_lines_running_text)
-        for lidx, olrt in enumerate(out_lines_running_text):
-            for widx, syll_info in enumerate(olrt):
-                if syll_info.lower() in sti.atonas_gl:
-                    # if the word is unstressed, remove the stress mark
-                    out_lines_running_text_destressed[lidx][widx] = destress_function(syll_info.replace("´", ""))
-        # destress in syllabified output
-        # create a mutable copy of the syllabified output
-        out_lines_destressed = []
-        for ol in out_lines:
-            out_lines_destressed.append(list(ol))
-        for slidx, ol in enumerate(out_lines):
-            for swidx, syll_info in enumerate(ol):
-                if syll_info[2].lower().replace("-", "") in sti.atonas_gl:
-                    case_mask = [1 if char.isupper() else 0 for char in syll_info[2]]
-                    # if the word is unstressed, remove the stress mark
-                    out_lines_destressed[slidx][swidx] = (destress_function(syll_info[0], case_mask),
-                                                          destress_function(syll_info[1], case_mask),
-                                                          destress_function(syll_info[2], case_mask),
-                                                          syll_info[3])
+        out_lines_destressed, out_lines_running_text_destressed = ppl.destress_lines(
+            out_lines, out_lines_running_text, destress_function=ut.destress_word_simple)
 
     # Outputs
     # breakpoint()
@@ -46,6 +46,18 @@ PATS.append("(" + "." + ")")
 ALLPATS = PATS[0] + "|" + PATS[1] + "|" + PATS[2] + "|" + PATS[3] + "|" + PATS[4] + "|" + PATS[5] + "|" + PATS[6] + "|" + PATS[7]
 PROG = re.compile(ALLPATS, re.I | re.U)
 
+# Character classes of the patterns, as bits: :func:`syllabify_core` finds the first
+# matching pattern at each position from the classes of the next characters
+_V, _A, _I, _C, _R, _H, _ANY = 1, 2, 4, 8, 16, 32, 64
+_CLASS_RES = [(bit, re.compile(cls, re.I | re.U))
+              for bit, cls in [(_V, V), (_A, A), (_I, I), (_C, C), (_R, R), (_H, "h"), (_ANY, ".")]]
+_char_classes_cache = {}
+
+# Vowels with a stress mark (search_stress_mark) and endings of words without final
+# stress (search_stressed_syll)
+STRESS_MARK_RE = re.compile("[áéíóú]", re.I | re.U)
+UNSTRESSED_END_RE = re.compile(r"(([aeiou])|(n)|([aeiou]s))\Z", re.I | re.U)
+
 # In Galician, falling diphthongs do not get a stress mark in a stressed final syllable, list them here
 UNACCENTED_DIPHTHONGS_GL = {"ai", "au", "ei", "ey", "eu", "oi", "ou"}
 
@@ -63,24 +75,60 @@ def get_matching_pat(pat_nbr: int) -> str:
     return switcher.get(pat_nbr, "")
 
 
+def _char_classes(char: str) -> int:
+    """
+    Classes of `char` in the patterns of `ALLPATS` (bits `_V`, `_A`...), computed once
+    per character with the same regular expressions.
+    """
+    classes = _char_classes_cache.get(char)
+    if classes is None:
+        classes = 0
+        for bit, cls_re in _CLASS_RES:
+            if cls_re.fullmatch(char):
+                classes |= bit
+        _char_classes_cache[char] = classes
+    return classes
+
+
 def syllabify_core(input: str)-> str:
     """
-    Syllabifies a word based on regex patterns.
-    
+    Syllabifies a word based on the patterns in `ALLPATS`.
+
+    At each position, the first pattern of `ALLPATS` matching there tells whether a
+    syllable ends after the current character (see :func:`get_matching_pat`). All
+    patterns are sequences of character classes (the last one matches any character
+    but a line break), so this is found from the classes of the next four characters,
+    in a single scan of the word. As with ``PROG.search``, a line break takes the
+    pattern matching at the next character that is not a line break (none at the end).
+
     Args:
         input (str): The word to be syllabified.
-    
+
     Returns:
         str: The syllabified word with dashes between syllables.
     """
-    output = ""
-    while len(input) > 0:
-        output += input[0]
-        # Return first matching pattern.
-        m = PROG.search(input)
-        output += get_matching_pat(m.lastindex)
-        input = input[1:]
-    return output
+    classes = [_char_classes(char) for char in input] + [0, 0, 0]
+    output = []
+    for idx, char in enumerate(input):
+        output.append(char)
+        if char == "\n":
+            idx = next((pos for pos in range(idx + 1, len(input)) if input[pos] != "\n"), None)
+            if idx is None:
+                continue
+        c0, c1, c2, c3 = classes[idx:idx + 4]
+        if c1 & _H and c2 & _I and c0 & (_I | _A) or c1 & _H and c0 & _I and c2 & _A:
+            # patterns 1, 2, 3: vowels around an "h"
+            continue
+        if c0 & _ANY and c1 & _C and c2 & _R and c3 & _V:
+            # pattern 4
+            output.append("-")
+        elif c0 & _C and c1 & _R and c2 & _V:
+            # pattern 5
+            continue
+        elif c0 & _ANY and c1 & _C and c2 & _V or c0 & _A and c1 & _A:
+            # patterns 6, 7
+            output.append("-")
+    return "".join(output)
 
 
 def search_stress_mark(silabas: list) -> int:
@@ -94,17 +142,15 @@ def search_stress_mark(silabas: list) -> int:
     Returns:
         int: position of the syllable with orthographic stress or -1 if none found
     """
-    vowels_with_stress_mark = "[áéíóú]"
-    reg = re.compile(vowels_with_stress_mark, re.I|re.U)
     for idx, syl in enumerate(silabas):
-        if reg.search(syl):
+        if STRESS_MARK_RE.search(syl):
             return idx
     return -1
 
 
 def search_stressed_syll(silabas: list) -> bool:
     """
-    The patterns in `unstressed_re` are searched in the last member of a list
+    The patterns in `UNSTRESSED_END_RE` are searched in the last member of a list
     of strings each of which represents a syllable. If it matches, it means that
     the word has antepenult stress, because words whose final syllable matches
     the pattern do not have final stress, and antepenult or earlier stress are
@@ -117,9 +163,7 @@ def search_stressed_syll(silabas: list) -> bool:
         bool: True if the last syllable matches the unstressed pattern (i.e.
               word has penult stress), False otherwise
     """
-    unstressed_re = r"(([aeiou])|(n)|([aeiou]s))\Z"
-    reg = re.compile(unstressed_re, re.I|re.U)
-    if reg.search(silabas[-1]):
+    if UNSTRESSED_END_RE.search(silabas[-1]):
         return True
     else:
         return False
@@ -217,10 +261,17 @@ def _resyllabify_close_sequence(sl: list) -> list:
               resyllabified correctly
     """
     for idx, sy in enumerate(sl):
-        symatch = re.match(r"^(.*?([iu]))(\2.*?)$", sy)
-        if symatch:
-            sl[idx] = symatch.group(1)
-            sl.insert(idx+1, symatch.group(3))
+        # like the regex ^(.*?([iu]))(\2.*?)$: no match across a line break, and a final
+        # line break is dropped
+        body = sy[:-1] if sy.endswith("\n") else sy
+        if "\n" in body:
+            continue
+        # first "ii" or "uu" (the new syllable is checked in the next iteration)
+        for pos in range(len(body) - 1):
+            if body[pos] in "iu" and body[pos + 1] == body[pos]:
+                sl[idx] = body[:pos + 1]
+                sl.insert(idx+1, body[pos + 1:])
+                break
     return sl
 
 
@@ -236,13 +287,21 @@ def _resyllabify_homogeneous_diphthong_(sl: list)-> list:
               resyllabified correctly
     """
     for idx, sy in enumerate(sl):
-        symatch = re.match(r"^(.*?[^gq])([iu])([íú])(.*?)$", sy)
-        if symatch:
-            # print sl, sy
-            sl[idx] = symatch.group(1) + symatch.group(2)
-            sl.insert(idx+1, symatch.group(3))
-            if symatch.group(4):
-                sl.insert(idx+2, symatch.group(4))
+        # first "i" or "u" followed by "í" or "ú", not at the start nor after "g" or "q"
+        for pos in range(1, len(sy) - 1):
+            # like the regex ^(.*?[^gq])([iu])([íú])(.*?)$: only the character before the
+            # vowels may be a line break, and a final line break is dropped
+            if "\n" in sy[:pos - 1]:
+                break
+            if sy[pos] in "iu" and sy[pos + 1] in "íú" and sy[pos - 1] not in "gq":
+                rest = sy[pos + 2:-1] if sy.endswith("\n") else sy[pos + 2:]
+                if "\n" in rest:
+                    continue
+                sl[idx] = sy[:pos + 1]
+                sl.insert(idx+1, sy[pos + 1])
+                if rest:
+                    sl.insert(idx+2, rest)
+                break
     return sl
 
 
@@ -259,7 +318,9 @@ def _resyllabify_osbstruent_liquid(sl: list) -> list:
     sl_copy = copy(sl)
     for idx, sy in enumerate(sl):
         try:
-            if (re.match(r"^[pbftdkcg]$", sy.lower())
+            # like the regex ^[pbftdkcg]$, which also matches before a final line break
+            body = sy[:-1] if sy.endswith("\n") else sy
+            if (len(body) == 1 and body.lower() in "pbftdkcg"
                 and sl[idx+1][0].lower() in {"l", "r"}):
                 sl_copy[idx+1] = "".join((sl[idx][-1], sl[idx+1]))
                 del sl_copy[idx]
@@ -287,7 +348,7 @@ def _resyllabify_double_l(sl: list) -> list:
             # the first "syllable" is just a single "l", perhaps
             # there were missyllabifications with such (incorrect) "syllables"
             # and this function was meant to fix them.
-            if (re.match(r"^l$", sy.lower())
+            if (sy.lower() in {"l", "l\n"}  # ^l$ also matches before a final line break
                 and sl[idx+1][0].lower() == "l"):
                 sl_copy[idx+1] = "".join((sl[idx][-1], sl[idx+1]))
                 del sl_copy[idx]
@@ -311,8 +372,7 @@ def _resyllabify_liquids(sl: list) -> list:
     sl_copy = copy(sl)
     for idx, sy in enumerate(sl):
         try:
-            liquid_seq_in_same_syllable = r"^(?:lr|rl|nr)"
-            if re.search(liquid_seq_in_same_syllable, sy.lower()):
+            if sy.lower().startswith(("lr", "rl", "nr")):  # liquid sequence in the same syllable
                 sl_copy[idx] = sy[1:]
                 sl_copy[idx-1] = sl_copy[idx-1] + sy[0]
         except IndexError:
@@ -334,7 +394,7 @@ def _resyllabify_ch(sl: list) -> list:
     sl_copy = copy(sl)
     for idx, sy in enumerate(sl):
         try:
-            if (re.match(r"^c$", sy.lower())
+            if (sy.lower() in {"c", "c\n"}  # ^c$ also matches before a final line break
                 and sl[idx+1][0].lower() == "h"):
                 sl_copy[idx+1] = "".join((sl[idx][-1], sl[idx+1]))
                 del sl_copy[idx]
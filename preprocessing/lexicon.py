@@ -0,0 +1,230 @@
+"""
+Precomputed syllabification lexicon: the output of :func:`g2s.syllabify_full` for every
+word of the vocabulary, in plain and spanishfied modes, in a file read through
+:mod:`mmap`. Looking a word up costs a hash and a few reads in the mapped file instead
+of the syllabification; the pages of the file are shared by all the processes that
+map it (Django workers, analysis pool, preprocessing service).
+
+The file is built offline with scripts/build_syllabification_lexicon.py. It records a
+fingerprint of the syllabification code (:mod:`grapheme2syllable` and :mod:`utils`):
+a lexicon built with other code is not used.
+
+File layout (integers are little-endian uint32):
+
+* ``MAGIC``, the length of a JSON header, the JSON header (format, fingerprint,
+  diacritic, number of words), padded to 4 bytes;
+* the number of slots and of entries;
+* the hash table: one slot per entry index (``EMPTY`` if free), open addressing with
+  linear probing on ``zlib.crc32`` of the word in UTF-8;
+* the entries: offset and length of the word, of its plain value and of its
+  spanishfied value in the strings that follow;
+* the strings: words and values, a value being the three syllabified forms and the
+  stress position separated by tabs (an identical spanishfied value is stored once).
+"""
+
+from array import array
+import hashlib
+import json
+import logging
+import mmap
+from pathlib import Path
+import struct
+import sys
+import zlib
+
+lexicon_logger = logging.getLogger("main.lexicon")
+
+MAGIC = b"G2SLEX\x00\x01"
+FORMAT = 1
+EMPTY = 0xFFFFFFFF
+_UINT32 = struct.Struct("<I")
+_COUNTS = struct.Struct("<II")
+_ENTRY = struct.Struct("<IIIIII")
+
+
+def code_fingerprint() -> str:
+    """
+    Fingerprint of the code whose output is stored in the lexicon.
+
+    Returns:
+        str: SHA-256 of the source files of :mod:`grapheme2syllable` and :mod:`utils`.
+    """
+    h = hashlib.sha256()
+    base_dir = Path(__file__).resolve().parent
+    for name in ["grapheme2syllable.py", "utils.py"]:
+        h.update((base_dir / name).read_bytes())
+    return h.hexdigest()
+
+
+def _encode_value(syllables: tuple) -> bytes:
+    return "\t".join(str(x) for x in syllables).encode("utf-8", "surrogatepass")
+
+
+def _decode_value(value: bytes) -> tuple[str, str, str, int]:
+    out, wdiac, worig, stressposi = value.decode("utf-8", "surrogatepass").split("\t")
+    return out, wdiac, worig, int(stressposi)
+
+
+def write_lexicon(words, path: Path, syllabify, diacritic: str = "´") -> int:
+    """
+    Syllabifies words and writes the lexicon file.
+
+    Args:
+        words: The words (e.g. the vocabulary set).
+        path (Path): Path of the lexicon file.
+        syllabify: The syllabification function, :func:`g2s.syllabify_full`.
+        diacritic (str): The stress diacritic given to ``syllabify``.
+
+    Returns:
+        int: Number of words in the lexicon (words with tabs, line breaks or spaces,
+        or without a syllabification, are left out).
+    """
+    strings = bytearray()
+    offsets = {}
+
+    def add_string(data: bytes) -> tuple[int, int]:
+        if data not in offsets:
+            offsets[data] = len(strings)
+            strings.extend(data)
+        return offsets[data], len(data)
+
+    entries = []
+    for word in sorted(set(words)):
+        if not word or any(char in word for char in "\t\n\r "):
+            continue
+        plain = syllabify(word, diacritic=diacritic, spanishfy=False)
+        spanish = syllabify(word, diacritic=diacritic, spanishfy=True)
+        if None in plain or None in spanish:
+            continue
+        key = word.encode("utf-8", "surrogatepass")
+        entries.append((key, *add_string(key), *add_string(_encode_value(plain)),
+                        *add_string(_encode_value(spanish))))
+
+    # load factor at most 0.5
+    nslots = max(8, 2 * len(entries))
+    slots = [EMPTY] * nslots
+    for idx, (key, *_offsets) in enumerate(entries):
+        slot = zlib.crc32(key) % nslots
+        while slots[slot] != EMPTY:
+            slot = (slot + 1) % nslots
+        slots[slot] = idx
+
+    header = json.dumps({"format": FORMAT, "fingerprint": code_fingerprint(), "diacritic": diacritic,
+                         "words": len(entries)}).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + _UINT32.size + len(header)) % 4)
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + _UINT32.pack(len(header)) + header)
+        f.write(_COUNTS.pack(nslots, len(entries)))
+        slots = array("I", slots)
+        if sys.byteorder == "big":
+            slots.byteswap()
+        f.write(slots.tobytes())
+        for key, *entry in entries:
+            f.write(_ENTRY.pack(*entry))
+        f.write(strings)
+    tmp_path.replace(path)
+    return len(entries)
+
+
+class SyllabificationLexicon:
+    """
+    Read-only, memory-mapped syllabification lexicon (see the module docstring).
+
+    Args:
+        path (Path): Path of the lexicon file.
+
+    Raises:
+        ValueError: If the file is not a lexicon of the current format.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a syllabification lexicon")
+        pos = len(MAGIC)
+        (header_length,) = _UINT32.unpack_from(self._mm, pos)
+        pos += _UINT32.size
+        self.header = json.loads(self._mm[pos:pos + header_length])
+        if self.header.get("format") != FORMAT:
+            self.close()
+            raise ValueError(f"{self.path}: unknown lexicon format {self.header.get('format')}")
+        pos += header_length
+        self.nslots, self.nentries = _COUNTS.unpack_from(self._mm, pos)
+        self._slots = pos + _COUNTS.size
+        self._entries = self._slots + self.nslots * _UINT32.size
+        self._strings = self._entries + self.nentries * _ENTRY.size
+        self.diacritic = self.header["diacritic"]
+
+    def __len__(self) -> int:
+        return self.nentries
+
+    def _entry(self, word: str):
+        key = word.encode("utf-8", "surrogatepass")
+        mm = self._mm
+        slot = zlib.crc32(key) % self.nslots
+        while True:
+            (idx,) = _UINT32.unpack_from(mm, self._slots + slot * _UINT32.size)
+            if idx == EMPTY:
+                return None
+            entry = _ENTRY.unpack_from(mm, self._entries + idx * _ENTRY.size)
+            start = self._strings + entry[0]
+            if entry[1] == len(key) and mm[start:start + entry[1]] == key:
+                return entry
+            slot = (slot + 1) % self.nslots
+
+    def get(self, word: str, spanishfy: bool = False) -> tuple[str, str, str, int] | None:
+        """
+        Syllabification of a word, as returned by :func:`g2s.syllabify_full`.
+
+        Args:
+            word (str): The word.
+            spanishfy (bool): Whether Spanish orthographic stress rules are applied.
+
+        Returns:
+            tuple | None: The syllabification, or None if the word is not in the lexicon.
+        """
+        entry = self._entry(word)
+        if entry is None:
+            return None
+        offset, length = (entry[4], entry[5]) if spanishfy else (entry[2], entry[3])
+        start = self._strings + offset
+        return _decode_value(self._mm[start:start + length])
+
+    def __contains__(self, word: str) -> bool:
+        return self._entry(word) is not None
+
+    def close(self):
+        """Unmaps the file."""
+        self._mm.close()
+
+
+def load_lexicon(path: Path) -> SyllabificationLexicon | None:
+    """
+    Opens the lexicon at ``path`` if it exists and was built with the current
+    syllabification code.
+
+    Args:
+        path (Path): Path of the lexicon file.
+
+    Returns:
+        SyllabificationLexicon | None: The lexicon, or None (the words are then syllabified).
+    """
+    if path is None or not Path(path).exists():
+        return None
+    try:
+        lexicon = SyllabificationLexicon(path)
+    except (OSError, ValueError) as e:
+        lexicon_logger.warning("Syllabification lexicon not used: %s", e)
+        return None
+    if lexicon.header.get("fingerprint") != code_fingerprint():
+        lexicon_logger.warning("Syllabification lexicon not used: %s was built with other syllabification code, "
+                               "run scripts/build_syllabification_lexicon.py again", path)
+        lexicon.close()
+        return None
+    lexicon_logger.info("Loaded syllabification lexicon %s (%d words)", path, len(lexicon))
+    return lexicon
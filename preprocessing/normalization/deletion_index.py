@@ -0,0 +1,333 @@
+"""
+Deletion index of the vocabulary (SymSpell): retrieves the vocabulary words within edit
+distance 2 of a word with a few lookups instead of generating every string at distance 2.
+
+Every vocabulary word is indexed under its deletion variants: the strings obtained by
+deleting up to ``max_distance`` characters from its first ``prefix_length`` characters.
+If two words are within Levenshtein distance k, deleting at most k characters from each
+of their prefixes gives a common string, so looking up the deletion variants of the
+prefix of a word finds every vocabulary word within distance k (and some others). The
+words found are then checked with :func:`within_distance`, which gives exactly the words
+that :meth:`editor.EdManager.edits1` applied twice can produce.
+
+The file is built offline with scripts/build_deletion_index.py and read through
+:mod:`mmap`. It records a fingerprint of the vocabulary file: an index built from
+another vocabulary is not used.
+
+File layout (integers are little-endian uint32):
+
+* ``MAGIC``, the length of a JSON header, the JSON header (format, vocabulary
+  fingerprint, prefix length, maximum distance, numbers of words and keys), padded to
+  4 bytes;
+* the number of slots, of keys, of words and of postings;
+* the hash table: one slot per key index (``EMPTY`` if free), open addressing with
+  linear probing on ``zlib.crc32`` of the key in UTF-8;
+* the keys: offset and length of the key in the strings, first posting and number
+  of postings;
+* the words: offset and length in the strings;
+* the postings: word indexes, the words indexed under each key;
+* the strings: keys and words.
+"""
+
+from array import array
+from collections import defaultdict
+import hashlib
+import json
+import logging
+import mmap
+from pathlib import Path
+import struct
+import sys
+import zlib
+
+index_logger = logging.getLogger("main.deletion_index")
+
+MAGIC = b"DELIDX\x00\x01"
+FORMAT = 1
+EMPTY = 0xFFFFFFFF
+PREFIX_LENGTH = 7
+MAX_DISTANCE = 2
+_UINT32 = struct.Struct("<I")
+_COUNTS = struct.Struct("<IIII")
+_KEY = struct.Struct("<IIII")
+_WORD = struct.Struct("<II")
+
+
+def vocabulary_fingerprint(path: Path) -> str:
+    """
+    Fingerprint of a vocabulary file.
+
+    Args:
+        path (Path): Path of the pickled vocabulary.
+
+    Returns:
+        str: SHA-256 of the file.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def deletes(word: str, max_distance: int = MAX_DISTANCE) -> set[str]:
+    """
+    Deletion variants of a word.
+
+    Args:
+        word (str): The word.
+        max_distance (int): Maximum number of deleted characters.
+
+    Returns:
+        set[str]: The strings obtained by deleting up to ``max_distance`` characters
+        (including the word itself).
+    """
+    variants = {word}
+    last = {word}
+    for _ in range(max_distance):
+        last = {variant[:i] + variant[i + 1:] for variant in last for i in range(len(variant))}
+        variants |= last
+    return variants
+
+
+def within_distance(source: str, target: str, alphabet, max_distance: int = MAX_DISTANCE) -> bool:
+    """
+    Whether ``target`` can be obtained from ``source`` with at most ``max_distance``
+    edits, an edit being the deletion of any character, or the insertion or the
+    substitution of a character of ``alphabet`` (the edits of
+    :meth:`editor.EdManager.edits1`, without lowercasing).
+
+    Args:
+        source (str): The word edited (e.g. the OOV).
+        target (str): The candidate.
+        alphabet: Set of the characters that can be inserted or substituted.
+        max_distance (int): Maximum number of edits.
+
+    Returns:
+        bool: True if ``target`` is within ``max_distance`` edits of ``source``.
+    """
+    n, m = len(source), len(target)
+    if abs(n - m) > max_distance:
+        return False
+    too_far = max_distance + 1
+    insertable = [char in alphabet for char in target]
+    # row i: edits from source[:i] to target[:j], only within the band |i - j| <= max_distance
+    previous = [too_far] * (m + 1)
+    previous[0] = 0
+    for j in range(1, min(m, max_distance) + 1):
+        previous[j] = min(previous[j - 1] + 1, too_far) if insertable[j - 1] else too_far
+    for i in range(1, n + 1):
+        current = [too_far] * (m + 1)
+        if i <= max_distance:
+            current[0] = i
+        char = source[i - 1]
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(m, i + max_distance) + 1):
+            if char == target[j - 1]:
+                best = previous[j - 1]
+            else:
+                best = previous[j - 1] + 1 if insertable[j - 1] else too_far
+            if previous[j] + 1 < best:
+                best = previous[j] + 1
+            if insertable[j - 1] and current[j - 1] + 1 < best:
+                best = current[j - 1] + 1
+            if best > too_far:
+                best = too_far
+            current[j] = best
+            if best < row_min:
+                row_min = best
+        if row_min > max_distance:
+            return False
+        previous = current
+    return previous[m] <= max_distance
+
+
+def write_index(words, path: Path, fingerprint: str, prefix_length: int = PREFIX_LENGTH,
+                max_distance: int = MAX_DISTANCE) -> int:
+    """
+    Writes the deletion index of a vocabulary.
+
+    Args:
+        words: The vocabulary words.
+        path (Path): Path of the index file.
+        fingerprint (str): Fingerprint of the vocabulary file (:func:`vocabulary_fingerprint`).
+        prefix_length (int): Number of characters of each word that are indexed.
+        max_distance (int): Maximum edit distance of the lookups.
+
+    Returns:
+        int: Number of keys in the index.
+    """
+    strings = bytearray()
+    word_entries = []
+    postings = defaultdict(lambda: array("I"))
+    for idx, word in enumerate(sorted(set(words))):
+        data = word.encode("utf-8", "surrogatepass")
+        word_entries.append((len(strings), len(data)))
+        strings.extend(data)
+        for key in deletes(word[:prefix_length], max_distance):
+            postings[key].append(idx)
+
+    key_entries = []
+    all_postings = array("I")
+    for key, ids in postings.items():
+        data = key.encode("utf-8", "surrogatepass")
+        key_entries.append((data, len(strings), len(data), len(all_postings), len(ids)))
+        strings.extend(data)
+        all_postings.extend(ids)
+    del postings
+
+    # load factor at most 0.5
+    nslots = max(8, 2 * len(key_entries))
+    slots = array("I", [EMPTY]) * nslots
+    for idx, (data, *_entry) in enumerate(key_entries):
+        slot = zlib.crc32(data) % nslots
+        while slots[slot] != EMPTY:
+            slot = (slot + 1) % nslots
+        slots[slot] = idx
+
+    header = json.dumps({"format": FORMAT, "vocabulary": fingerprint, "prefix_length": prefix_length,
+                         "max_distance": max_distance, "words": len(word_entries),
+                         "keys": len(key_entries)}).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + _UINT32.size + len(header)) % 4)
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + _UINT32.pack(len(header)) + header)
+        f.write(_COUNTS.pack(nslots, len(key_entries), len(word_entries), len(all_postings)))
+        if sys.byteorder == "big":
+            slots.byteswap()
+            all_postings.byteswap()
+        f.write(slots.tobytes())
+        for _data, *entry in key_entries:
+            f.write(_KEY.pack(*entry))
+        for entry in word_entries:
+            f.write(_WORD.pack(*entry))
+        f.write(all_postings.tobytes())
+        f.write(strings)
+    tmp_path.replace(path)
+    return len(key_entries)
+
+
+class DeletionIndex:
+    """
+    Read-only, memory-mapped deletion index (see the module docstring).
+
+    Args:
+        path (Path): Path of the index file.
+
+    Raises:
+        ValueError: If the file is not a deletion index of the current format.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a deletion index")
+        pos = len(MAGIC)
+        (header_length,) = _UINT32.unpack_from(self._mm, pos)
+        pos += _UINT32.size
+        self.header = json.loads(self._mm[pos:pos + header_length])
+        if self.header.get("format") != FORMAT:
+            self.close()
+            raise ValueError(f"{self.path}: unknown deletion index format {self.header.get('format')}")
+        pos += header_length
+        self.nslots, self.nkeys, self.nwords, self.npostings = _COUNTS.unpack_from(self._mm, pos)
+        self._slots = pos + _COUNTS.size
+        self._keys = self._slots + self.nslots * _UINT32.size
+        self._words = self._keys + self.nkeys * _KEY.size
+        self._postings = self._words + self.nwords * _WORD.size
+        self._strings = self._postings + self.npostings * _UINT32.size
+        self.prefix_length = self.header["prefix_length"]
+        self.max_distance = self.header["max_distance"]
+
+    def __len__(self) -> int:
+        return self.nwords
+
+    def _word_ids(self, key: str) -> array:
+        data = key.encode("utf-8", "surrogatepass")
+        mm = self._mm
+        slot = zlib.crc32(data) % self.nslots
+        while True:
+            (idx,) = _UINT32.unpack_from(mm, self._slots + slot * _UINT32.size)
+            if idx == EMPTY:
+                return array("I")
+            offset, length, first, count = _KEY.unpack_from(mm, self._keys + idx * _KEY.size)
+            start = self._strings + offset
+            if length == len(data) and mm[start:start + length] == data:
+                start = self._postings + first * _UINT32.size
+                ids = array("I", mm[start:start + count * _UINT32.size])
+                if sys.byteorder == "big":
+                    ids.byteswap()
+                return ids
+            slot = (slot + 1) % self.nslots
+
+    def _word(self, idx: int) -> str:
+        offset, length = _WORD.unpack_from(self._mm, self._words + idx * _WORD.size)
+        start = self._strings + offset
+        return self._mm[start:start + length].decode("utf-8", "surrogatepass")
+
+    def lookup(self, word: str, alphabet, max_distance: int = MAX_DISTANCE) -> set[str]:
+        """
+        Vocabulary words within ``max_distance`` edits of a word (see :func:`within_distance`).
+
+        Args:
+            word (str): The word (e.g. the OOV).
+            alphabet: Set of the characters that can be inserted or substituted.
+            max_distance (int): Maximum number of edits, at most the distance of the index.
+
+        Returns:
+            set[str]: The vocabulary words.
+        """
+        if max_distance > self.max_distance:
+            raise ValueError(f"{self.path} was built for distances up to {self.max_distance}")
+        ids = set()
+        for key in deletes(word[:self.prefix_length], max_distance):
+            ids.update(self._word_ids(key))
+        found = set()
+        for idx in ids:
+            cand = self._word(idx)
+            if within_distance(word, cand, alphabet, max_distance):
+                found.add(cand)
+        return found
+
+    def close(self):
+        """Unmaps the file."""
+        self._mm.close()
+
+
+def load_index(path: Path, vocabulary_path: Path) -> DeletionIndex | None:
+    """
+    Opens the deletion index at ``path`` if it exists and was built from the vocabulary
+    file at ``vocabulary_path``.
+
+    Args:
+        path (Path): Path of the index file.
+        vocabulary_path (Path): Path of the pickled vocabulary used by the normalizer.
+
+    Returns:
+        DeletionIndex | None: The index, or None (candidates are then generated with
+        :meth:`editor.EdManager.edits1`).
+    """
+    if path is None or not Path(path).exists():
+        return None
+    try:
+        index = DeletionIndex(path)
+    except (OSError, ValueError) as e:
+        index_logger.warning("Deletion index not used: %s", e)
+        return None
+    try:
+        fingerprint = vocabulary_fingerprint(vocabulary_path)
+    except OSError as e:
+        index_logger.warning("Deletion index not used: %s", e)
+        index.close()
+        return None
+    if index.header.get("vocabulary") != fingerprint:
+        index_logger.warning("Deletion index not used: %s was built from another vocabulary, "
+                             "run scripts/build_deletion_index.py again", path)
+        index.close()
+        return None
+    index_logger.info("Loaded deletion index %s (%d words, %d keys)", path, len(index), index.nkeys)
+    return index
@@ -1,3 +1,4 @@
+from array import array
 from collections import OrderedDict
 import logging
 import re
@@ -14,9 +15,12 @@ class EdManager:
        the term and the candidate. Requires info about correction weights (arg cws)
        and an IV dictionary (ivdico)"""
 
-    def __init__(self, editcosts, ivdico):
+    def __init__(self, editcosts, ivdico, deletion_index=None):
         self.editcosts = editcosts
+        self.cost_table = EdCostTable(editcosts)
         self.ivdico = ivdico
+        # deletion_index.DeletionIndex of ivdico, to find the distance 2 candidates without edits1
+        self.deletion_index = deletion_index
 
     alphabet = None
     accents_dico = {"a": "á", "e": "é", "i": "í", "n": "ñ", "o": "ó", "u": "ú"}
@@ -27,6 +31,9 @@ class EdManager:
         #alphabet_all.extend([a.decode("utf-8") for a in alphabet[1]]) # py2
         alphabet_all.extend(alphabet[1])
         self.alphabet = alphabet_all
+        self.alphabet_set = frozenset(alphabet_all)
+        # with lowercase characters only, the insertions and replacements of edits1 are not uppercase
+        self.lowercase_alphabet = all(c.islower() for c in alphabet_all)
 
     def accent_check(self, cand_form, oov_form):
         # This seems to be for comío (OOV) to comido
@@ -117,6 +124,30 @@ class EdManager:
         return edits1
 
     def generate_levdist_candidates(self, word):
+        """Generate candidates at Lev distance 2 and return only those in known-words
+           dictionary. Same candidates as generate_levdist_candidates_norvig, looked up
+           in the deletion index when there is one."""
+        if self.deletion_index is None or not self.lowercase_alphabet:
+            return self.generate_levdist_candidates_norvig(word)
+        # same lowercasing as edits1
+        if len(word) > 3 and word.isupper():
+            word = word.lower()
+        cands = self.deletion_index.lookup(word, self.alphabet_set)
+        # edits1 also lowercases the distance 1 edits that are uppercase: deleting the only
+        # lowercase character of the word (e.g. ABCdE => ABCE => abce)
+        if not word.islower():
+            for i in range(len(word)):
+                e1 = word[:i] + word[i + 1:]
+                if len(e1) > 3 and e1.isupper():
+                    e1 = e1.lower()
+                    known1 = self.deletion_index.lookup(e1, self.alphabet_set, max_distance=1)
+                    # e1 itself is only an edit of e1 when one of its characters is replaced by itself
+                    if not any(c in self.alphabet_set for c in e1):
+                        known1.discard(e1)
+                    cands |= known1
+        return cands
+
+    def generate_levdist_candidates_norvig(self, word):
         """Generate candidates at Lev distance 2 based on distance 1 edits,
            and return only those in known-words dictionary. Based on Norvig."""
         known2 = set([e2 for e1 in self.edits1(word) for e2 in self.edits1(e1)
@@ -171,9 +202,75 @@ class EdManager:
                 # TODO: make positive if work with positive values 
         return 0 - d[lenstr1 - 1, lenstr2 - 1]
 
+    def levdist_batch(self, cands, oov):
+        """Weighted Lev distance between each candidate in <cands> and <oov>, same
+           values as levdist(cand, oov). Costs are read from the dense cost table, the
+           costs of a candidate character against the oov characters are computed once
+           for the batch, and the rows of the distance matrix are reused."""
+        table = self.cost_table
+        zero = table.code("zero")
+        oov_codes = [table.code(c) for c in oov]
+        # find_cost("zero", oov char)
+        ins_costs = [table.cost(zero, oc) for oc in oov_codes]
+        first_row = list(range(len(oov) + 1))
+        # cand char => (find_cost(char, "zero"), [find_cost(char, oov char) for each oov char])
+        char_costs = {}
+        prev = first_row[:]
+        cur = first_row[:]
+        dists = []
+        for cand in cands:
+            prev[:] = first_row
+            for i, a in enumerate(cand):
+                costs = char_costs.get(a)
+                if costs is None:
+                    ac = table.code(a)
+                    costs = char_costs[a] = (table.cost(ac, zero),
+                                             [0 if a == b else table.cost(ac, bc) for b, bc in zip(oov, oov_codes)])
+                del_cost, sub_costs = costs
+                left = cur[0] = i + 1
+                for j, ins_cost in enumerate(ins_costs):
+                    left = min(prev[j + 1] + del_cost, left + ins_cost, prev[j] + sub_costs[j])
+                    cur[j + 1] = left
+                prev, cur = cur, prev
+            dists.append(0 - prev[-1])
+        return dists
+
     def set_ivdico(self, ivdico):
         """# TODO: Not coherent cos using ivdico for initiation"""
         self.ivdico = ivdico
+        # the index was built from the previous dictionary
+        self.deletion_index = None
+
+
+class EdCostTable:
+    """Cost-matrix hash (EdScoreMatrix.create_matrix_hash) compiled into a dense array.
+       Characters are given codes (their lowercase form in the hash), and cost(a, b) is
+       find_cost for the characters with codes a and b (when they differ): costs missing
+       from the hash and characters not in the hash cost 1"""
+
+    def __init__(self, editcosts):
+        names = sorted(set(editcosts).union(*[set(costs) for costs in editcosts.values()]))
+        self.codes = {name: code for code, name in enumerate(names)}
+        # code of the characters not in the hash
+        self.unknown = len(names)
+        self.size = len(names) + 1
+        self.costs = array("d", [1.0]) * (self.size * self.size)
+        for a, costs in editcosts.items():
+            for b, cost in costs.items():
+                self.costs[self.codes[a] * self.size + self.codes[b]] = 0 - cost
+        # character => code, lowercased as in find_cost
+        self._char_codes = {}
+
+    def code(self, char):
+        """Code of a character (or of "zero", the empty character)"""
+        code = self._char_codes.get(char)
+        if code is None:
+            code = self._char_codes[char] = self.codes.get(char.lower(), self.unknown)
+        return code
+
+    def cost(self, a, b):
+        """Cost of changing the character with code <b> (oov) into <a> (candidate)"""
+        return self.costs[a * self.size + b]
 
 
 class EdScoreMatrix:
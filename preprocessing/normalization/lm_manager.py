@@ -1,9 +1,9 @@
 """To work with n-gram language models"""
 
-import kenlm
 import logging
 
 from normalization import normconfig as nc
+from timing import count
 klm_logger = logging.getLogger("main.klm")
 
 
@@ -12,6 +12,7 @@ class KenLMManager:
         """Initialize KenLMManager with the path to the binary language model."""
         self.bin_path = bin_path
         print("Loading KenLM model from:", bin_path)
+        import kenlm
         self.model = kenlm.LanguageModel(str(self.bin_path))
         self.fragment_mode = fragment_mode
         
@@ -33,9 +34,28 @@ class KenLMManager:
 
     def find_logprob_in_context(self, tok, context):
         """KenLM logprob with Python API"""
+        count("lm_queries")
         fragment_to_score = context[0] + [tok] + context[1]
         scoring_args = {"bos": False, "eos": False} if self.fragment_mode else {}
         return self.model.score(" ".join(fragment_to_score), **scoring_args)  # No BOS/EOS for context scoring
 
 
-    
\ No newline at end of file
+    
+
+
+class StandInLMManager(KenLMManager):
+    """
+    Lightweight stand-in for :class:`KenLMManager`, for load tests where the KenLM model
+    (or the ``kenlm`` package) is unavailable: no model is loaded, and a fragment is
+    scored by its length only (shorter is better), deterministically.
+    """
+
+    def __init__(self, fragment_mode=True):
+        self.bin_path = None
+        self.model = None
+        self.fragment_mode = fragment_mode
+
+    def find_logprob_in_context(self, tok, context):
+        """Stand-in score: minus the number of characters of the fragment."""
+        count("lm_queries")
+        return -float(len(" ".join(context[0] + [tok] + context[1])))
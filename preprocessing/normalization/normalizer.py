@@ -5,9 +5,11 @@ import pickle
 import re
 import types
 
+from normalization import deletion_index
 from normalization import editor
 from normalization import normconfig as nc
 from normalization import normo as nmo
+from timing import stage
 
 norm_logger = logging.getLogger("main.normalizer")
 
@@ -23,10 +25,15 @@ class Normalizer:
         self.lang = lang
         assert self.lang in nc.LANGUAGES, f"Language {self.lang} is not supported. Supported languages: {nc.LANGUAGES}"
         self.IVDICO = norm_config.IVDICO if self.lang == "gl" else norm_config.IVDICO_ES
-        self.vocab = self._load_vocab()
+        self.DELETION_INDEX = norm_config.DELETION_INDEX if self.lang == "gl" else norm_config.DELETION_INDEX_ES
+        with stage("vocab_load"):
+            self.vocab = self._load_vocab()
         from normalization import edcosts as edit_costs
         self.edit_costs = edit_costs_o or edit_costs
-        self.edimgr = self._load_editor()
+        with stage("edit_costs_load"):
+            self.edimgr = self._load_editor()
+        with stage("deletion_index_load"):
+            self.edimgr.deletion_index = deletion_index.load_index(self.DELETION_INDEX, self.IVDICO)
 
     def _load_vocab(self):
         """Load the vocabulary (in-vocabulary words) from the configured file."""
@@ -58,9 +65,9 @@ class Normalizer:
 
         cands_and_scores = set()
         # Generate candidates using the editor
-        lev_cands_str = self.edimgr.generate_levdist_candidates(oov)
-        for lc in lev_cands_str:
-            lev_cand = nmo.Candidate(lc, cand_type=nmo.CandType.LEV, levdist=self.edimgr.levdist(lc, oov))
+        lev_cands_str = list(self.edimgr.generate_levdist_candidates(oov))
+        for lc, levdist in zip(lev_cands_str, self.edimgr.levdist_batch(lev_cands_str, oov)):
+            lev_cand = nmo.Candidate(lc, cand_type=nmo.CandType.LEV, levdist=levdist)
             cands_and_scores.add(lev_cand)
         reg_cands_str = self.edimgr.generate_regex_candidates(oov)
         # this returns dict with cands and "regex score", under a key "cands"
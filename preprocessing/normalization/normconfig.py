@@ -8,6 +8,9 @@ config_dir = Path(__file__).parent
 #IVDICO = (config_dir.parent / "data" / "apertium-glg-expanded-uniq.txt.pkl").resolve()
 IVDICO = (config_dir.parent / "data" / "new_vocab_less_clitics.pkl").resolve()
 IVDICO_ES = (config_dir.parent / "data" / "aspell-es-expanded.txt.pkl").resolve()
+# deletion indexes of the vocabularies (built with scripts/build_deletion_index.py)
+DELETION_INDEX = IVDICO.with_suffix(".deletes.bin")
+DELETION_INDEX_ES = IVDICO_ES.with_suffix(".deletes.bin")
 #LMPATH= config_dir.parent.parent.parent / "nlm/nos-127.klm.bin"
 LMPATH= (config_dir.parent / "data" / "nos-127.klm.bin").resolve()
 LANGUAGES = ("gl", "es")
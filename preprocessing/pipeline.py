@@ -0,0 +1,453 @@
+"""
+Preprocessing pipeline for running text: orthographic preprocessing, normalization
+of out-of-vocabulary tokens, syllabification and destressing.
+
+The heavy resources (vocabulary for the normalizer, KenLM model) are held by
+:class:`PreprocessingPipeline`, so that a long-running process (e.g. a Django worker)
+loads them once and reuses them for every text, instead of paying for them on each
+call to :mod:`g2s_client_running_text`.
+"""
+
+from collections import OrderedDict
+import copy
+import io
+import logging
+import re
+import threading
+import time
+
+import config as cf
+from data import stress_info as sti
+import grapheme2syllable as g2s
+import lexicon
+from normalization import lm_manager as lmg
+from normalization import normalizer
+from normalization import normconfig as ncf
+
+import rewrite
+from timing import count, stage
+import utils as ut
+
+PUNCT_TO_REMOVE = ".,;?!¿¡:«»()”“„"
+PUNCT_TO_SPACE = "—"
+PUNCT_RE = re.compile(f"([{PUNCT_TO_REMOVE}]+)", re.UNICODE)
+PUNCT_TO_SPACE_RE = re.compile(f"([{PUNCT_TO_SPACE}]+)", re.UNICODE)
+
+logger = logging.getLogger("main.pipeline")
+
+
+def preprocess_orthography(txt: str) -> str:
+    """
+    Preprocess the input text to modernize some sequences without altering metrically relevant content.
+
+    Args:
+        txt (str): The input text to preprocess.
+
+    Returns:
+        str: The preprocessed text.
+    """
+    pat2rep = rewrite.rule_files.get(cf.text_level_replacements, ut.load_text_replacements, cf)
+    return rewrite.compile_rules(pat2rep.items()).apply(txt)
+
+
+def postprocess_syllable_str(syllable_str: str) -> str:
+    """
+    Postprocess the syllable sequence (as a string), according to the rules in
+    :obj:`cf.syllable_replacements`.
+
+    Args:
+        syllable_str (str): The input syllable string.
+
+    Returns:
+        str: The post-processed syllable string.
+    """
+    # Remove unwanted characters and format the syllable string
+    pat2rep = rewrite.rule_files.get(cf.syllable_replacements, ut.load_syllable_replacements, cf)
+    for pat, (rep, postpro_info) in pat2rep.items():
+        # only apply postprocessing instructions if the pattern matches
+        # (otherwise the replacement does not change the string either)
+        if pat.search(syllable_str):
+            if postpro_info == "unstressed":
+                syllable_str = syllable_str.lower()
+            # apply the replacement (it's case insensitive so lowercasing above
+            # does not affect the replacement)
+            syllable_str = pat.sub(rep, syllable_str)
+
+    return syllable_str
+
+
+class SyllabificationMemo:
+    """
+    Bounded memo of finished syllabifications (:func:`syllabify_word`) in the current
+    process, keyed by (word, diacritic, spanishfy); the least recently used words are
+    dropped beyond `maxsize`. Texts and corpora repeat the same function words and
+    rhyme words, so most tokens are found here.
+
+    The memo is emptied when the syllable replacements (:obj:`cf.syllable_replacements`)
+    are reloaded, since they change the postprocessed syllabifications.
+
+    Args:
+        maxsize (int): Maximum number of words kept.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.rules = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, rules) -> tuple | None:
+        """The syllabification stored for `key` with the syllable replacements `rules`, or None."""
+        with self._lock:
+            if rules is not self.rules:
+                self._data.clear()
+                self.rules = rules
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, rules, value: tuple):
+        """Stores the syllabification of `key`, made with the syllable replacements `rules`."""
+        with self._lock:
+            if rules is not self.rules:
+                return
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Empties the memo and resets the statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Hits, misses, hit rate and size of the memo."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "size": len(self._data), "maxsize": self.maxsize}
+
+
+syllabification_memo = SyllabificationMemo(cf.syllabification_memo_size)
+
+
+_lexicon = None
+_lexicon_loaded = False
+_lexicon_lock = threading.Lock()
+
+
+def syllabification_lexicon() -> lexicon.SyllabificationLexicon | None:
+    """
+    The precomputed syllabification lexicon (:obj:`cf.syllabification_lexicon`),
+    mapped at first use; None if there is none for the current syllabification code.
+    """
+    global _lexicon, _lexicon_loaded
+    if not _lexicon_loaded:
+        with _lexicon_lock:
+            if not _lexicon_loaded:
+                _lexicon = lexicon.load_lexicon(cf.syllabification_lexicon)
+                _lexicon_loaded = True
+    return _lexicon
+
+
+def syllabify_word(word: str, diacritic: str = "´", spanishfy: bool = False) -> tuple[str, str, str, int]:
+    """
+    Syllabification of a word with :func:`g2s.syllabify_full`, postprocessed with
+    :func:`postprocess_syllable_str`, from :obj:`syllabification_memo` if the word
+    was already syllabified. Hits and misses are counted (`syllabify_hits`,
+    `syllabify_misses`) in the active timer. Before syllabifying a word, it is looked
+    up in the precomputed lexicon (:func:`syllabification_lexicon`, `lexicon_hits`).
+
+    Args:
+        word (str): The word to syllabify.
+        diacritic (str): The stress diacritic, see :func:`g2s.syllabify_full`.
+        spanishfy (bool): Whether to apply Spanish orthographic stress rules.
+
+    Returns:
+        tuple: The syllabified word with the stressed syllable in uppercase, with the
+        stressed syllable preceded by the diacritic, without indication of stress,
+        and the stressed syllable position.
+    """
+    key = (word, diacritic, spanishfy)
+    rules = rewrite.rule_files.get(cf.syllable_replacements, ut.load_syllable_replacements, cf)
+    syllables = syllabification_memo.get(key, rules)
+    if syllables is not None:
+        count("syllabify_hits")
+        return syllables
+    count("syllabify_misses")
+    lex = syllabification_lexicon()
+    syllables = lex.get(word, spanishfy) if lex is not None and diacritic == lex.diacritic else None
+    if syllables is None:
+        syllables = g2s.syllabify_full(word, diacritic=diacritic, spanishfy=spanishfy)
+    else:
+        count("lexicon_hits")
+    # several representations of the syllabified word are stored,
+    # along with the stressed syllable position
+    syllables = (postprocess_syllable_str(syllables[0]),  # stressed syllable in uppercase
+                 postprocess_syllable_str(syllables[1]),  # stressed syllable preceded by a diacritic
+                 postprocess_syllable_str(syllables[2]),  # no extra indication of stress
+                 syllables[-1])  # stressed syllable position
+    syllabification_memo.put(key, rules, syllables)
+    return syllables
+
+
+def apply_syllabification(line_list: list[str], nglm: lmg.KenLMManager, nmlzr: normalizer.Normalizer = None,
+                          preprocess: bool = False, spanishfy: bool = False,
+                          nmlzr_es: normalizer.Normalizer = None) -> tuple[list[tuple], list[str]]:
+    """
+    Apply :func:`g2s.syllabify_full` to a list of lines, syllabifying each word in the lines.
+
+    Args:
+        line_list (list[str]): A list of lines to syllabify.
+        nglm (lmg.KenLMManager): n-gram language model to score apostrophe edits,
+            diacritic stress and normalization candidates.
+        nmlzr (normalizer.Normalizer, optional): Normalizer for out-of-vocabulary tokens.
+            Normalization is skipped if None.
+        preprocess (bool): Whether to apply :func:`preprocess_orthography` to each line.
+        spanishfy (bool): Whether to apply Spanish orthographic stress rules in syllabification.
+        nmlzr_es (normalizer.Normalizer, optional): Spanish normalizer, to accept
+            castellanismos (check currently disabled).
+
+    Returns:
+        tuple: A tuple containing two lists:
+            - A list of tuples, containing syllabified words with stress marks, without,
+              and the stressed syllable position.
+            - A list of strings with the syllabified words without stress marks.
+    """
+    # load data for preprocessing (word or regex lists)
+    logger.info("  - Start preprocessing: %s", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
+    hyphens_to_keep = ut.load_words_with_hyphen_to_keep(cf)  # unused so far
+    out_lines = []  # syllabification after orthographic preprocessing
+    out_lines_running_text = []  # orthographic preprocessing
+    for line in line_list:
+        text = line.strip()
+        # replacements that may affect a sequence of words
+        with stage("orthography"):
+            text = re.sub(PUNCT_TO_SPACE_RE, " ", text)
+            if preprocess:
+                text = preprocess_orthography(text)
+                text = re.sub(PUNCT_RE, r" \1 ", text)
+        words = [tok for tok in re.split(r"\s+", text) if tok.strip() != ""]
+        out_line = []
+        out_line_running_text = []
+
+        # handle apostrophes
+        updated_words = []
+
+        for widx, word in enumerate(words):
+            has_apos = re.search(r"(\w+)['‘’](\w*)", word)
+            if not has_apos:
+                updated_words.append(word)
+                continue
+
+            word_orig = word
+            base = has_apos.group(1)
+            suffix = has_apos.group(2)
+
+            split_parts = [base]
+            if suffix:
+                # for apostrophes, we only edit by adding a, e, o
+                split_parts.append(suffix.strip())
+
+            # Generate vowel edits for base
+            edits_noapos = [base + v for v in ['a', 'e', 'o']]
+            ed_scos = []
+
+            # Prepare a simulated token list for context computation
+            simulated_toklist = updated_words + [base] + words[widx + 1:]
+            simulated_idx = len(updated_words)  # index where base would be inserted
+            with stage("kenlm"):
+                wlc, wrc = nglm.find_context_for_token(base, simulated_idx, simulated_toklist)
+
+                for ed in edits_noapos:
+                    ed_sco = nglm.find_logprob_in_context(ed, (wlc, wrc))
+                    ed_scos.append((ed, ed_sco))
+
+            best_ed_cand = sorted(ed_scos, key=lambda x: -x[1])
+
+            if not best_ed_cand:
+                updated_words.append(word_orig)
+            else:
+                new_word = best_ed_cand[0][0]
+                updated_words.append(new_word)
+                if len(split_parts) > 1:
+                    updated_words.extend(split_parts[1:])
+
+                logger.debug(
+                    f"Replace Apostrophe: [{word_orig}] to [{new_word}]+[{split_parts[1:] if len(split_parts) > 1 else ''}] context [{' '.join(updated_words)}]")
+
+        # handle other normalization cases than apostrophes
+        for widx, word in enumerate(updated_words):
+            if re.search(PUNCT_RE, word):
+                out_line.append((word, word, word, -1))  # no syllabification
+                out_line_running_text.append(re.sub(PUNCT_TO_SPACE_RE, " ", word).replace("-", ""))
+                continue
+            # remove punctuation (but hypen) from words
+            word = re.sub(PUNCT_TO_SPACE_RE, " ", word)
+            word = word.replace("-", "")
+            if word.strip() == "":
+                continue
+            # check if needs diacritic stress
+            #   if in list, line with unaccented and accented variants are scored
+            #   with n-gram lm and the best is chosen
+            if word in sti.diacritic_stress:
+                updated_words = words[0:widx] + [word] + words[widx + 1:]
+                with stage("kenlm"):
+                    wlc, wrc = nglm.find_context_for_token(word, widx, updated_words)
+                    sco_unstressed = nglm.find_logprob_in_context(word, (wlc, wrc))
+                    sco_stressed = nglm.find_logprob_in_context(sti.diacritic_stress[word], (wlc, wrc))
+                if sco_stressed > sco_unstressed:
+                    word_orig = word
+                    word = sti.diacritic_stress[word]
+                    logger.debug(
+                        f"LM Dia Stress: [{word_orig}] to [{sti.diacritic_stress[word_orig]}] context [{' '.join(updated_words)}]")
+            # do token normalization before syllabification
+            if nmlzr is not None and word not in nmlzr.vocab:
+                # version of word with initial caps may be in vocabulary, neutralize
+                if word.lower() not in nmlzr.vocab:
+                    # test if exact match in Spanish (castellanismo)
+                    if False and (word in nmlzr_es.vocab or word.lower() in nmlzr_es.vocab):
+                        logger.debug(f"Accept castellanismo [{word}]")
+                    else:
+                        with stage("candidates"):
+                            wcands = nmlzr.collect_candidates(word)
+                        # ranking scores candidates in context with the KenLM model
+                        with stage("ranking"):
+                            best_cand = nmlzr.rank_candidates(word, updated_words, widx, wcands, nglm)
+                        count("oov_tokens")
+                        if best_cand is not None:
+                            logger.debug(f"LM Ed Norm: [{word}] to [{best_cand.form}]")
+                            count("oov_normalized")
+                        else:
+                            logger.debug(f"No Norm: [{word}]")
+                        word = best_cand.form if best_cand is not None else word
+                        # respect case in orig text, using a case mask
+                        case_mask_norm = nmlzr.create_case_mask(word)
+                        word_cased = "".join([cha.upper() if cm == 1 else cha for (cha, cm) in zip(list(word), case_mask_norm)])
+                        word = word_cased
+            words_before_pos = copy.deepcopy(updated_words)
+
+            # sylllabification only after preprocessing each line as above
+            with stage("syllabify"):
+                syllables = syllabify_word(re.sub(PUNCT_TO_SPACE_RE, " ", word), spanishfy=spanishfy)
+            out_line.append(syllables)
+            out_line_running_text.append(syllables[2].replace("-", ""))
+        if len(out_line) > 0:
+            out_lines.append(out_line)
+        if len(out_line_running_text) > 0:
+            out_lines_running_text.append(out_line_running_text)
+    return out_lines, out_lines_running_text
+
+
+def destress_lines(out_lines: list[list[tuple]], out_lines_running_text: list[list[str]],
+                   destress_function=ut.destress_word_simple) -> tuple[list[list[tuple]], list[list[str]]]:
+    """
+    Remove stress marks from lexically unstressed words (those in :obj:`sti.atonas_gl`),
+    both in the syllabified output and in the running text output of :func:`apply_syllabification`.
+
+    Args:
+        out_lines (list): Syllabified lines, as returned by :func:`apply_syllabification`.
+        out_lines_running_text (list): Running text lines, as returned by :func:`apply_syllabification`.
+        destress_function (callable): Function removing the stress mark from a word.
+
+    Returns:
+        tuple: Destressed copies of the syllabified lines and of the running text lines.
+    """
+    # destress in running text
+    out_lines_running_text_destressed = copy.deepcopy(out_lines_running_text)
+    for lidx, olrt in enumerate(out_lines_running_text):
+        for widx, syll_info in enumerate(olrt):
+            if syll_info.lower() in sti.atonas_gl:
+                # if the word is unstressed, remove the stress mark
+                out_lines_running_text_destressed[lidx][widx] = destress_function(syll_info.replace("´", ""))
+    # destress in syllabified output
+    # create a mutable copy of the syllabified output
+    out_lines_destressed = []
+    for ol in out_lines:
+        out_lines_destressed.append(list(ol))
+    for slidx, ol in enumerate(out_lines):
+        for swidx, syll_info in enumerate(ol):
+            if syll_info[2].lower().replace("-", "") in sti.atonas_gl:
+                case_mask = [1 if char.isupper() else 0 for char in syll_info[2]]
+                # if the word is unstressed, remove the stress mark
+                out_lines_destressed[slidx][swidx] = (destress_function(syll_info[0], case_mask),
+                                                      destress_function(syll_info[1], case_mask),
+                                                      destress_function(syll_info[2], case_mask),
+                                                      syll_info[3])
+    return out_lines_destressed, out_lines_running_text_destressed
+
+
+def text_lines(text: str) -> list[str]:
+    """
+    Split a text into lines as when reading it from a file (universal newlines: ``\n``,
+    ``\r`` and ``\r\n``), like :func:`gumper_client_web.scan_results` does with the
+    original text, so that both give the same lines. ``str.splitlines`` also splits on
+    other characters (e.g. ``\x0c``, ``\x85``, U+2028).
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[str]: The lines, with their line break.
+    """
+    return io.StringIO(text, newline=None).readlines()
+
+
+class PreprocessingPipeline:
+    """
+    Reusable preprocessing pipeline. The normalizer and the language model are
+    loaded when the pipeline is created, and reused for every text processed.
+
+    The options correspond to the flags of :mod:`g2s_client_running_text`
+    (``-p``, ``-d``, ``-n``, ``-s``); the defaults are those used by the web app.
+
+    Model loading and the stages of :meth:`process` are timed with :mod:`timing`
+    when a timer is active; OOV tokens (``oov_tokens``, ``oov_normalized``) and
+    KenLM queries (``lm_queries``) are counted in the same timer.
+    """
+
+    def __init__(self, preprocess: bool = True, destress: bool = True, normalize: bool = True,
+                 spanishfy: bool = True, nmlzr: normalizer.Normalizer = None,
+                 nglm: lmg.KenLMManager = None):
+        self.preprocess = preprocess
+        self.destress = destress
+        self.normalize = normalize
+        self.spanishfy = spanishfy
+        if normalize and nmlzr is None:
+            # stages vocab_load and edit_costs_load
+            nmlzr = normalizer.Normalizer(ncf)
+        self.nmlzr = nmlzr if normalize else None
+        if nglm is None:
+            with stage("lm_load"):
+                nglm = lmg.KenLMManager()
+        self.nglm = nglm
+
+    def syllabify(self, line_list: list[str]) -> tuple[list[tuple], list[str]]:
+        """Run :func:`apply_syllabification` on a list of lines with the pipeline's options and models."""
+        return apply_syllabification(line_list, self.nglm, nmlzr=self.nmlzr,
+                                     preprocess=self.preprocess, spanishfy=self.spanishfy)
+
+    def process(self, text: str) -> list[str]:
+        """
+        Preprocess a text and return its lines as running text (what the CLI client
+        writes to its ``*_pp_out*`` output files), one string per non-empty line.
+
+        Args:
+            text (str): The text to preprocess.
+
+        Returns:
+            list[str]: The preprocessed (normalized, destressed if set) lines.
+        """
+        out_lines, out_lines_running_text = self.syllabify(text_lines(text))
+        if self.destress:
+            with stage("destress"):
+                _, out_lines_running_text = destress_lines(out_lines, out_lines_running_text)
+        return [ut.detokenize(line) for line in out_lines_running_text]
@@ -0,0 +1,412 @@
+"""
+Compiled rewrite rules: an ordered list of regex replacements applied in as few passes
+over the text as possible, with the same result as applying each rule in turn with
+``re.sub``.
+
+Consecutive rules are compiled into passes of two kinds:
+
+* translation passes: runs of rules that replace one literal character by a literal
+  string are merged into a single ``str.translate`` call, as long as no replacement
+  of the run contains a character replaced later in the run (the only case where
+  applying them one by one would differ).
+* regex passes: runs of rules that need the same characters to match (e.g. an
+  apostrophe, found by parsing the patterns) are skipped unless one of these
+  characters is in the text, then a combined alternation of their patterns is
+  searched once and the rules are applied in order only if it matches. When no rule
+  of a run matches the text, applying them in turn leaves it unchanged, so the rule
+  order semantics are kept.
+
+Rule files are loaded through :obj:`rule_files` (a :class:`RuleRegistry`), which keeps
+what was loaded and reloads a file only when its modification time or size changes, so
+that rules can be edited on a running server.
+
+Usage::
+
+    pat2rep = rule_files.get(cf.text_level_replacements, ut.load_text_replacements, cf)
+    txt = compile_rules(pat2rep.items()).apply(txt)
+"""
+
+from functools import lru_cache
+import logging
+import os
+import re
+import threading
+import time
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+rewrite_logger = logging.getLogger("main.rewrite")
+
+# Repetitions (POSSESSIVE_REPEAT since Python 3.11)
+_REPEATS = tuple(getattr(sre_constants, name) for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                 if hasattr(sre_constants, name))
+# Flags that can be given to a scoped group (?flags:...) of the combined alternation
+_SCOPED_FLAGS = {re.I: "i", re.M: "m", re.S: "s"}
+# Flags of the patterns that cannot be combined (re.U is the default for str patterns)
+_UNCOMBINABLE_FLAGS = re.A | re.L | re.X | re.DEBUG
+
+
+def _parse(pattern: re.Pattern):
+    """Parse tree of a compiled pattern, or None if it cannot be parsed."""
+    try:
+        return sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+
+
+def _caseless(char: str) -> bool:
+    """Whether a character matches only itself under re.IGNORECASE."""
+    return char.lower() == char.upper() == char
+
+
+def _required_sets(items, ignorecase: bool) -> list:
+    """
+    Sets of characters such that every match of the parsed sequence ``items`` contains
+    at least one character of each set.
+
+    Only mandatory literals and character classes of literals are considered, and
+    under re.IGNORECASE only those with caseless characters.
+    """
+    sets = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            char = chr(av)
+            if not ignorecase or _caseless(char):
+                sets.append({char})
+        elif op is sre_constants.IN:
+            chars = set()
+            for item_op, item_av in av:
+                if item_op is not sre_constants.LITERAL or (ignorecase and not _caseless(chr(item_av))):
+                    break
+                chars.add(chr(item_av))
+            else:
+                if chars:
+                    sets.append(chars)
+        elif op is sre_constants.SUBPATTERN:
+            _group, add_flags, del_flags, sub_items = av
+            sets += _required_sets(sub_items, (ignorecase or bool(add_flags & re.I)) and not del_flags & re.I)
+        elif op in _REPEATS:
+            min_count, _max_count, sub_items = av
+            if min_count >= 1:
+                sets += _required_sets(sub_items, ignorecase)
+    return sets
+
+
+def required_chars(pattern: re.Pattern) -> frozenset | None:
+    """
+    Smallest set of characters such that the text must contain one of them for
+    ``pattern`` to match, or None if no such set is known.
+
+    Args:
+        pattern (re.Pattern): The compiled pattern.
+
+    Returns:
+        frozenset | None: The characters, or None.
+    """
+    parsed = _parse(pattern)
+    if parsed is None:
+        return None
+    sets = _required_sets(parsed, bool(parsed.state.flags & re.I))
+    if not sets:
+        return None
+    return frozenset(min(sets, key=len))
+
+
+def _has_backreference(items) -> bool:
+    """Whether the parsed sequence ``items`` refers to a group of the pattern (numbering would change when combined)."""
+    for op, av in items:
+        if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return True
+        for value in av if isinstance(av, (list, tuple)) else [av]:
+            if isinstance(value, sre_parse.SubPattern) and _has_backreference(value):
+                return True
+            if isinstance(value, (list, tuple)):
+                if any(isinstance(sub, sre_parse.SubPattern) and _has_backreference(sub) for sub in value):
+                    return True
+    return False
+
+
+def literal_char(pattern: re.Pattern) -> str | None:
+    """
+    The character matched by ``pattern`` if it matches exactly one literal character
+    (and nothing else), otherwise None.
+
+    Args:
+        pattern (re.Pattern): The compiled pattern.
+
+    Returns:
+        str | None: The character, or None.
+    """
+    parsed = _parse(pattern)
+    if parsed is None or len(parsed) != 1 or pattern.flags & _UNCOMBINABLE_FLAGS:
+        return None
+    op, av = parsed[0]
+    if op is not sre_constants.LITERAL:
+        return None
+    char = chr(av)
+    if parsed.state.flags & re.I and not _caseless(char):
+        return None
+    return char
+
+
+def combined_pattern(patterns: list) -> re.Pattern | None:
+    """
+    Alternation of ``patterns`` (each with its own flags), which matches a text if and
+    only if one of the patterns matches it; None if the patterns cannot be combined.
+
+    Args:
+        patterns (list): The compiled patterns.
+
+    Returns:
+        re.Pattern | None: The combined pattern, or None.
+    """
+    alternatives = []
+    for pattern in patterns:
+        parsed = _parse(pattern)
+        if (parsed is None or pattern.flags & _UNCOMBINABLE_FLAGS or not isinstance(pattern.pattern, str)
+                or _has_backreference(parsed)):
+            return None
+        flags = "".join(letter for flag, letter in _SCOPED_FLAGS.items() if pattern.flags & flag)
+        alternatives.append(f"(?{flags}:{pattern.pattern})" if flags else f"(?:{pattern.pattern})")
+    try:
+        return re.compile("|".join(alternatives))
+    except re.error:
+        # e.g. the same group name in two patterns, or global inline flags
+        return None
+
+
+class _TranslatePass:
+    """Rules replacing single literal characters, applied with one ``str.translate``."""
+
+    def __init__(self):
+        self.table = {}
+        self.replaced = ""
+
+    def accepts(self, char: str) -> bool:
+        # a character produced by an earlier replacement of the run would be
+        # rewritten again by the rule if applied on its own
+        return char not in self.replaced
+
+    def add(self, char: str, replacement: str):
+        if ord(char) in self.table:
+            # already replaced earlier in the run: the rule has nothing left to match
+            return
+        self.table[ord(char)] = replacement
+        self.replaced += replacement
+
+    def apply(self, text: str) -> str:
+        return text.translate(self.table)
+
+
+class _RegexPass:
+    """Consecutive regex rules needing the same characters, gated by a combined alternation."""
+
+    def __init__(self, required: frozenset | None):
+        self.required = required
+        self.rules = []
+        self.gate = None
+
+    def compile(self):
+        if len(self.rules) > 1:
+            self.gate = combined_pattern([pattern for pattern, _replacement in self.rules])
+
+    def apply(self, text: str) -> str:
+        if self.required is not None and not any(char in text for char in self.required):
+            return text
+        if self.gate is not None and self.gate.search(text) is None:
+            return text
+        for pattern, replacement in self.rules:
+            text = pattern.sub(replacement, text)
+        return text
+
+
+class RewriteRules:
+    """
+    An ordered set of replacement rules compiled into passes. ``apply`` gives the same
+    result as ``re.sub(pattern, replacement, text)`` for each rule in order.
+
+    Args:
+        rules: The (pattern, replacement) pairs in order, e.g. ``OrderedDict.items()``;
+            patterns are compiled patterns or strings, replacements are strings
+            (with group references) or functions, as for ``re.sub``.
+    """
+
+    def __init__(self, rules):
+        self.rules = [(pattern if isinstance(pattern, re.Pattern) else re.compile(pattern), replacement)
+                      for pattern, replacement in rules]
+        self.passes = []
+        for pattern, replacement in self.rules:
+            char = literal_char(pattern) if isinstance(replacement, str) and "\\" not in replacement else None
+            last = self.passes[-1] if self.passes else None
+            if char is not None:
+                if not isinstance(last, _TranslatePass) or not last.accepts(char):
+                    last = _TranslatePass()
+                    self.passes.append(last)
+                last.add(char, replacement)
+                continue
+            required = required_chars(pattern)
+            if not isinstance(last, _RegexPass) or last.required != required:
+                last = _RegexPass(required)
+                self.passes.append(last)
+            last.rules.append((pattern, replacement))
+        for rewrite_pass in self.passes:
+            if isinstance(rewrite_pass, _RegexPass):
+                rewrite_pass.compile()
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def apply(self, text: str) -> str:
+        """
+        Applies the rules to a text.
+
+        Args:
+            text (str): The input text.
+
+        Returns:
+            str: The rewritten text.
+        """
+        for rewrite_pass in self.passes:
+            text = rewrite_pass.apply(text)
+        return text
+
+    __call__ = apply
+
+
+@lru_cache(maxsize=32)
+def _compile_rules(rules: tuple) -> RewriteRules:
+    return RewriteRules(rules)
+
+
+def compile_rules(rules) -> RewriteRules:
+    """
+    Compiled rule set of ``rules``, shared between calls with equal rules (compiled
+    patterns are equal when they have the same pattern and flags).
+
+    Args:
+        rules: The (pattern, replacement) pairs in order.
+
+    Returns:
+        RewriteRules: The compiled rule set.
+    """
+    return _compile_rules(tuple(rules))
+
+
+class RuleRegistry:
+    """
+    Rule files loaded once, and loaded again when they change (modification time or
+    size), at most every ``check_interval`` seconds.
+
+    If a changed file cannot be loaded (e.g. it is being written), or is briefly missing
+    (e.g. replaced by a deployment), the rules loaded before are kept and the file is
+    checked again later.
+
+    Args:
+        check_interval (float, optional): Minimum time between two checks of a file, in seconds.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        # (path, load function, arguments) -> [file stamp, loaded value, time of the last check]
+        self._entries = {}
+        # path -> (file stamp, time of the last check)
+        self._stamps = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, load, *args):
+        """
+        The value of ``load(*args)`` for the rule file at ``path``, loaded again if the
+        file changed since it was loaded.
+
+        Args:
+            path: Path of the rule file read by ``load``.
+            load: The function loading the file (e.g. :func:`utils.load_text_replacements`).
+            *args: The arguments of ``load``.
+
+        Returns:
+            The value returned by ``load``.
+        """
+        key = (os.fspath(path), load, args)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.check_interval:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            try:
+                stamp = self.stamp(key[0])
+                if entry is not None and entry[0] == stamp:
+                    entry[2] = now
+                    return entry[1]
+                value = load(*args)
+            except Exception:
+                if entry is None:
+                    raise
+                rewrite_logger.exception("Could not reload %s, keeping the rules loaded before", key[0])
+                entry[2] = now
+                return entry[1]
+            if entry is not None:
+                rewrite_logger.info("Reloaded %s", key[0])
+            self._entries[key] = [stamp, value, now]
+            return value
+
+    def stamp(self, path) -> tuple[int, int]:
+        """
+        The stamp (modification time, size) of the rule file at ``path``, checked at most
+        every ``check_interval`` seconds. If the file is briefly missing, the stamp of the
+        last check is returned.
+
+        Args:
+            path: Path of the rule file.
+
+        Returns:
+            tuple[int, int]: The modification time in nanoseconds and the size of the file.
+
+        Raises:
+            OSError: If the file was never found.
+        """
+        path = os.fspath(path)
+        now = time.monotonic()
+        checked = self._stamps.get(path)
+        if checked is not None and now - checked[1] < self.check_interval:
+            return checked[0]
+        try:
+            st = os.stat(path)
+        except OSError:
+            if checked is None:
+                raise
+            rewrite_logger.warning("Could not check %s, keeping its last known version", path)
+            stamp = checked[0]
+        else:
+            stamp = st.st_mtime_ns, st.st_size
+        self._stamps[path] = (stamp, now)
+        return stamp
+
+    def clear(self):
+        """Forgets the loaded files."""
+        with self._lock:
+            self._entries.clear()
+            self._stamps.clear()
+
+
+rule_files = RuleRegistry()
+
+
+def apply_sequentially(rules, text: str) -> str:
+    """
+    Reference implementation: each rule applied in turn with ``re.sub``.
+
+    Args:
+        rules: The (pattern, replacement) pairs in order.
+        text (str): The input text.
+
+    Returns:
+        str: The rewritten text.
+    """
+    for pattern, replacement in rules:
+        text = re.sub(pattern, replacement, text)
+    return text
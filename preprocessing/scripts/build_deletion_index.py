@@ -0,0 +1,50 @@
+"""
+Build the deletion index of a normalizer vocabulary (see :mod:`normalization.deletion_index`),
+used to look up the candidates within edit distance 2 of an OOV.
+
+Usage (from the preprocessing directory)::
+
+    python scripts/build_deletion_index.py [vocabulary.pkl] [index file]
+
+By default, the index of the Galician vocabulary (normconfig.IVDICO); use
+``--lang es`` for the Spanish one. Run it again after changing the vocabulary (an index
+built from another vocabulary file is not used).
+"""
+
+import argparse
+from pathlib import Path
+import pickle
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from normalization import deletion_index  # noqa: E402
+from normalization import normconfig as ncf  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the deletion index of a normalizer vocabulary.")
+    parser.add_argument("vocabulary", type=str, nargs="?", default=None,
+                        help="Pickled set of words (output of pickle_vocabulary.py).")
+    parser.add_argument("out_file", type=str, nargs="?", default=None, help="Path of the index file.")
+    parser.add_argument("--lang", type=str, choices=ncf.LANGUAGES, default="gl",
+                        help="Language of the default vocabulary and index file.")
+    parser.add_argument("--prefix_length", type=int, default=deletion_index.PREFIX_LENGTH,
+                        help="Number of characters of each word that are indexed.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    vocabulary = Path(args.vocabulary or (ncf.IVDICO if args.lang == "gl" else ncf.IVDICO_ES))
+    out_file = Path(args.out_file or (ncf.DELETION_INDEX if args.lang == "gl" else ncf.DELETION_INDEX_ES))
+    with open(vocabulary, "rb") as infi:
+        words = pickle.load(infi)
+    print(f"Loaded {len(words)} words")
+
+    start = time.time()
+    nkeys = deletion_index.write_index(words, out_file, deletion_index.vocabulary_fingerprint(vocabulary),
+                                       prefix_length=args.prefix_length)
+    print(f"Wrote {nkeys} keys to {out_file} in {time.time() - start:.1f} s "
+          f"({out_file.stat().st_size / 2 ** 20:.1f} MiB)")
@@ -0,0 +1,46 @@
+"""
+Build the syllabification lexicon (see :mod:`lexicon`): the syllabification of every
+word of the vocabulary, in plain and spanishfied modes, in a memory-mapped file that
+the pipeline consults before syllabifying a word.
+
+Usage (from the preprocessing directory)::
+
+    python scripts/build_syllabification_lexicon.py [vocabulary.pkl] [lexicon file]
+
+Run it again after changing the vocabulary or the syllabification code (a lexicon
+built with other code is not used).
+"""
+
+import argparse
+from pathlib import Path
+import pickle
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config as cf  # noqa: E402
+import grapheme2syllable as g2s  # noqa: E402
+import lexicon  # noqa: E402
+from normalization import normconfig as ncf  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the syllabification lexicon of the vocabulary.")
+    parser.add_argument("vocabulary", type=str, nargs="?", default=str(ncf.IVDICO),
+                        help="Pickled set of words (output of pickle_vocabulary.py).")
+    parser.add_argument("out_file", type=str, nargs="?", default=str(cf.syllabification_lexicon),
+                        help="Path of the lexicon file.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.vocabulary, "rb") as infi:
+        words = pickle.load(infi)
+    print(f"Loaded {len(words)} words")
+
+    start = time.time()
+    nwords = lexicon.write_lexicon(words, Path(args.out_file), g2s.syllabify_full)
+    print(f"Wrote {nwords} words to {args.out_file} in {time.time() - start:.1f} s "
+          f"({Path(args.out_file).stat().st_size / 2 ** 20:.1f} MiB)")
@@ -0,0 +1,112 @@
+"""
+Differential test of the distance 2 candidates: compares the candidates looked up in the
+deletion index (:meth:`EdManager.generate_levdist_candidates`) with the ones generated
+with :meth:`EdManager.edits1` (:meth:`EdManager.generate_levdist_candidates_norvig`),
+for misspellings of words of the vocabulary.
+
+Usage (from the preprocessing directory)::
+
+    python scripts/compare_levdist_candidates.py [word_list] [--oovs 1000]
+
+The word list (the vocabulary of the comparison) is a pickled set of words (default:
+the normalizer vocabulary, normconfig.IVDICO) or a text file with one word per line. The
+index is built in a temporary directory. Generating the candidates with edits1 takes up
+to a few seconds per word.
+"""
+
+import argparse
+from pathlib import Path
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from normalization import deletion_index  # noqa: E402
+from normalization import editor  # noqa: E402
+from normalization import normconfig as ncf  # noqa: E402
+from scripts.compare_syllabification import load_words  # noqa: E402
+
+# characters of the misspellings: the normalizer alphabet, and others (uppercase, apostrophe...)
+TYPO_CHARS = ncf.alphabet[0] + "".join(ncf.alphabet[1]) + "ÁÉNXÑ'-·y"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the deletion index candidates with edits1.")
+    parser.add_argument("word_list", type=str, nargs="?", default=str(ncf.IVDICO),
+                        help="Pickled set of words, or text file with one word per line.")
+    parser.add_argument("--oovs", type=int, default=1000, help="Number of misspelled words to compare.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the misspellings.")
+    parser.add_argument("--max_diffs", type=int, default=20, help="Number of differences to print.")
+    return parser.parse_args()
+
+
+def misspell(word: str, rng: random.Random, max_edits: int = 3) -> str:
+    """
+    Random misspelling of a word: 1 to ``max_edits`` deletions, insertions,
+    substitutions, transpositions or changes of case.
+
+    Args:
+        word (str): The word.
+        rng (random.Random): The random generator.
+        max_edits (int): Maximum number of edits.
+
+    Returns:
+        str: The misspelled word.
+    """
+    for _ in range(rng.randint(1, max_edits)):
+        i = rng.randrange(len(word) + 1)
+        edit = rng.choice(["delete", "insert", "substitute", "transpose", "case"])
+        if edit == "insert" or not word:
+            word = word[:i] + rng.choice(TYPO_CHARS) + word[i:]
+        elif edit == "case":
+            word = word.upper() if word.islower() else word.lower()
+        else:
+            i = min(i, len(word) - 1)
+            if edit == "delete":
+                word = word[:i] + word[i + 1:]
+            elif edit == "substitute":
+                word = word[:i] + rng.choice(TYPO_CHARS) + word[i + 1:]
+            elif i + 1 < len(word):
+                word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def compare(edimgr: editor.EdManager, oovs: list[str]) -> list[tuple]:
+    """
+    Differences between the candidates of the deletion index and of edits1.
+
+    Args:
+        edimgr (editor.EdManager): Editor with the deletion index of its dictionary.
+        oovs (list[str]): The words whose candidates are compared.
+
+    Returns:
+        list[tuple]: (oov, candidates only found with edits1, candidates only found
+        in the index) for each difference.
+    """
+    diffs = []
+    for oov in oovs:
+        cands = edimgr.generate_levdist_candidates(oov)
+        ref = edimgr.generate_levdist_candidates_norvig(oov)
+        if cands != ref:
+            diffs.append((oov, sorted(ref - cands), sorted(cands - ref)))
+    return diffs
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    words = load_words(Path(args.word_list))
+    print(f"Loaded {len(words)} words")
+    rng = random.Random(args.seed)
+    oovs = [misspell(rng.choice(words), rng) for _ in range(args.oovs)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        index_path = Path(tmpdir) / "index.bin"
+        deletion_index.write_index(words, index_path, "")
+        edimgr = editor.EdManager({}, set(words), deletion_index.DeletionIndex(index_path))
+        edimgr.prep_alphabet()
+        diffs = compare(edimgr, oovs)
+        edimgr.deletion_index.close()
+    for diff in diffs[:args.max_diffs]:
+        print("\t".join(str(x) for x in diff))
+    print(f"{len(diffs)} differences")
+    sys.exit(1 if diffs else 0)
@@ -0,0 +1,83 @@
+"""
+Differential test of the syllabification: compares :func:`grapheme2syllable.syllabify_full`
+with the regex implementation it replaced (test/grapheme2syllable_regex.py) on every
+word of the vocabulary (or of another word list), with and without `spanishfy`.
+
+Usage (from the preprocessing directory)::
+
+    python scripts/compare_syllabification.py [word_list]
+
+The word list is a pickled set of words (default: the normalizer vocabulary,
+normconfig.IVDICO) or a text file with one word per line (hyphens are removed, so
+that test/lista_palabras.txt can be used).
+"""
+
+import argparse
+from pathlib import Path
+import pickle
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# reference implementation, kept with the tests
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "test"))
+
+import grapheme2syllable as g2s  # noqa: E402
+import grapheme2syllable_regex as g2s_regex  # noqa: E402
+from normalization import normconfig as ncf  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the syllabification with the regex implementation.")
+    parser.add_argument("word_list", type=str, nargs="?", default=str(ncf.IVDICO),
+                        help="Pickled set of words, or text file with one word per line.")
+    parser.add_argument("--max_diffs", type=int, default=20, help="Number of differences to print.")
+    return parser.parse_args()
+
+
+def load_words(path: Path) -> list[str]:
+    """
+    Loads the words to compare.
+
+    Args:
+        path (Path): Pickled set of words, or text file with one word per line.
+
+    Returns:
+        list[str]: The words, sorted.
+    """
+    if path.suffix == ".pkl":
+        with open(path, "rb") as f:
+            return sorted(pickle.load(f))
+    with open(path, "r", encoding="utf-8") as f:
+        return sorted({line.strip().replace("-", "") for line in f
+                       if line.strip() and not line.startswith("#")})
+
+
+def compare(words: list[str]) -> list[tuple]:
+    """
+    Differences between both implementations.
+
+    Args:
+        words (list[str]): The words to syllabify.
+
+    Returns:
+        list[tuple]: (word, spanishfy, output, regex output) for each difference.
+    """
+    diffs = []
+    for word in words:
+        for spanishfy in (False, True):
+            out = g2s.syllabify_full(word, spanishfy=spanishfy)
+            ref = g2s_regex.syllabify_full(word, spanishfy=spanishfy)
+            if out != ref:
+                diffs.append((word, spanishfy, out, ref))
+    return diffs
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    words = load_words(Path(args.word_list))
+    print(f"Loaded {len(words)} words")
+    diffs = compare(words)
+    for diff in diffs[:args.max_diffs]:
+        print("\t".join(str(x) for x in diff))
+    print(f"{len(diffs)} differences")
+    sys.exit(1 if diffs else 0)
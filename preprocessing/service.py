@@ -0,0 +1,615 @@
+"""
+Preprocessing service: a pool of long-lived worker processes, each holding a
+:class:`pipeline.PreprocessingPipeline` (normalizer vocabulary and KenLM model),
+serving requests over a Unix domain socket.
+
+Several web workers can share the pool through :class:`PreprocessingClient`, so that
+model memory scales with the number of service workers rather than with the number
+of web workers.
+
+Protocol: each message is a 4-byte big-endian length followed by a UTF-8 JSON object.
+Requests are ``{"op": "process", "text": ...}`` or ``{"op": "ping"}``, responses
+``{"ok": true, ...}`` or ``{"ok": false, "error": ...}``; ``process`` responses include the
+worker's stage timings in ms and event counts (``"timings"``, ``"counts"``, see :mod:`timing`).
+A connection can carry several requests, one at a time.
+
+Workers are respawned after ``--max_jobs`` jobs or once their peak RSS goes over
+``--max_rss_mb``, and when they die. A worker that fails while loading its models is
+respawned after a delay doubling with each consecutive failure (``--restart_backoff``),
+at most ``--max_restarts`` times in a row; the service then answers the requests with
+the loading error. Stopped workers are reaped without blocking the event loop.
+
+Usage (from this directory):
+    python service.py --socket /tmp/gama_prepro.sock --workers 2
+"""
+
+import argparse
+from collections import deque
+import json
+import logging
+import multiprocessing as mp
+from pathlib import Path
+import queue
+import resource
+import selectors
+import signal
+import socket
+import struct
+import sys
+import time
+
+from timing import StageTimer, merge, stage, timed
+
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+# seconds given to a stopped worker to exit before terminating it (then killing it)
+STOP_TIMEOUT = 5
+# maximum delay before respawning a worker that failed while loading, in seconds
+MAX_RESTART_BACKOFF = 60
+
+service_logger = logging.getLogger("main.service")
+
+
+class ServiceError(Exception):
+    """Error reported by the preprocessing service, or failure to talk to it."""
+
+
+def encode_message(obj: dict) -> bytes:
+    """Frame a message: length header followed by the JSON payload."""
+    payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_message(sock: socket.socket) -> dict:
+    """Read one framed message from a blocking socket."""
+    (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise ServiceError(f"Message too large ({size} bytes)")
+    return json.loads(_recv_exactly(sock, size).decode("utf-8"))
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of the current process, in MB (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _worker_main(conn, pipeline_options: dict, stand_in_models: bool = False):
+    """
+    Worker process: load the pipeline once, then process texts received on `conn`
+    until receiving None. Replies are tuples (ok, result, peak RSS in MB, timer), the timer
+    being None except for successful jobs. The first reply is ("ready", ...), or
+    ("failed", error, ...) if the pipeline could not be loaded.
+    """
+    # the parent's signal handlers must not run in workers, the parent stops them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        from pipeline import PreprocessingPipeline
+        if stand_in_models:
+            from normalization.lm_manager import StandInLMManager
+            ppl = PreprocessingPipeline(**{**pipeline_options, "normalize": False}, nglm=StandInLMManager())
+        else:
+            ppl = PreprocessingPipeline(**pipeline_options)
+    except Exception as e:
+        conn.send(("failed", f"{type(e).__name__}: {e}", _peak_rss_mb(), None))
+        conn.close()
+        return
+    try:
+        conn.send(("ready", None, _peak_rss_mb(), None))
+    except (BrokenPipeError, OSError):
+        # stopped by the parent while loading
+        return
+    while True:
+        try:
+            text = conn.recv()
+        except EOFError:
+            break
+        if text is None:
+            break
+        try:
+            with timed() as timer, stage("service_process"):
+                lines = ppl.process(text)
+            conn.send((True, lines, _peak_rss_mb(), timer))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}", _peak_rss_mb(), None))
+    conn.close()
+
+
+class _Worker:
+    """Parent-side handle on a worker process."""
+
+    def __init__(self, ctx, pipeline_options: dict, stand_in_models: bool = False):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, pipeline_options, stand_in_models),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.jobs = 0
+        self.rss_mb = 0.0
+        self.client = None  # connection waiting for the current job's result
+        self.stop_deadline = None
+        self.terminated = False
+
+    def request_stop(self):
+        """Ask the worker to exit, without waiting; see :meth:`reap`."""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.conn.close()
+        self.stop_deadline = time.monotonic() + STOP_TIMEOUT
+
+    def reap(self) -> bool:
+        """
+        Join the worker if it has exited after :meth:`request_stop`. Past the deadline it is
+        terminated, then killed after another ``STOP_TIMEOUT``. Never blocks.
+
+        Returns:
+            bool: True once the process is joined.
+        """
+        if not self.process.is_alive():
+            self.process.join()
+            self.process.close()
+            return True
+        if time.monotonic() >= self.stop_deadline:
+            if self.terminated:
+                self.process.kill()
+            else:
+                self.process.terminate()
+                self.terminated = True
+            self.stop_deadline = time.monotonic() + STOP_TIMEOUT
+        return False
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        """Stop the worker, waiting for it (at shutdown)."""
+        if self.stop_deadline is None:
+            self.request_stop()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process.close()
+
+
+class _ClientConnection:
+    """Parent-side state of a client connection (incoming bytes and pending reply)."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+
+
+class PreprocessingService:
+    """
+    Unix socket server dispatching preprocessing jobs to a pool of worker processes.
+    The parent process only does I/O; jobs are queued while all workers are busy.
+
+    Args:
+        socket_path (str): Path of the Unix domain socket to listen on.
+        workers (int): Number of worker processes.
+        max_jobs (int): Respawn a worker after this many jobs (0 for no limit).
+        max_rss_mb (float): Respawn a worker once its peak RSS goes over this (0 for no limit).
+        pipeline_options (dict, optional): Keyword arguments for :class:`pipeline.PreprocessingPipeline`.
+        max_restarts (int): Consecutive failures of workers loading their models after
+            which they are no longer respawned.
+        restart_backoff (float): Delay before respawning a worker that failed while loading,
+            in seconds, doubled with each consecutive failure (at most ``MAX_RESTART_BACKOFF``).
+        stand_in_models (bool): Use lightweight stand-ins for the models (no normalization,
+            :class:`normalization.lm_manager.StandInLMManager`), e.g. for tests.
+    """
+
+    def __init__(self, socket_path: str, workers: int = 2, max_jobs: int = 1000, max_rss_mb: float = 0,
+                 pipeline_options: dict = None, max_restarts: int = 5, restart_backoff: float = 1,
+                 stand_in_models: bool = False):
+        self.socket_path = str(socket_path)
+        self.nb_workers = workers
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.max_restarts = max_restarts
+        self.restart_backoff = restart_backoff
+        self.pipeline_options = pipeline_options or {}
+        self.stand_in_models = stand_in_models
+        # spawned workers do not inherit the sockets and pipes of the parent
+        self.ctx = mp.get_context("spawn")
+        self.selector = selectors.DefaultSelector()
+        self.workers: list[_Worker] = []
+        self.stopping: list[_Worker] = []  # stopped workers not reaped yet
+        self.respawn_at: list[float] = []  # times (time.monotonic) of the delayed respawns
+        self.pending = deque()  # (client, text) waiting for a free worker
+        self.jobs_done = 0
+        self.respawns = 0
+        self.load_failures = 0  # consecutive failures of workers loading their models
+        self.load_error = None  # last loading error, once workers are no longer respawned
+        self.started_at = time.time()
+        self._running = False
+
+    # pool management -------------------------------
+
+    def _spawn_worker(self) -> _Worker:
+        worker = _Worker(self.ctx, self.pipeline_options, self.stand_in_models)
+        self.workers.append(worker)
+        self.selector.register(worker.conn, selectors.EVENT_READ, ("worker", worker))
+        service_logger.info("Started worker pid %s", worker.process.pid)
+        return worker
+
+    def _retire_worker(self, worker: _Worker):
+        """Remove a worker from the pool and stop it; it is reaped by :meth:`_reap_workers`."""
+        self.selector.unregister(worker.conn)
+        self.workers.remove(worker)
+        worker.request_stop()
+        self.stopping.append(worker)
+
+    def _replace_worker(self, worker: _Worker, reason: str):
+        service_logger.info("Respawning worker pid %s (%s)", worker.process.pid, reason)
+        self._retire_worker(worker)
+        self.respawns += 1
+        self._spawn_worker()
+
+    def _on_load_failure(self, worker: _Worker, reason: str):
+        """A worker failed while loading its models: respawn it later, or give up."""
+        self._retire_worker(worker)
+        self.load_failures += 1
+        if self.load_failures > self.max_restarts:
+            service_logger.error("Worker pid %s failed to start (%s), not respawned after %d consecutive failures",
+                                 worker.process.pid, reason, self.load_failures)
+            self.load_error = f"Preprocessing workers failed to start: {reason}"
+            if not self.workers and not self.respawn_at:
+                # nothing left to run the jobs
+                for client, _text in self.pending:
+                    self._reply(client, {"ok": False, "error": self.load_error})
+                self.pending.clear()
+            return
+        delay = min(self.restart_backoff * 2 ** (self.load_failures - 1), MAX_RESTART_BACKOFF)
+        service_logger.warning("Worker pid %s failed to start (%s), respawning in %.1f s",
+                               worker.process.pid, reason, delay)
+        self.respawn_at.append(time.monotonic() + delay)
+
+    def _on_worker_exit(self, worker: _Worker, reason: str):
+        if not worker.ready:
+            self._on_load_failure(worker, reason)
+            return
+        # fail its job and replace it
+        if worker.client is not None:
+            self._reply(worker.client, {"ok": False, "error": "Preprocessing worker died"})
+        self._replace_worker(worker, reason)
+
+    def _respawn_due(self):
+        """Spawn the workers whose delayed respawn is due."""
+        now = time.monotonic()
+        due = [t for t in self.respawn_at if t <= now]
+        self.respawn_at = [t for t in self.respawn_at if t > now]
+        for _ in due:
+            self.respawns += 1
+            self._spawn_worker()
+
+    def _reap_workers(self):
+        self.stopping = [worker for worker in self.stopping if not worker.reap()]
+
+    def _select_timeout(self) -> float:
+        if not self.respawn_at:
+            return 1
+        return min(1, max(0, min(self.respawn_at) - time.monotonic()))
+
+    def _dispatch(self):
+        """Send pending jobs to idle workers."""
+        for worker in self.workers:
+            if not self.pending:
+                return
+            if worker.ready and worker.client is None:
+                client, text = self.pending.popleft()
+                worker.client = client
+                worker.conn.send(text)
+
+    def _unavailable(self) -> bool:
+        """True once no worker is left to run the jobs (all failed to load their models)."""
+        return self.load_error is not None and not self.workers and not self.respawn_at
+
+    def status(self) -> dict:
+        """Health information on the pool, returned for ``ping`` requests."""
+        status = {
+            "ok": not self._unavailable(),
+            "workers": [{"pid": w.process.pid, "alive": w.process.is_alive(), "ready": w.ready,
+                         "busy": w.client is not None, "jobs": w.jobs, "rss_mb": round(w.rss_mb, 1)}
+                        for w in self.workers],
+            "queued": len(self.pending),
+            "jobs_done": self.jobs_done,
+            "respawns": self.respawns,
+            "load_failures": self.load_failures,
+            "delayed_respawns": len(self.respawn_at),
+            "uptime": round(time.time() - self.started_at, 1),
+        }
+        if self.load_error is not None:
+            status["error"] = self.load_error
+        return status
+
+    # event handlers -------------------------------
+
+    def _on_worker_message(self, worker: _Worker):
+        try:
+            ok, result, rss_mb, timer = worker.conn.recv()
+        except (EOFError, OSError):
+            self._on_worker_exit(worker, "died")
+            return
+        worker.rss_mb = rss_mb
+        if ok == "ready":
+            worker.ready = True
+            self.load_failures = 0
+            return
+        if ok == "failed":
+            self._on_load_failure(worker, result)
+            return
+        client, worker.client = worker.client, None
+        worker.jobs += 1
+        self.jobs_done += 1
+        if client is not None:
+            self._reply(client, {"ok": True, "lines": result, "timings": timer.milliseconds(),
+                                 "counts": timer.counts} if ok
+                        else {"ok": False, "error": result})
+        if self.max_jobs and worker.jobs >= self.max_jobs:
+            self._replace_worker(worker, f"{worker.jobs} jobs")
+        elif self.max_rss_mb and worker.rss_mb > self.max_rss_mb:
+            self._replace_worker(worker, f"RSS {worker.rss_mb:.0f} MB")
+
+    def _on_accept(self, server: socket.socket):
+        sock, _ = server.accept()
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, ("client", _ClientConnection(sock)))
+
+    def _on_client_readable(self, client: _ClientConnection):
+        try:
+            data = client.sock.recv(1024 * 1024)
+        except (ConnectionError, OSError):
+            data = b""
+        if not data:
+            self._close_client(client)
+            return
+        client.inbuf += data
+        while len(client.inbuf) >= HEADER.size:
+            (size,) = HEADER.unpack_from(client.inbuf)
+            if size > MAX_MESSAGE_SIZE:
+                self._close_client(client)
+                return
+            if len(client.inbuf) < HEADER.size + size:
+                break
+            payload = bytes(client.inbuf[HEADER.size:HEADER.size + size])
+            del client.inbuf[:HEADER.size + size]
+            self._on_request(client, payload)
+            if client.sock.fileno() == -1:
+                return
+
+    def _on_request(self, client: _ClientConnection, payload: bytes):
+        try:
+            request = json.loads(payload.decode("utf-8"))
+            op = request.get("op")
+        except (UnicodeDecodeError, json.JSONDecodeError, AttributeError):
+            self._reply(client, {"ok": False, "error": "Malformed request"})
+            return
+        if op == "ping":
+            self._reply(client, self.status())
+        elif op == "process" and isinstance(request.get("text"), str):
+            if self._unavailable():
+                self._reply(client, {"ok": False, "error": self.load_error})
+                return
+            self.pending.append((client, request["text"]))
+            self._dispatch()
+        else:
+            self._reply(client, {"ok": False, "error": f"Unknown operation: {op}"})
+
+    def _reply(self, client: _ClientConnection, response: dict):
+        if client.sock.fileno() == -1:
+            return  # client went away while its job was running
+        client.outbuf += encode_message(response)
+        self._flush(client)
+
+    def _flush(self, client: _ClientConnection):
+        try:
+            sent = client.sock.send(client.outbuf)
+            del client.outbuf[:sent]
+        except BlockingIOError:
+            pass
+        except (ConnectionError, OSError):
+            self._close_client(client)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.outbuf else 0)
+        self.selector.modify(client.sock, events, ("client", client))
+
+    def _close_client(self, client: _ClientConnection):
+        if client.sock.fileno() == -1:
+            return
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        # drop its queued jobs; a running job's result is discarded in _reply
+        self.pending = deque((c, t) for (c, t) in self.pending if c is not client)
+
+    # main loop ------------------------------------
+
+    def serve_forever(self):
+        if Path(self.socket_path).exists():
+            Path(self.socket_path).unlink()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(128)
+        server.setblocking(False)
+        self.selector.register(server, selectors.EVENT_READ, ("server", server))
+        for _ in range(self.nb_workers):
+            self._spawn_worker()
+        service_logger.info("Listening on %s with %d workers", self.socket_path, self.nb_workers)
+
+        self._running = True
+        try:
+            while self._running:
+                for key, events in self.selector.select(timeout=self._select_timeout()):
+                    kind, obj = key.data
+                    if kind == "server":
+                        self._on_accept(obj)
+                    elif kind == "worker":
+                        self._on_worker_message(obj)
+                    elif events & selectors.EVENT_WRITE:
+                        self._flush(obj)
+                    else:
+                        self._on_client_readable(obj)
+                # a worker killed from outside (e.g. OOM killer) without closing its pipe
+                for worker in list(self.workers):
+                    # (its last message, if any, is read first)
+                    if not worker.process.is_alive() and worker.client is None and not worker.conn.poll():
+                        self._on_worker_exit(worker, "not alive")
+                self._respawn_due()
+                self._reap_workers()
+                # workers may have become ready or free
+                self._dispatch()
+        finally:
+            for worker in self.workers + self.stopping:
+                worker.stop()
+            # clients see the connection closed instead of waiting for their timeout
+            for key in list(self.selector.get_map().values()):
+                if key.data[0] == "client":
+                    self._close_client(key.data[1])
+            server.close()
+            if Path(self.socket_path).exists():
+                Path(self.socket_path).unlink()
+
+    def shutdown(self, *args):
+        self._running = False
+
+
+class PreprocessingClient:
+    """
+    Thread-safe client for :class:`PreprocessingService`, keeping a pool of open
+    connections that are reused across requests. A request failing on a reused connection
+    (e.g. closed by a restart of the service) is retried once on a new connection.
+
+    Args:
+        socket_path (str): Path of the service's Unix domain socket.
+        pool_size (int): Maximum number of idle connections kept open.
+        timeout (float): Socket timeout in seconds for each request.
+    """
+
+    def __init__(self, socket_path: str, pool_size: int = 4, timeout: float = 120):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _exchange(self, sock: socket.socket, message: dict) -> dict:
+        sock.sendall(encode_message(message))
+        return read_message(sock)
+
+    def _unavailable_error(self, error: Exception) -> ServiceError:
+        return ServiceError(f"Preprocessing service unavailable at {self.socket_path}: {error}")
+
+    def _request(self, message: dict) -> dict:
+        try:
+            sock = self._idle.get_nowait()
+        except queue.Empty:
+            sock = None
+        response = None
+        if sock is not None:
+            try:
+                response = self._exchange(sock, message)
+            except TimeoutError as e:
+                sock.close()
+                raise self._unavailable_error(e) from e
+            except (OSError, ConnectionError, ValueError):
+                # idle connection closed by the service since its last use (e.g. restarted):
+                # retry once on a new connection
+                sock.close()
+                sock = None
+        if response is None:
+            try:
+                sock = self._connect()
+                response = self._exchange(sock, message)
+            except (OSError, ConnectionError, ValueError) as e:
+                if sock is not None:
+                    sock.close()
+                raise self._unavailable_error(e) from e
+        try:
+            self._idle.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+        if not response.get("ok"):
+            raise ServiceError(response.get("error", "Unknown error"))
+        return response
+
+    def process(self, text: str) -> list[str]:
+        """
+        Preprocess a text in the service, see :meth:`pipeline.PreprocessingPipeline.process`.
+        The worker's stage timings (``service_process`` for the whole job) and event counts
+        are added to the active :mod:`timing` timer, if any, along with the time spent
+        outside the worker (``service_wait``: queueing, I/O).
+        """
+        start = time.perf_counter()
+        response = self._request({"op": "process", "text": text})
+        timer = StageTimer()
+        for name, ms in response.get("timings", {}).items():
+            timer.add(name, ms / 1000)
+        for name, n in response.get("counts", {}).items():
+            timer.count(name, n)
+        timer.add("service_wait", max(time.perf_counter() - start - timer.durations.get("service_process", 0.0), 0.0))
+        merge(timer)
+        return response["lines"]
+
+    def ping(self) -> dict:
+        """Health check: returns the pool status, raises :class:`ServiceError` if unreachable."""
+        return self._request({"op": "ping"})
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Preprocessing service with a pool of workers on a Unix socket.")
+    parser.add_argument("--socket", type=str, default="/tmp/gama_prepro.sock", help="Path of the Unix socket.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes.")
+    parser.add_argument("--max_jobs", type=int, default=1000,
+                        help="Respawn a worker after this many jobs (0 for no limit).")
+    parser.add_argument("--max_rss_mb", type=float, default=0,
+                        help="Respawn a worker when its peak RSS goes over this many MB (0 for no limit).")
+    parser.add_argument("--max_restarts", type=int, default=5,
+                        help="Stop respawning workers after this many consecutive failures to load the models.")
+    parser.add_argument("--restart_backoff", type=float, default=1,
+                        help="Seconds before respawning a worker that failed to load the models, "
+                             "doubled with each consecutive failure.")
+    parser.add_argument("--stand_in_models", action="store_true",
+                        help="Use lightweight stand-ins for the models (no normalization), e.g. for load tests.")
+    parser.add_argument("--ping", action="store_true", help="Check the health of a running service and exit.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.ping:
+        try:
+            print(json.dumps(PreprocessingClient(args.socket, timeout=10).ping(), indent=2))
+        except ServiceError as e:
+            print(e)
+            sys.exit(1)
+        sys.exit(0)
+    service = PreprocessingService(args.socket, workers=args.workers, max_jobs=args.max_jobs,
+                                   max_rss_mb=args.max_rss_mb, max_restarts=args.max_restarts,
+                                   restart_backoff=args.restart_backoff, stand_in_models=args.stand_in_models)
+    signal.signal(signal.SIGTERM, service.shutdown)
+    signal.signal(signal.SIGINT, service.shutdown)
+    service.serve_forever()
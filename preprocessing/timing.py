@@ -0,0 +1,102 @@
+"""
+Per-stage timing and event counts of the preprocessing pipeline.
+
+The pipeline wraps its stages (model loading, orthographic preprocessing, candidate
+generation, KenLM scoring, syllabification...) in :func:`stage`, and counts events
+(OOV tokens normalized, LM queries...) with :func:`count`. Durations and counts are
+added to the :class:`StageTimer` active in the current context (see :func:`timed`);
+when no timer is active, they only cost a context variable lookup.
+
+Timers are context-local (:mod:`contextvars`), so concurrent requests in threads or
+asyncio tasks of a web worker each get their own timings.
+"""
+
+from contextlib import contextmanager
+import contextvars
+import time
+
+_current_timer = contextvars.ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """
+    Accumulated wall-clock duration (in seconds) of each stage, in first-seen order,
+    and number of occurrences of each counted event.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+
+    def add(self, name: str, seconds: float):
+        """Add `seconds` to the duration of stage `name`."""
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1):
+        """Add `n` occurrences of event `name`."""
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, other: "StageTimer"):
+        """Add the durations and counts of a timer used elsewhere (e.g. in a worker process)."""
+        for name, seconds in other.durations.items():
+            self.add(name, seconds)
+        for name, n in other.counts.items():
+            self.count(name, n)
+
+    def milliseconds(self) -> dict:
+        """Durations in milliseconds, rounded to 0.01 ms."""
+        return {name: round(seconds * 1000, 2) for name, seconds in self.durations.items()}
+
+    def server_timing(self) -> str:
+        """Value of an HTTP ``Server-Timing`` header with one metric per stage."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.milliseconds().items())
+
+
+def current_timer() -> StageTimer:
+    """The timer active in the current context, or None."""
+    return _current_timer.get()
+
+
+@contextmanager
+def timed(timer: StageTimer = None):
+    """
+    Make `timer` (a new :class:`StageTimer` by default) the active timer for the
+    duration of the block.
+
+    Yields:
+        StageTimer: The active timer.
+    """
+    timer = timer if timer is not None else StageTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the block as stage `name` of the active timer, if any."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def count(name: str, n: int = 1):
+    """Count `n` occurrences of event `name` in the active timer, if any."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.count(name, n)
+
+
+def merge(other: StageTimer):
+    """Add the durations and counts of a timer used elsewhere to the active timer, if any."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.merge(other)